@@ -0,0 +1,77 @@
+"""
+Tahmin doğruluğunun geriye dönük testi
+
+Her tenant'ın geçmişi bir kez okunur, son --lookback-days günün her biri için o günkü bekleyen
+işlemler ve bakiyeyle tahmin yeniden kurulur ve gerçekleşen bakiyeyle karşılaştırılır.
+Tenant'lar süreç havuzuna dağıtılır.
+
+Kullanım (ai-service dizininden):
+    python backtest.py --lookback-days 365 --horizon 30 --processes 8 --output backtest.json
+    python backtest.py --tenant <tenant_id> --no-delay-model
+"""
+import argparse
+import asyncio
+import logging
+from typing import List
+
+from services.backtest import BacktestRunner, default_options
+from services.db import create_pool
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REPORTED_HORIZONS = (0, 1, 7, 14, 30, 60, 89)
+
+
+async def list_tenants() -> List[str]:
+    """Kaydı olan tüm tenant'lar"""
+
+    db = await create_pool(min_size=1, max_size=1)
+
+    try:
+        rows = await db.fetch("SELECT DISTINCT tenant_id FROM public.cash_flow")
+    finally:
+        await db.close()
+
+    return [str(row['tenant_id']) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tenant', action='append', help='yalnızca bu tenant (tekrarlanabilir)')
+    parser.add_argument('--lookback-days', type=int, default=365)
+    parser.add_argument('--horizon', type=int, default=30)
+    parser.add_argument('--scenario', default='realistic', choices=['pessimistic', 'realistic', 'optimistic'])
+    parser.add_argument('--no-delay-model', action='store_true', help='gecikmesiz temel çizgi')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--output', help='raporun yazılacağı JSON dosyası')
+    args = parser.parse_args()
+
+    if args.horizon < 1 or args.horizon > 90:
+        parser.error("--horizon must be between 1 and 90")
+
+    options = default_options(args.lookback_days, args.horizon, args.scenario, not args.no_delay_model)
+    tenant_ids = args.tenant or asyncio.run(list_tenants())
+
+    logger.info(f"Backtesting {len(tenant_ids)} tenants, {options.from_date} -> {options.to_date}")
+
+    report = BacktestRunner(args.processes).run(tenant_ids, options)
+
+    print(f"{'horizon':>8}{'forecasts':>12}{'MAE':>14}{'RMSE':>14}{'bias':>14}{'accuracy %':>12}")
+    for horizon in report.horizons:
+        if horizon.horizon_days in REPORTED_HORIZONS or horizon.horizon_days == args.horizon - 1:
+            print(
+                f"{horizon.horizon_days:>8}{horizon.forecasts:>12}{horizon.mae:>14,.2f}"
+                f"{horizon.rmse:>14,.2f}{horizon.bias:>14,.2f}{horizon.accuracy:>12.2f}"
+            )
+
+    if report.failed_tenants:
+        print(f"failed tenants: {len(report.failed_tenants)}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report.json(indent=2))
+
+
+if __name__ == '__main__':
+    main()
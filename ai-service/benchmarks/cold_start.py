@@ -0,0 +1,67 @@
+"""
+API cold-start süresi ve temel RSS ölçümü
+
+Her mod ayrı bir Python sürecinde `main` modülünü import eder:
+- lazy:  varsayılan, ML yığını ilk tahmin/eğitim isteğinde yüklenir
+- eager: AI_EAGER_ML_IMPORT=true ile aynı, ML yığını başlangıçta yüklenir
+
+Kullanım (ai-service dizininden):
+    python benchmarks/cold_start.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import main
+if {eager}:
+    import services.ai_agent.enhanced_predictor
+elapsed = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    'import_seconds': elapsed,
+    'rss_mb': rss_kb / 1024,
+    'ml_loaded': all(m in sys.modules for m in ('pandas', 'sklearn'))
+}}))
+"""
+
+
+def measure(eager: bool, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-c', PROBE.format(eager=eager)],
+            cwd=SERVICE_DIR
+        )
+        samples.append(json.loads(output))
+
+    return {
+        'mode': 'eager' if eager else 'lazy',
+        'runs': runs,
+        'import_seconds_median': statistics.median(s['import_seconds'] for s in samples),
+        'rss_mb_median': statistics.median(s['rss_mb'] for s in samples),
+        'ml_loaded': samples[0]['ml_loaded']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = [measure(False, args.runs), measure(True, args.runs)]
+
+    print(f"{'mode':<8}{'import (s)':>12}{'rss (MB)':>12}{'ml loaded':>12}")
+    for r in results:
+        print(f"{r['mode']:<8}{r['import_seconds_median']:>12.3f}{r['rss_mb_median']:>12.1f}{str(r['ml_loaded']):>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+cash_flow sıcak sorguları için EXPLAIN regresyon testi
+
+Yerel bir Postgres'e sentetik veri yükler, sıcak sorgu indeks migration'ını uygular ve
+services/ai_agent/queries.py'deki her sorguyu (şubeli ve şubesiz) EXPLAIN (ANALYZE, BUFFERS)
+ile çalıştırır. Plan düğümleri, kullanılan indeksler ve süre temel çizgiyle (baseline)
+karşılaştırılır; cash_flow üzerinde yeni bir Seq Scan, kaybolan indeks ya da tolerans
+üstü yavaşlama varsa çıkış kodu 1'dir.
+
+Varsayılan olarak `plan_cache_mode = force_generic_plan` kullanılır: asyncpg hazırlanmış
+sorguları önbellekte tuttuğu için servis birkaç çalıştırmadan sonra genel plana geçer.
+
+Kullanım (ai-service dizininden):
+    python benchmarks/explain_harness.py --dsn postgresql://postgres@localhost/ai_bench --load
+    python benchmarks/explain_harness.py --dsn ... --update-baseline
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import statistics
+import sys
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+import asyncpg
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+from services.ai_agent import queries  # noqa: E402
+from services.db import detect_optional_columns  # noqa: E402
+
+INDEX_MIGRATION = os.path.join(
+    SERVICE_DIR, '..', 'supabase', 'migrations', '20261019160000_cash_flow_hot_query_indexes.sql'
+)
+DEFAULT_BASELINE = os.path.join(SERVICE_DIR, 'benchmarks', 'explain_baseline.json')
+
+SYNTHETIC_TABLE = """
+    CREATE TABLE IF NOT EXISTS public.cash_flow (
+        id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+        tenant_id uuid NOT NULL,
+        branch_id uuid,
+        type text NOT NULL,
+        source_module text,
+        status text NOT NULL,
+        amount numeric(15,2) NOT NULL,
+        expected_date timestamptz NOT NULL,
+        actual_date timestamptz,
+        created_at timestamptz NOT NULL DEFAULT NOW(),
+        ai_confidence_score numeric(5,2),
+        category text,
+        reference_no text
+    )
+"""
+
+# Aggregate sorgusu aktif kuralları cash_flow_rules'tan okur
+SYNTHETIC_RULES = """
+    CREATE TABLE IF NOT EXISTS public.cash_flow_rules (
+        id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+        tenant_id uuid NOT NULL,
+        rule_type text NOT NULL,
+        conditions jsonb NOT NULL DEFAULT '{}',
+        adjustment_factor numeric(5,2) NOT NULL DEFAULT 1.0,
+        priority integer DEFAULT 0,
+        is_active boolean DEFAULT true
+    );
+    DELETE FROM public.cash_flow_rules WHERE tenant_id = md5('tenant-1')::uuid;
+    INSERT INTO public.cash_flow_rules (tenant_id, rule_type, conditions, adjustment_factor) VALUES
+        (md5('tenant-1')::uuid, 'marketplace_delay', '{"marketplace_prefix": "TY-"}', 0.8),
+        (md5('tenant-1')::uuid, 'seasonal_factor',
+         jsonb_build_object('start_date', CURRENT_DATE::text, 'end_date', (CURRENT_DATE + 30)::text), 1.1)
+"""
+
+# Tenant başına 3 şube + şubesiz kayıtlar; ~%85 kapanmış, kalanı bekleyen
+SYNTHETIC_ROWS = """
+    INSERT INTO public.cash_flow
+    (tenant_id, branch_id, type, source_module, status, amount, expected_date, actual_date,
+     created_at, ai_confidence_score, category, reference_no)
+    SELECT
+        md5('tenant-' || t)::uuid,
+        CASE WHEN r % 4 = 0 THEN NULL ELSE md5('branch-' || t || '-' || (r % 4))::uuid END,
+        CASE WHEN r % 3 = 0 THEN 'outflow' ELSE 'inflow' END,
+        (ARRAY['bank', 'e-invoice', 'marketplace', 'sales_order', 'expense', 'payroll', 'manual'])[1 + r % 7],
+        CASE WHEN r % 20 < 17 THEN 'cleared' ELSE (ARRAY['pending', 'partial', 'overdue'])[1 + r % 3] END,
+        round((100 + random() * 60000)::numeric, 2),
+        expected,
+        CASE WHEN r % 20 < 17 THEN expected + (random() * 20 - 3) * INTERVAL '1 day' END,
+        expected - INTERVAL '15 days',
+        round((0.5 + random() * 0.5)::numeric, 2),
+        'bench',
+        'TY-' || r
+    FROM generate_series(1, $1::int) t,
+         generate_series(1, $2::int) r,
+         LATERAL (
+             SELECT NOW() - INTERVAL '400 days' + (r::float8 / $2) * INTERVAL '460 days' as expected
+         ) e
+"""
+
+
+def md5_uuid(text: str) -> str:
+    """Sentetik verideki `md5(text)::uuid` ile aynı kimlik"""
+
+    return str(uuid.UUID(hashlib.md5(text.encode()).hexdigest()))
+
+
+def strata_query(tenant_id: str, branch_id):
+    _, counts_query, args = queries.training_sample_queries(tenant_id, branch_id)
+    return counts_query, args
+
+
+def service_queries(tenant_id: str, branch_id: str):
+    """(ad, sql, args) listesi: her sorgunun şubesiz ve şubeli çeşidi"""
+
+    now = datetime.now()
+    scenario_factors = {'pessimistic': (0.8, 1.1), 'realistic': (1.0, 1.0), 'optimistic': (1.15, 0.9)}
+
+    builders = {
+        'current_balance': lambda b: queries.current_balance_query(tenant_id, b),
+        'tenant_profile': lambda b: queries.tenant_profile_query(tenant_id, b),
+        'training_history': lambda b: queries.training_history_query(tenant_id, b),
+        'training_strata': lambda b: strata_query(tenant_id, b),
+        'recent_cleared': lambda b: queries.recent_cleared_query(tenant_id, b, now - timedelta(days=30), 2000),
+        'pending_rows': lambda b: queries.pending_rows_query(tenant_id, b, now + timedelta(days=90)),
+        'pending_aggregate': lambda b: queries.pending_aggregate_query(
+            tenant_id, b, now + timedelta(days=90), scenario_factors
+        ),
+        'pending_confidence_groups': lambda b: queries.pending_confidence_groups_query(
+            tenant_id, b, now + timedelta(days=90)
+        )
+    }
+
+    for name, build in builders.items():
+        for scope, branch in (('tenant', None), ('branch', branch_id)):
+            sql, args = build(branch)
+            yield f"{name}:{scope}", sql, args
+
+
+def summarize_plan(plan: dict) -> dict:
+    """Plan ağacından düğüm tipleri, indeksler ve cash_flow üzerindeki Seq Scan'ler"""
+
+    nodes, indexes, seq_scans = [], set(), 0
+    stack = [plan['Plan']]
+
+    while stack:
+        node = stack.pop()
+        nodes.append(node['Node Type'])
+        if node.get('Index Name'):
+            indexes.add(node['Index Name'])
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') == 'cash_flow':
+            seq_scans += 1
+        stack.extend(node.get('Plans', []))
+
+    return {
+        'nodes': sorted(set(nodes)),
+        'indexes': sorted(indexes),
+        'cash_flow_seq_scans': seq_scans,
+        'execution_ms': plan['Execution Time'],
+        'shared_buffers': plan['Plan'].get('Shared Hit Blocks', 0) + plan['Plan'].get('Shared Read Blocks', 0)
+    }
+
+
+def migration_statements(sql: str) -> list:
+    """
+    Migration'ı tek tek çalıştırılacak ifadelere böler
+
+    CREATE INDEX CONCURRENTLY işlem bloğunda çalışamaz; çok ifadeli tek bir execute
+    örtük işlem açtığı için her ifade ayrı gönderilir. Dosya DO bloğu içermez.
+    """
+
+    body = re.sub(r'/\*.*?\*/', '', sql, flags=re.S)
+    return [statement.strip() for statement in body.split(';') if statement.strip()]
+
+
+async def load_synthetic(conn: asyncpg.Connection, tenants: int, rows_per_tenant: int):
+    await conn.execute(SYNTHETIC_TABLE)
+    await conn.execute("TRUNCATE public.cash_flow")
+    await conn.execute(SYNTHETIC_ROWS, tenants, rows_per_tenant)
+    await conn.execute(SYNTHETIC_RULES)
+
+    with open(INDEX_MIGRATION) as f:
+        for statement in migration_statements(f.read()):
+            await conn.execute(statement)
+
+    await conn.execute("VACUUM ANALYZE public.cash_flow")
+
+
+async def capture(conn: asyncpg.Connection, runs: int, generic_plan: bool) -> dict:
+    if generic_plan:
+        await conn.execute("SET plan_cache_mode = force_generic_plan")
+
+    results = {}
+
+    for name, sql, args in service_queries(md5_uuid('tenant-1'), md5_uuid('branch-1-1')):
+        samples = []
+        for _ in range(runs):
+            raw = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *args)
+            samples.append(summarize_plan(json.loads(raw)[0]))
+
+        summary = samples[-1]
+        summary['execution_ms'] = statistics.median(s['execution_ms'] for s in samples)
+        results[name] = summary
+
+    return results
+
+
+def compare(baseline: dict, current: dict, tolerance: float, min_delta_ms: float) -> list:
+    """Temel çizgiye göre regresyon listesi"""
+
+    problems = []
+
+    for name, result in current.items():
+        if result['cash_flow_seq_scans']:
+            problems.append(f"{name}: Seq Scan on cash_flow")
+
+        expected = baseline.get(name)
+        if not expected:
+            continue
+
+        missing = set(expected['indexes']) - set(result['indexes'])
+        if missing:
+            problems.append(f"{name}: plan no longer uses {', '.join(sorted(missing))} (nodes {result['nodes']})")
+
+        limit = expected['execution_ms'] * (1 + tolerance)
+        if result['execution_ms'] > limit and result['execution_ms'] - expected['execution_ms'] > min_delta_ms:
+            problems.append(
+                f"{name}: {result['execution_ms']:.2f} ms > baseline {expected['execution_ms']:.2f} ms "
+                f"(+{tolerance:.0%})"
+            )
+
+    return problems
+
+
+async def run(args) -> int:
+    conn = await asyncpg.connect(args.dsn)
+
+    try:
+        if args.load:
+            await load_synthetic(conn, args.tenants, args.rows_per_tenant)
+
+        await detect_optional_columns(conn)
+        current = await capture(conn, args.runs, not args.custom_plan)
+    finally:
+        await conn.close()
+
+    print(f"{'query':<28}{'ms':>10}{'buffers':>10}  indexes")
+    for name, r in current.items():
+        print(f"{name:<28}{r['execution_ms']:>10.2f}{r['shared_buffers']:>10}  {', '.join(r['indexes']) or '-'}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print(f"Baseline written: {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    problems = compare(baseline, current, args.tolerance, args.min_delta_ms)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+
+    return 1 if problems else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.getenv('EXPLAIN_DATABASE_URL'))
+    parser.add_argument('--load', action='store_true', help='sentetik veriyi (yeniden) yükle')
+    parser.add_argument('--tenants', type=int, default=50)
+    parser.add_argument('--rows-per-tenant', type=int, default=20000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='izin verilen göreli yavaşlama')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='bu farkın altı gürültü sayılır')
+    parser.add_argument('--custom-plan', action='store_true', help='genel plan yerine özel plan kullan')
+    parser.add_argument('--allow-remote', action='store_true')
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error('--dsn veya EXPLAIN_DATABASE_URL gerekli')
+
+    # Sentetik yükleme tabloyu boşaltır; yalnızca yerel veritabanında çalıştır
+    host = urlparse(args.dsn).hostname or 'localhost'
+    if host not in ('localhost', '127.0.0.1', '::1') and not args.allow_remote:
+        parser.error(f"uzak veritabanı ({host}) için --allow-remote gerekli")
+
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == '__main__':
+    main()
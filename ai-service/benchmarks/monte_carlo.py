@@ -0,0 +1,88 @@
+"""
+Monte Carlo bakiye bantlarının süre ve bellek ölçümü
+
+Sentetik bekleyen defter (gruplu, pending_confidence_groups_query biçiminde) için
+forecast_math.monte_carlo_balances + balance_bands süresi ve en yüksek ek bellek (tracemalloc).
+Bellek yol × gün bakiye matrisi ile parça başına yol × işlem hücresi (MONTE_CARLO_CHUNK_CELLS) kadardır.
+
+Kullanım (ai-service dizininden):
+    python benchmarks/monte_carlo.py --transactions 1000 10000 100000 --paths 1000 2000 5000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+from services.ai_agent import forecast_math  # noqa: E402
+
+
+def synthetic_book(transactions: int, days: int, seed: int = 42):
+    """Grup başına ortalama 4 işlem, giriş/çıkış yarı yarıya, gecikme tahmini -5..20 gün"""
+
+    rng = np.random.default_rng(seed)
+    groups = max(1, transactions // 4)
+
+    counts = rng.multinomial(transactions - groups, np.full(groups, 1 / groups)) + 1
+    is_inflow = rng.random(groups) < 0.5
+    amount = rng.lognormal(8.5, 1.0, groups) * counts
+
+    return {
+        'expected_day': rng.integers(-10, days, groups),
+        'predicted_delay': rng.integers(-5, 21, groups),
+        'signed_amount': np.where(is_inflow, amount, -amount) * rng.uniform(0.6, 1.0, groups),
+        'transactions': counts
+    }
+
+
+def run(book, offsets, days: int, paths: int, chunk_cells: int):
+    balances = forecast_math.monte_carlo_balances(
+        book['expected_day'],
+        book['predicted_delay'],
+        book['signed_amount'],
+        book['transactions'],
+        offsets,
+        250_000.0,
+        days,
+        paths,
+        60,
+        chunk_cells,
+        np.random.default_rng(0)
+    )
+
+    return forecast_math.balance_bands(balances)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transactions', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--paths', type=int, nargs='+', default=[1000, 2000, 5000])
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--chunk-cells', type=int, default=4_000_000)
+    args = parser.parse_args()
+
+    residuals = np.random.default_rng(1).laplace(0.0, 4.0, 5000)
+    offsets, _ = forecast_math.residual_offsets(forecast_math.residual_quantiles(residuals), 0.0)
+
+    print(f"{'transactions':>12}{'paths':>8}{'ms':>10}{'peak MB':>10}")
+    for transactions in args.transactions:
+        book = synthetic_book(transactions, args.days)
+
+        for paths in args.paths:
+            tracemalloc.start()
+            started = time.perf_counter()
+            run(book, offsets, args.days, paths, args.chunk_cells)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f"{transactions:>12}{paths:>8}{elapsed * 1000:>10.1f}{peak / 1024 / 1024:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Tahmin yanıtı boyutu ve serileştirme süresi karşılaştırması
+
+Sentetik 90 günlük tahmin (ve üç senaryolu karşılaştırma) için:
+- stdlib:   jsonable_encoder + JSONResponse (yanıt modeli olmayan uç noktalar)
+- pydantic: gün başına nesneler, dönüş tipinden TypeAdapter.dump_json (FastAPI'nin yanıt modeli yolu)
+- columnar: ColumnarForecast, TypeAdapter.dump_json
+
+Kullanım (ai-service dizininden):
+    python benchmarks/serialization.py --days 90 --repeat 200
+"""
+import argparse
+import gzip
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Union
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+from services.ai_agent.models import ColumnarForecast, PredictionResult  # noqa: E402
+
+RISK_COLORS = {'low': '#22c55e', 'medium': '#f59e0b', 'high': '#ef4444', 'critical': '#dc2626'}
+
+
+def synthetic_predictions(days: int, scenario_type: str, seed: int = 42):
+    """_generate_recommendations ile aynı metinleri üreten sentetik tahminler"""
+
+    rng = random.Random(seed)
+    start = datetime.now()
+    balance = 250000.0
+    predictions = []
+
+    for day in range(days):
+        balance += rng.uniform(-15000, 12000)
+        risk_level = 'critical' if balance < 20000 else 'high' if balance < 60000 else rng.choice(['low', 'medium'])
+
+        recommendations = []
+        if risk_level == 'critical':
+            recommendations.append("🚨 KRİTİK: Nakit sıkıntısı riski! Acil tahsilat yapılması şarttır.")
+            if balance < 0:
+                recommendations.append(f"⚠️ Bakiye eksi: ₺{abs(balance):,.2f}. Acil finansman gerekebilir.")
+        elif risk_level == 'high':
+            recommendations.append("⚠️ YÜKSEK RİSK: Nakit akışı dikkatle izlenmeli.")
+        recommendations.append("📞 12 vadesi geçmiş alacak var (₺184,250.00). Tahsilat ekibi bilgilendirilmeli.")
+
+        predictions.append(PredictionResult(
+            date=start + timedelta(days=day),
+            predicted_balance=balance,
+            confidence_score=rng.choice([0.5, 0.8]),
+            risk_level=risk_level,
+            risk_color=RISK_COLORS[risk_level],
+            factors={
+                'inflow_confidence': rng.random(),
+                'transaction_count': float(rng.randint(0, 40)),
+                'scenario_adjustment': 0.0
+            },
+            recommendations=recommendations,
+            scenario_type=scenario_type
+        ))
+
+    return predictions
+
+
+def encoders(predictions_by_scenario):
+    """Her yol için (ad, gövde üreten fonksiyon)"""
+
+    single = predictions_by_scenario['realistic']
+    # main.py'deki dönüş tipleri
+    predict_adapter = TypeAdapter(Union[List[PredictionResult], ColumnarForecast])
+    scenarios_adapter = TypeAdapter(Dict[str, Any])
+
+    def scenarios(columnar):
+        return {
+            name: {
+                'predictions': (
+                    ColumnarForecast.from_predictions(preds, name).dict() if columnar else [p.dict() for p in preds]
+                ),
+                'final_balance': preds[-1].predicted_balance
+            }
+            for name, preds in predictions_by_scenario.items()
+        }
+
+    return [
+        ('predict/stdlib', lambda: JSONResponse(jsonable_encoder(single)).body),
+        ('predict/pydantic', lambda: predict_adapter.dump_json(single)),
+        ('predict/columnar', lambda: predict_adapter.dump_json(ColumnarForecast.from_predictions(single))),
+        ('scenarios/stdlib', lambda: JSONResponse(jsonable_encoder(scenarios(False))).body),
+        ('scenarios/pydantic', lambda: scenarios_adapter.dump_json(scenarios(False))),
+        ('scenarios/columnar', lambda: scenarios_adapter.dump_json(scenarios(True))),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    predictions_by_scenario = {
+        name: synthetic_predictions(args.days, name, seed)
+        for seed, name in enumerate(['pessimistic', 'realistic', 'optimistic'])
+    }
+
+    print(f"{'encoder':<22}{'bytes':>10}{'gzip':>10}{'ms/response':>14}")
+    for name, encode in encoders(predictions_by_scenario):
+        body = encode()
+        seconds = timeit.timeit(encode, number=args.repeat) / args.repeat
+        print(f"{name:<22}{len(body):>10}{len(gzip.compress(body)):>10}{seconds * 1000:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,22 @@
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
+import asyncio
 import asyncpg
 import os
 from datetime import datetime
 import logging
 
-from services.ai_agent.enhanced_predictor import (
-    EnhancedCashFlowAIAgent,
-    PredictionResult,
-    ModelMetrics
+from services.ai_agent.models import (
+    ColumnarForecast, LongHorizonForecast, PredictionResult, ModelMetrics, ProbabilisticForecast,
+    WhatIfRequest, WhatIfResult
 )
+from services.ai_agent.model_cache import model_cache
 from services.ai_agent.rule_engine import CashFlowRuleEngine, RuleDefinition
+from services.admission import AdmissionController
+from services.db import create_pool
+from services.forecast_versions import ForecastDelta, ForecastDeltaReader
+from services.job_queue import JobQueue, JobReceipt
 
 logging.basicConfig(
     level=logging.INFO,
@@ -19,6 +24,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# true: pandas/scikit-learn başlangıçta yüklenir, false: ilk tahmin/eğitim isteğinde
+EAGER_ML_IMPORT = os.getenv("AI_EAGER_ML_IMPORT", "false").lower() in ("1", "true", "yes")
+# Başlangıçta modeli önbelleğe alınacak en aktif tenant sayısı (yalnızca AI_EAGER_ML_IMPORT=true iken)
+MODEL_CACHE_WARM_TENANTS = int(os.getenv("MODEL_CACHE_WARM_TENANTS", 20))
+
+RESPONSE_FORMATS = ('rows', 'columnar')
+
+# Tek what-if isteğinde değerlendirilecek en fazla senaryo (ızgara noktası)
+WHAT_IF_MAX_POINTS = int(os.getenv("WHAT_IF_MAX_POINTS", 2000))
+# Tek Monte Carlo isteğinde simüle edilecek en fazla yol (varsayılan: MONTE_CARLO_PATHS)
+MONTE_CARLO_MAX_PATHS = int(os.getenv("MONTE_CARLO_MAX_PATHS", 20000))
+# Kova tabanlı uzun vade tahmininin en uzun ufku (gün)
+LONG_HORIZON_MAX_DAYS = int(os.getenv("LONG_HORIZON_MAX_DAYS", 730))
+
 app = FastAPI(
     title="Modulus AI Cash Flow Prediction Service",
     description="Gelişmiş AI destekli nakit akışı tahminleme servisi",
@@ -34,6 +53,7 @@ app.add_middleware(
 )
 
 db_pool: Optional[asyncpg.Pool] = None
+admission = AdmissionController.from_env()
 
 
 @app.on_event("startup")
@@ -41,18 +61,25 @@ async def startup():
     """Uygulama başlangıcı"""
     global db_pool
 
-    db_url = os.getenv("DATABASE_URL")
-    if not db_url:
-        raise RuntimeError("DATABASE_URL environment variable not set")
-
-    db_pool = await asyncpg.create_pool(
-        db_url,
-        min_size=5,
-        max_size=20
-    )
+    db_pool = await create_pool(min_size=5, max_size=20)
 
     logger.info("Database pool created successfully")
 
+    if EAGER_ML_IMPORT:
+        import services.ai_agent.enhanced_predictor  # noqa: F401
+        logger.info("ML stack loaded eagerly")
+
+        if MODEL_CACHE_WARM_TENANTS > 0:
+            asyncio.create_task(warm_model_cache())
+
+
+async def warm_model_cache():
+    """En aktif tenant'ların modellerini arka planda önbelleğe yükle"""
+    try:
+        await model_cache.warm_up(db_pool, MODEL_CACHE_WARM_TENANTS)
+    except Exception as e:
+        logger.error(f"Model cache warm-up error: {str(e)}")
+
 
 @app.on_event("shutdown")
 async def shutdown():
@@ -64,6 +91,12 @@ async def shutdown():
         logger.info("Database pool closed")
 
 
+def create_agent(db: asyncpg.Pool):
+    """Tahmin motorunu oluştur (ML yığını ilk çağrıda import edilir)"""
+    from services.ai_agent.enhanced_predictor import EnhancedCashFlowAIAgent
+    return EnhancedCashFlowAIAgent(db)
+
+
 def get_db() -> asyncpg.Pool:
     """Database dependency"""
     if not db_pool:
@@ -81,14 +114,28 @@ async def health_check():
     }
 
 
-@app.post("/api/ai/cash-flow/predict")
+@app.get("/metrics/admission")
+async def admission_metrics():
+    """Kabul kontrolü metrikleri (kuyruk derinliği, reddedilen istekler)"""
+    return admission.snapshot()
+
+
+@app.get("/metrics/models")
+async def model_cache_metrics():
+    """Model önbelleği metrikleri (isabet oranı, çıkarılan model sayısı, bellekteki boyut)"""
+    return model_cache.stats()
+
+
+@app.post("/api/ai/cash-flow/predict", dependencies=[Depends(admission.dependency('forecast'))])
 async def predict_cash_flow(
     tenant_id: str,
+    response: Response,
     forecast_days: int = 30,
     branch_id: Optional[str] = None,
     scenario: str = 'realistic',
+    response_format: str = Query('rows', alias='format'),
     db: asyncpg.Pool = Depends(get_db)
-) -> List[PredictionResult]:
+) -> Union[List[PredictionResult], ColumnarForecast]:
     """
     Nakit akışı tahmini yap
 
@@ -96,6 +143,7 @@ async def predict_cash_flow(
     - **forecast_days**: Tahmin günü (7-90)
     - **branch_id**: Şube ID (opsiyonel)
     - **scenario**: 'pessimistic', 'realistic', 'optimistic'
+    - **format**: 'rows' (gün başına nesne) veya 'columnar' (paralel diziler, tekilleştirilmiş öneriler)
     """
 
     try:
@@ -111,7 +159,10 @@ async def predict_cash_flow(
                 detail="scenario must be 'pessimistic', 'realistic', or 'optimistic'"
             )
 
-        agent = EnhancedCashFlowAIAgent(db)
+        if response_format not in RESPONSE_FORMATS:
+            raise HTTPException(status_code=400, detail="format must be 'rows' or 'columnar'")
+
+        agent = create_agent(db)
 
         await agent.train_model(tenant_id, branch_id)
 
@@ -122,65 +173,297 @@ async def predict_cash_flow(
             scenario
         )
 
-        for pred in predictions:
-            await db.execute("""
-                INSERT INTO public.cash_flow_predictions
-                (tenant_id, branch_id, prediction_date, predicted_balance, model_version, factors_used,
-                 confidence_score, risk_level, risk_color, scenario_type, recommendations)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
-                ON CONFLICT (tenant_id, branch_id, prediction_date, scenario_type)
-                DO UPDATE SET
-                    predicted_balance = $4,
-                    factors_used = $6,
-                    confidence_score = $7,
-                    risk_level = $8,
-                    risk_color = $9,
-                    recommendations = $11,
-                    updated_at = NOW()
-            """,
-                tenant_id,
-                branch_id,
-                pred.date,
-                pred.predicted_balance,
-                agent.model_version,
-                pred.factors,
-                pred.confidence_score,
-                pred.risk_level,
-                pred.risk_color,
-                pred.scenario_type,
-                pred.recommendations
-            )
+        version = await agent.save_predictions(tenant_id, branch_id, predictions)
 
         logger.info(f"Prediction completed for tenant {tenant_id}: {len(predictions)} days")
 
+        response.headers["X-Forecast-Version"] = str(version)
+
+        if response_format == 'columnar':
+            return ColumnarForecast.from_predictions(predictions, scenario)
+
         return predictions
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/ai/cash-flow/scenarios")
+@app.get("/api/ai/cash-flow/predict/delta", dependencies=[Depends(admission.dependency('light'))])
+async def predict_cash_flow_delta(
+    tenant_id: str,
+    forecast_days: int = 30,
+    branch_id: Optional[str] = None,
+    scenario: str = 'realistic',
+    since_version: Optional[int] = None,
+    db: asyncpg.Pool = Depends(get_db)
+) -> ForecastDelta:
+    """
+    Kaydedilmiş tahminin istemcideki sürümden sonra değişen günleri
+
+    - **since_version**: İstemcinin son aldığı sürüm (yoksa tam tahmin döner)
+    - Saatlik güncelleme tahminleri yeniden yazar; yalnızca değeri değişen günler yeni sürümü alır
+    - İstemci `FORECAST_DELTA_MAX_LAG` sürümden fazla gerideyse `full=true` ile tüm pencere döner
+    - Yalnızca okur: seri hiç kaydedilmemişse 404, kayıtlı pencere `forecast_days`'i kapsamıyorsa 409
+      (önce aynı parametrelerle POST /predict)
+    """
+
+    if forecast_days < 7 or forecast_days > 90:
+        raise HTTPException(status_code=400, detail="forecast_days must be between 7 and 90")
+
+    if scenario not in ['pessimistic', 'realistic', 'optimistic']:
+        raise HTTPException(
+            status_code=400,
+            detail="scenario must be 'pessimistic', 'realistic', or 'optimistic'"
+        )
+
+    try:
+        reader = ForecastDeltaReader(db)
+        delta = await reader.read(tenant_id, branch_id, scenario, forecast_days, since_version)
+
+    except Exception as e:
+        logger.error(f"Forecast delta error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if delta is None:
+        raise HTTPException(
+            status_code=404,
+            detail="forecast not stored yet, call POST /api/ai/cash-flow/predict first"
+        )
+
+    if delta.stored_until < delta.window_end:
+        raise HTTPException(
+            status_code=409,
+            detail=(
+                f"stored forecast ends before {delta.window_end.isoformat()} "
+                f"(stored until {delta.stored_until.isoformat()}), "
+                f"call POST /api/ai/cash-flow/predict with forecast_days={forecast_days}"
+            )
+        )
+
+    return delta
+
+
+@app.post("/api/ai/cash-flow/predict/branches", dependencies=[Depends(admission.dependency('forecast'))])
+async def predict_branch_fanout(
+    tenant_id: str,
+    forecast_days: int = 30,
+    scenario: str = 'realistic',
+    response_format: str = Query('rows', alias='format'),
+    db: asyncpg.Pool = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    Tüm şubeler ve konsolide toplam için nakit akışı tahmini
+
+    - Bakiyeler ve bekleyen işlemler şubeye göre tek seferde okunur, tüm şubeler tek vektörel geçişte hesaplanır
+    - **consolidated**: tüm şubeler ve şubesiz kayıtlar (branch_id olmadan /predict ile aynı seri)
+    - **branches**: şube ID -> günlük tahmin
+    - Tüm seriler tek toplu yazımla kaydedilir; **versions** seri sürümleridir (konsolide: `consolidated`)
+    """
+
+    if forecast_days < 7 or forecast_days > 90:
+        raise HTTPException(status_code=400, detail="forecast_days must be between 7 and 90")
+
+    if scenario not in ['pessimistic', 'realistic', 'optimistic']:
+        raise HTTPException(
+            status_code=400,
+            detail="scenario must be 'pessimistic', 'realistic', or 'optimistic'"
+        )
+
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'rows' or 'columnar'")
+
+    try:
+        agent = create_agent(db)
+
+        await agent.train_model(tenant_id)
+
+        forecast = await agent.predict_branch_fanout(tenant_id, forecast_days, scenario)
+        versions = await agent.save_prediction_series(tenant_id, forecast.series, forecast.change_watermark)
+
+        def encode(predictions: List[PredictionResult]) -> Union[List[PredictionResult], ColumnarForecast]:
+            if response_format == 'columnar':
+                return ColumnarForecast.from_predictions(predictions, scenario)
+            return predictions
+
+        return {
+            'consolidated': encode(forecast.series[None]),
+            'branches': {
+                branch_id: encode(predictions)
+                for branch_id, predictions in forecast.series.items()
+                if branch_id is not None
+            },
+            'versions': {branch_id or 'consolidated': version for branch_id, version in versions.items()}
+        }
+
+    except Exception as e:
+        logger.error(f"Branch fan-out prediction error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/ai/cash-flow/predict/bands", dependencies=[Depends(admission.dependency('forecast'))])
+async def predict_balance_bands(
+    tenant_id: str,
+    forecast_days: int = 30,
+    branch_id: Optional[str] = None,
+    scenario: str = 'realistic',
+    paths: Optional[int] = None,
+    seed: Optional[int] = None,
+    db: asyncpg.Pool = Depends(get_db)
+) -> ProbabilisticForecast:
+    """
+    Olasılıklı nakit akışı tahmini (Monte Carlo bakiye bantları)
+
+    - Her yolda bekleyen işlemlerin gecikmesi, modelin test hatası dağılımından işlem başına örneklenir
+    - **p10 / p50 / p90**: gün sonu bakiye bantları, **negative_probability**: bakiyenin eksi olma olasılığı
+    - **paths**: yol sayısı (varsayılan MONTE_CARLO_PATHS), **seed**: tekrarlanabilir sonuç için
+    - Tahmin kaydedilmez
+    """
+
+    if forecast_days < 7 or forecast_days > 90:
+        raise HTTPException(status_code=400, detail="forecast_days must be between 7 and 90")
+
+    if scenario not in ['pessimistic', 'realistic', 'optimistic']:
+        raise HTTPException(
+            status_code=400,
+            detail="scenario must be 'pessimistic', 'realistic', or 'optimistic'"
+        )
+
+    if paths is not None and (paths < 100 or paths > MONTE_CARLO_MAX_PATHS):
+        raise HTTPException(status_code=400, detail=f"paths must be between 100 and {MONTE_CARLO_MAX_PATHS}")
+
+    try:
+        agent = create_agent(db)
+
+        await agent.train_model(tenant_id, branch_id)
+
+        result = await agent.simulate_cash_flow(tenant_id, forecast_days, branch_id, scenario, paths, seed)
+
+        return result
+
+    except Exception as e:
+        logger.error(f"Monte Carlo prediction error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/ai/cash-flow/predict/long-horizon", dependencies=[Depends(admission.dependency('forecast'))])
+async def predict_long_horizon(
+    tenant_id: str,
+    forecast_days: int = 365,
+    branch_id: Optional[str] = None,
+    scenario: str = 'realistic',
+    db: asyncpg.Pool = Depends(get_db)
+) -> LongHorizonForecast:
+    """
+    90 günün ötesi için uzun vadeli nakit akışı tahmini
+
+    - Yakın vade günlük, ardından haftalık ve aylık kovalar (LONG_HORIZON_DAILY_DAYS / LONG_HORIZON_WEEKLY_DAYS)
+    - Uzak kovalarda bekleyen işlemler son 12 ayın mevsimsel akış profiliyle tamamlanır
+    - Kova başına giriş, çıkış, kapanış ve en düşük bakiye, risk seviyesi (sütunsal)
+    - Seri başına tek satır olarak ai_long_horizon_forecasts tablosuna kaydedilir
+    """
+
+    if forecast_days < 7 or forecast_days > LONG_HORIZON_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"forecast_days must be between 7 and {LONG_HORIZON_MAX_DAYS}")
+
+    if scenario not in ['pessimistic', 'realistic', 'optimistic']:
+        raise HTTPException(
+            status_code=400,
+            detail="scenario must be 'pessimistic', 'realistic', or 'optimistic'"
+        )
+
+    try:
+        agent = create_agent(db)
+
+        await agent.train_model(tenant_id, branch_id)
+
+        forecast = await agent.predict_long_horizon(tenant_id, forecast_days, branch_id, scenario)
+        await agent.save_long_horizon(tenant_id, branch_id, forecast)
+
+        return forecast
+
+    except Exception as e:
+        logger.error(f"Long-horizon prediction error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/ai/cash-flow/what-if", dependencies=[Depends(admission.dependency('forecast'))])
+async def evaluate_what_if(
+    tenant_id: str,
+    request: WhatIfRequest,
+    forecast_days: int = 30,
+    branch_id: Optional[str] = None,
+    db: asyncpg.Pool = Depends(get_db)
+) -> WhatIfResult:
+    """
+    Kullanıcı tanımlı senaryoları veya parametre ızgarasını değerlendir
+
+    - **scenarios**: name, inflow_adjustment, outflow_adjustment (%), delay_days listesi
+    - **grid**: inflow_adjustments × outflow_adjustments × delay_days kombinasyonları
+    - Girdiler bir kez okunur, tüm senaryolar tek toplu hesapla değerlendirilir (tahmin kaydedilmez)
+    - Senaryo başına son bakiye, en düşük bakiye ve tarihi, ilk eksi gün (runway) ve kritik gün sayısı
+    """
+
+    if forecast_days < 7 or forecast_days > 90:
+        raise HTTPException(status_code=400, detail="forecast_days must be between 7 and 90")
+
+    # Izgara açılmadan önce boyut kontrolü (büyük çarpımlar bellekte üretilmez)
+    points = request.size()
+
+    if not points:
+        raise HTTPException(status_code=400, detail="scenarios or grid is required")
+
+    if points > WHAT_IF_MAX_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"too many scenarios: {points} > {WHAT_IF_MAX_POINTS}"
+        )
+
+    scenarios = request.expand()
+
+    try:
+        agent = create_agent(db)
+
+        await agent.train_model(tenant_id, branch_id)
+
+        result = await agent.evaluate_scenarios(tenant_id, scenarios, forecast_days, branch_id)
+
+        return result
+
+    except Exception as e:
+        logger.error(f"What-if evaluation error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/ai/cash-flow/scenarios", dependencies=[Depends(admission.dependency('forecast'))])
 async def get_scenario_comparison(
     tenant_id: str,
     forecast_days: int = 30,
     branch_id: Optional[str] = None,
+    response_format: str = Query('rows', alias='format'),
     db: asyncpg.Pool = Depends(get_db)
-):
+) -> Dict[str, Any]:
     """
     Tüm senaryoları karşılaştır
 
     - Kötümser, gerçekçi, iyimser senaryolar
     - Her senaryo için: tahminler, final bakiye, kritik günler
+    - **format**: 'columnar' ile her senaryonun tahminleri sütunsal biçimde döner
     """
 
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'rows' or 'columnar'")
+
     try:
-        agent = EnhancedCashFlowAIAgent(db)
+        agent = create_agent(db)
 
         scenarios = await agent.calculate_scenario_comparison(
             tenant_id,
             forecast_days,
-            branch_id
+            branch_id,
+            columnar=response_format == 'columnar'
         )
 
         return scenarios
@@ -190,7 +473,7 @@ async def get_scenario_comparison(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/ai/cash-flow/train")
+@app.post("/api/ai/cash-flow/train", dependencies=[Depends(admission.dependency('train'))])
 async def train_model(
     tenant_id: str,
     branch_id: Optional[str] = None,
@@ -206,7 +489,7 @@ async def train_model(
     """
 
     try:
-        agent = EnhancedCashFlowAIAgent(db)
+        agent = create_agent(db)
 
         metrics = await agent.train_model(tenant_id, branch_id, force_retrain)
 
@@ -219,7 +502,94 @@ async def train_model(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/ai/cash-flow/accuracy")
+@app.post("/api/ai/jobs/train", dependencies=[Depends(admission.dependency('light'))])
+async def enqueue_training_job(
+    tenant_id: str,
+    branch_id: Optional[str] = None,
+    force_retrain: bool = True,
+    priority: int = 0,
+    db: asyncpg.Pool = Depends(get_db)
+) -> JobReceipt:
+    """Model eğitimini kuyruğa al (worker.py çalıştırır)"""
+
+    try:
+        job_id = await JobQueue(db).enqueue(
+            'train',
+            tenant_id,
+            branch_id,
+            payload={'force_retrain': force_retrain},
+            priority=priority
+        )
+
+    except Exception as e:
+        logger.error(f"Training job enqueue error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="Equivalent job changed state while enqueuing, retry")
+
+    return JobReceipt(job_id=job_id)
+
+
+@app.post("/api/ai/jobs/forecast", dependencies=[Depends(admission.dependency('light'))])
+async def enqueue_forecast_job(
+    tenant_id: str,
+    forecast_days: int = 30,
+    branch_id: Optional[str] = None,
+    scenario: str = 'realistic',
+    priority: int = 0,
+    db: asyncpg.Pool = Depends(get_db)
+) -> JobReceipt:
+    """Tahmin hesaplamasını kuyruğa al; sonuçlar cash_flow_predictions tablosuna yazılır"""
+
+    if forecast_days < 7 or forecast_days > 90:
+        raise HTTPException(status_code=400, detail="forecast_days must be between 7 and 90")
+
+    if scenario not in ['pessimistic', 'realistic', 'optimistic']:
+        raise HTTPException(
+            status_code=400,
+            detail="scenario must be 'pessimistic', 'realistic', or 'optimistic'"
+        )
+
+    try:
+        job_id = await JobQueue(db).enqueue(
+            'forecast',
+            tenant_id,
+            branch_id,
+            payload={'forecast_days': forecast_days, 'scenario': scenario},
+            priority=priority
+        )
+
+    except Exception as e:
+        logger.error(f"Forecast job enqueue error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="Equivalent job changed state while enqueuing, retry")
+
+    return JobReceipt(job_id=job_id)
+
+
+@app.get("/api/ai/jobs/{job_id}", dependencies=[Depends(admission.dependency('light'))])
+async def get_job_status(
+    job_id: str,
+    db: asyncpg.Pool = Depends(get_db)
+):
+    """Kuyruktaki işin durumunu getir"""
+
+    try:
+        job = await JobQueue(db).get_job(job_id)
+    except Exception as e:
+        logger.error(f"Job status error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+
+@app.get("/api/ai/cash-flow/accuracy", dependencies=[Depends(admission.dependency('light'))])
 async def get_model_accuracy(
     tenant_id: str,
     branch_id: Optional[str] = None,
@@ -233,41 +603,65 @@ async def get_model_accuracy(
     """
 
     try:
-        latest_metrics = await db.fetchrow("""
-            SELECT *
-            FROM public.ai_model_metrics
+        # Özet, mutabakat ve eğitim sırasında güncellenir; (tenant_id, branch_id) tekil indeksi ile tek satır
+        rollup = await db.fetchrow("""
+            SELECT
+                reconciled_days,
+                mean_accuracy_7d,
+                mean_accuracy_30d,
+                mean_accuracy_90d,
+                mean_abs_error_30d,
+                p50_abs_error_30d,
+                p90_abs_error_30d,
+                last_reconciled_date,
+                recent_predictions,
+                model_accuracy_score,
+                model_mae,
+                model_rmse,
+                model_training_date,
+                model_data_points,
+                model_version,
+                model_sampling_ratio,
+                model_scope,
+                updated_at
+            FROM public.ai_accuracy_rollups
             WHERE tenant_id = $1
-            AND ($2::uuid IS NULL OR branch_id = $2)
-            ORDER BY training_date DESC
-            LIMIT 1
+            AND branch_id IS NOT DISTINCT FROM $2::uuid
         """, tenant_id, branch_id)
 
-        if not latest_metrics:
+        if not rollup or rollup['model_training_date'] is None:
             return {
                 "message": "Model henüz eğitilmemiş",
                 "accuracy_score": 0
             }
 
-        accuracy_data = await db.fetch("""
-            SELECT
-                prediction_date,
-                predicted_balance,
-                actual_balance,
-                accuracy_score
-            FROM public.cash_flow_predictions
-            WHERE tenant_id = $1
-            AND ($2::uuid IS NULL OR branch_id = $2)
-            AND actual_balance IS NOT NULL
-            ORDER BY prediction_date DESC
-            LIMIT 30
-        """, tenant_id, branch_id)
-
-        import numpy as np
+        def as_float(value):
+            return float(value) if value is not None else None
 
         return {
-            "model_metrics": dict(latest_metrics),
-            "recent_predictions": [dict(row) for row in accuracy_data],
-            "average_accuracy": np.mean([row['accuracy_score'] for row in accuracy_data]) if accuracy_data else 0
+            "model_metrics": {
+                "accuracy_score": as_float(rollup['model_accuracy_score']),
+                "mae": as_float(rollup['model_mae']),
+                "rmse": as_float(rollup['model_rmse']),
+                "training_date": rollup['model_training_date'],
+                "data_points": rollup['model_data_points'],
+                "model_version": rollup['model_version'],
+                "sampling_ratio": as_float(rollup['model_sampling_ratio']),
+                "model_scope": rollup['model_scope']
+            },
+            "recent_predictions": rollup['recent_predictions'],
+            "average_accuracy": as_float(rollup['mean_accuracy_30d']) or 0,
+            "rolling_accuracy": {
+                "mean_7d": as_float(rollup['mean_accuracy_7d']),
+                "mean_30d": as_float(rollup['mean_accuracy_30d']),
+                "mean_90d": as_float(rollup['mean_accuracy_90d']),
+                "mean_abs_error_30d": as_float(rollup['mean_abs_error_30d']),
+                "p50_abs_error_30d": as_float(rollup['p50_abs_error_30d']),
+                "p90_abs_error_30d": as_float(rollup['p90_abs_error_30d']),
+                "reconciled_days_30d": rollup['reconciled_days'],
+                "last_reconciled_date": rollup['last_reconciled_date']
+            },
+            "updated_at": rollup['updated_at']
         }
 
     except Exception as e:
@@ -275,7 +669,7 @@ async def get_model_accuracy(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/ai/rules/create")
+@app.post("/api/ai/rules/create", dependencies=[Depends(admission.dependency('light'))])
 async def create_rule(
     tenant_id: str,
     rule: RuleDefinition,
@@ -296,7 +690,7 @@ async def create_rule(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/ai/rules/marketplace-delay")
+@app.post("/api/ai/rules/marketplace-delay", dependencies=[Depends(admission.dependency('light'))])
 async def create_marketplace_delay_rule(
     tenant_id: str,
     marketplace_name: str,
@@ -322,7 +716,7 @@ async def create_marketplace_delay_rule(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/ai/rules/seasonal")
+@app.post("/api/ai/rules/seasonal", dependencies=[Depends(admission.dependency('light'))])
 async def create_seasonal_rule(
     tenant_id: str,
     name: str,
@@ -352,7 +746,33 @@ async def create_seasonal_rule(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/ai/rules")
+@app.post("/api/ai/rules/simulate", dependencies=[Depends(admission.dependency('forecast'))])
+async def simulate_rule(
+    tenant_id: str,
+    rule: RuleDefinition,
+    branch_id: Optional[str] = None,
+    horizon_days: int = 90,
+    db: asyncpg.Pool = Depends(get_db)
+):
+    """
+    Kaydedilmemiş bir kuralın etkisini simüle et
+
+    - Tüm bekleyen işlemler üzerinde etkilenen adet ve tutarlar
+    - Güven skoru değişim dağılımı
+    - Günlük tahmini bakiye değişimi
+    """
+
+    try:
+        engine = CashFlowRuleEngine(db)
+
+        return await engine.simulate_rule_impact(tenant_id, rule, branch_id, horizon_days)
+
+    except Exception as e:
+        logger.error(f"Rule simulation error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/ai/rules", dependencies=[Depends(admission.dependency('light'))])
 async def get_rules(
     tenant_id: str,
     db: asyncpg.Pool = Depends(get_db)
@@ -370,7 +790,7 @@ async def get_rules(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.delete("/api/ai/rules/{rule_id}")
+@app.delete("/api/ai/rules/{rule_id}", dependencies=[Depends(admission.dependency('light'))])
 async def deactivate_rule(
     rule_id: str,
     db: asyncpg.Pool = Depends(get_db)
@@ -1,16 +1,36 @@
 import asyncio
-import asyncpg
 import os
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import logging
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
-from services.ai_agent.enhanced_predictor import EnhancedCashFlowAIAgent
+from services.ai_agent.enhanced_predictor import EnhancedCashFlowAIAgent, MIN_TENANT_TRAINING_ROWS
+from services.ai_agent.retrain_policy import RetrainPolicy
+from services.db import create_pool
+from services.incremental_forecast import IncrementalForecastUpdater
+from services.job_queue import JobQueue
+from services.load_shaping import LoadShapedRunner, tenant_offset
+from services.prediction_partitions import PredictionPartitionMaintainer
+from services.reconciliation import PredictionReconciler
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 'burst': tüm tenant'lar döngü başında sırayla, 'spread': pencere boyunca yayılmış
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "burst")
+HOURLY_WINDOW_SECONDS = float(os.getenv("SCHEDULER_HOURLY_WINDOW_SECONDS", 3600))
+NIGHTLY_WINDOW_SECONDS = float(os.getenv("SCHEDULER_NIGHTLY_WINDOW_SECONDS", 3 * 3600))
+# 'inline': işleri bu süreçte çalıştır, 'queue': ai_jobs kuyruğuna ekle (worker.py çalıştırır)
+SCHEDULER_DISPATCH = os.getenv("SCHEDULER_DISPATCH", "inline")
+# 'signals': yalnızca eşikleri aşan tenant'lar yeniden eğitilir, 'always': her gece tüm aktif tenant'lar
+RETRAIN_POLICY = os.getenv("RETRAIN_POLICY", "signals")
+# true: saatlik güncelleme tenant'ın tüm şubelerini ve konsolide toplamı tek geçişte hesaplar
+# (yalnızca aggregate modunda; varsayılan kapalı: yalnızca tenant geneli seri)
+FORECAST_BRANCH_FANOUT = os.getenv("FORECAST_BRANCH_FANOUT", "false").lower() in ("1", "true", "yes")
+# cash_flow değişikliklerini saatlik döngüyü beklemeden kayıtlı tahminlere uygula
+INCREMENTAL_FORECAST_UPDATES = os.getenv("INCREMENTAL_FORECAST_UPDATES", "true").lower() in ("1", "true", "yes")
+
 
 class CashFlowScheduler:
     """Otomatik görev zamanlayıcı"""
@@ -18,55 +38,137 @@ class CashFlowScheduler:
     def __init__(self):
         self.scheduler = AsyncIOScheduler()
         self.db_pool = None
+        self.runner = None
+        self.queue = None
+        self.retrain_policy = None
+        self.reconciler = None
+        self.partitions = None
+        self.incremental = None
+        self.incremental_task = None
+        self.mode = SCHEDULER_MODE
+        self.dispatch = SCHEDULER_DISPATCH
 
     async def initialize(self):
         """Veritabanı bağlantısını başlat"""
-        db_url = os.getenv("DATABASE_URL")
-        if not db_url:
-            raise RuntimeError("DATABASE_URL environment variable not set")
-
-        self.db_pool = await asyncpg.create_pool(
-            db_url,
-            min_size=2,
-            max_size=5
-        )
+        self.db_pool = await create_pool(min_size=2, max_size=5)
         logger.info("Scheduler database pool created")
 
-    async def nightly_model_training(self):
-        """Her gece saat 02:00'de tüm tenant'lar için model eğitimi"""
-        logger.info("Starting nightly model training...")
-
-        try:
-            tenants = await self.db_pool.fetch("""
-                SELECT DISTINCT tenant_id
-                FROM public.cash_flow
-                WHERE created_at > NOW() - INTERVAL '30 days'
-            """)
+        self.queue = JobQueue(self.db_pool)
+        self.retrain_policy = RetrainPolicy.from_env(self.db_pool)
+        self.reconciler = PredictionReconciler(
+            self.db_pool,
+            tenant_batch_size=int(os.getenv("RECONCILE_TENANT_BATCH_SIZE", 200))
+        )
+        self.partitions = PredictionPartitionMaintainer(self.db_pool)
+        self.incremental = IncrementalForecastUpdater(self.db_pool)
+        self.runner = LoadShapedRunner(
+            self.db_pool,
+            spread_ratio=float(os.getenv("SCHEDULER_SPREAD_RATIO", 0.75)),
+            max_concurrency=int(os.getenv("SCHEDULER_SPREAD_MAX_CONCURRENCY", 3)),
+            target_pool_wait_ms=float(os.getenv("SCHEDULER_TARGET_POOL_WAIT_MS", 50)),
+            target_db_latency_ms=float(os.getenv("SCHEDULER_TARGET_DB_LATENCY_MS", 100))
+        )
 
-            logger.info(f"Found {len(tenants)} tenants to train")
+    async def _train_tenant(self, tenant_id: str):
+        """Tek tenant için model eğitimi"""
+        agent = EnhancedCashFlowAIAgent(self.db_pool)
+        metrics = await agent.train_model(tenant_id, force_retrain=True)
 
-            for tenant in tenants:
-                tenant_id = str(tenant['tenant_id'])
+        logger.info(
+            f"Tenant {tenant_id} trained: "
+            f"Accuracy {metrics.accuracy_score:.2f}%, "
+            f"Data points: {metrics.data_points}"
+        )
 
-                try:
-                    agent = EnhancedCashFlowAIAgent(self.db_pool)
-                    metrics = await agent.train_model(tenant_id, force_retrain=True)
+    async def _enqueue_cycle(self, job_name: str, job_type: str, tenant_ids, window_seconds: float, payload: dict):
+        """Döngüdeki tenant işlerini kuyruğa ekle; spread modunda run_after ofsetlere göre dağıtılır"""
+
+        now = datetime.now(timezone.utc)
+        spread_seconds = window_seconds * self.runner.spread_ratio
+
+        jobs = [
+            {
+                'job_type': job_type,
+                'tenant_id': tenant_id,
+                'payload': payload,
+                'run_after': now + timedelta(
+                    seconds=tenant_offset(tenant_id, job_name, spread_seconds) if self.mode == 'spread' else 0
+                )
+            }
+            for tenant_id in tenant_ids
+        ]
+
+        enqueued = await self.queue.enqueue_many(jobs)
+        logger.info(f"{job_name}: {enqueued}/{len(jobs)} jobs enqueued")
+
+    async def _select_training_tenants(self):
+        """Bu gece yeniden eğitilecek tenant'lar"""
+
+        if RETRAIN_POLICY == 'signals':
+            decisions = await self.retrain_policy.evaluate()
+            return [decision.tenant_id for decision in decisions if decision.retrain]
+
+        # Küçük tenant'lar ortak modeli kullanır; yalnızca yeterli verisi olanlar ayrıca eğitilir
+        tenants = await self.db_pool.fetch("""
+            SELECT tenant_id
+            FROM public.cash_flow
+            WHERE status = 'cleared'
+            AND actual_date IS NOT NULL
+            AND created_at > NOW() - INTERVAL '12 months'
+            GROUP BY tenant_id
+            HAVING COUNT(*) >= $1
+            AND MAX(created_at) > NOW() - INTERVAL '30 days'
+        """, MIN_TENANT_TRAINING_ROWS)
+
+        return [str(tenant['tenant_id']) for tenant in tenants]
 
-                    logger.info(
-                        f"Tenant {tenant_id} trained: "
-                        f"Accuracy {metrics.accuracy_score:.2f}%, "
-                        f"Data points: {metrics.data_points}"
-                    )
+    async def nightly_model_training(self):
+        """Her gece saat 02:00'de tüm tenant'lar için model eğitimi"""
+        logger.info("Starting nightly model training...")
 
-                except Exception as e:
-                    logger.error(f"Training failed for tenant {tenant_id}: {str(e)}")
-                    continue
+        try:
+            try:
+                await EnhancedCashFlowAIAgent(self.db_pool).train_global_model()
+            except Exception as e:
+                logger.error(f"Global model training failed: {str(e)}", exc_info=True)
+
+            tenant_ids = await self._select_training_tenants()
+
+            logger.info(f"Found {len(tenant_ids)} tenants to train")
+
+            if self.dispatch == 'queue':
+                await self._enqueue_cycle(
+                    'nightly_training', 'train', tenant_ids, NIGHTLY_WINDOW_SECONDS, {'force_retrain': True}
+                )
+                await self.queue.purge_finished()
+            elif self.mode == 'spread':
+                await self.runner.run_cycle(
+                    'nightly_training',
+                    tenant_ids,
+                    self._train_tenant,
+                    window_seconds=NIGHTLY_WINDOW_SECONDS
+                )
+            else:
+                for tenant_id in tenant_ids:
+                    try:
+                        await self._train_tenant(tenant_id)
+                    except Exception as e:
+                        logger.error(f"Training failed for tenant {tenant_id}: {str(e)}")
+                        continue
 
             logger.info("Nightly model training completed")
 
         except Exception as e:
             logger.error(f"Nightly training error: {str(e)}", exc_info=True)
 
+    async def _update_tenant_predictions(self, tenant_id: str):
+        """Tek tenant için 30 günlük tahmini ve istek üzerine kaydedilmiş diğer serileri güncelle"""
+        agent = EnhancedCashFlowAIAgent(self.db_pool)
+
+        series = await agent.refresh_tenant_forecasts(tenant_id, FORECAST_BRANCH_FANOUT)
+
+        logger.info(f"Tenant {tenant_id} predictions updated: {series} series")
+
     async def hourly_prediction_update(self):
         """Her saat başı tahminleri güncelle"""
         logger.info("Starting hourly prediction update...")
@@ -78,61 +180,72 @@ class CashFlowScheduler:
                 WHERE status IN ('pending', 'partial', 'overdue')
             """)
 
-            for tenant in tenants:
-                tenant_id = str(tenant['tenant_id'])
-
-                try:
-                    agent = EnhancedCashFlowAIAgent(self.db_pool)
-
-                    predictions = await agent.predict_cash_flow(
-                        tenant_id,
-                        forecast_days=30,
-                        scenario_type='realistic'
-                    )
-
-                    for pred in predictions:
-                        await self.db_pool.execute("""
-                            INSERT INTO public.cash_flow_predictions
-                            (tenant_id, prediction_date, predicted_balance, model_version,
-                             factors_used, confidence_score, risk_level, risk_color,
-                             scenario_type, recommendations)
-                            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
-                            ON CONFLICT (tenant_id, branch_id, prediction_date, scenario_type)
-                            DO UPDATE SET
-                                predicted_balance = $3,
-                                factors_used = $5,
-                                confidence_score = $6,
-                                risk_level = $7,
-                                risk_color = $8,
-                                recommendations = $10,
-                                updated_at = NOW()
-                        """,
-                            tenant_id,
-                            pred.date,
-                            pred.predicted_balance,
-                            agent.model_version,
-                            pred.factors,
-                            pred.confidence_score,
-                            pred.risk_level,
-                            pred.risk_color,
-                            pred.scenario_type,
-                            pred.recommendations
-                        )
-
-                    logger.info(f"Tenant {tenant_id} predictions updated: {len(predictions)} days")
-
-                except Exception as e:
-                    logger.error(f"Prediction update failed for tenant {tenant_id}: {str(e)}")
-                    continue
+            tenant_ids = [str(tenant['tenant_id']) for tenant in tenants]
+
+            if self.dispatch == 'queue':
+                await self._enqueue_cycle(
+                    'hourly_predictions', 'forecast', tenant_ids, HOURLY_WINDOW_SECONDS,
+                    {'forecast_days': 30, 'scenario': 'realistic', 'branches': FORECAST_BRANCH_FANOUT, 'refresh': True}
+                )
+            elif self.mode == 'spread':
+                await self.runner.run_cycle(
+                    'hourly_predictions',
+                    tenant_ids,
+                    self._update_tenant_predictions,
+                    window_seconds=HOURLY_WINDOW_SECONDS
+                )
+            else:
+                for tenant_id in tenant_ids:
+                    try:
+                        await self._update_tenant_predictions(tenant_id)
+                    except Exception as e:
+                        logger.error(f"Prediction update failed for tenant {tenant_id}: {str(e)}")
+                        continue
 
             logger.info("Hourly prediction update completed")
 
         except Exception as e:
             logger.error(f"Hourly update error: {str(e)}", exc_info=True)
 
+    async def daily_accuracy_reconciliation(self):
+        """Her gece 01:00'de geçmiş tahmin günlerini gerçekleşen bakiyeyle eşleştir"""
+        logger.info("Starting prediction accuracy reconciliation...")
+
+        try:
+            await self.reconciler.run()
+        except Exception as e:
+            logger.error(f"Reconciliation error: {str(e)}", exc_info=True)
+
+    async def daily_partition_maintenance(self):
+        """Her gece 00:30'da (ve açılışta) tahmin bölümlerini hazırla, eskileri özete indir"""
+        logger.info("Starting prediction partition maintenance...")
+
+        try:
+            await self.partitions.run()
+        except Exception as e:
+            logger.error(f"Partition maintenance error: {str(e)}", exc_info=True)
+
     def start(self):
         """Zamanlayıcıyı başlat"""
 
+        # Açılışta da çalışır: zamanlayıcı uzun süre kapalı kaldıysa yazılacak aylar için bölüm eksik olabilir
+        self.scheduler.add_job(
+            self.daily_partition_maintenance,
+            CronTrigger(hour=0, minute=30),
+            id='partition_maintenance',
+            name='Prediction Partition Maintenance',
+            next_run_time=datetime.now(),
+            replace_existing=True
+        )
+
+        self.scheduler.add_job(
+            self.daily_accuracy_reconciliation,
+            CronTrigger(hour=1, minute=0),
+            id='accuracy_reconciliation',
+            name='Prediction Accuracy Reconciliation',
+            replace_existing=True
+        )
+
         self.scheduler.add_job(
             self.nightly_model_training,
             CronTrigger(hour=2, minute=0),
@@ -150,12 +263,27 @@ class CashFlowScheduler:
         )
 
         self.scheduler.start()
-        logger.info("Scheduler started successfully")
+
+        if INCREMENTAL_FORECAST_UPDATES:
+            self.incremental_task = asyncio.create_task(self.incremental.run())
+
+        logger.info(
+            f"Scheduler started successfully "
+            f"(mode: {self.mode}, dispatch: {self.dispatch}, retrain policy: {RETRAIN_POLICY}, "
+            f"incremental updates: {INCREMENTAL_FORECAST_UPDATES})"
+        )
 
     async def stop(self):
         """Zamanlayıcıyı durdur"""
         self.scheduler.shutdown()
 
+        if self.incremental_task:
+            self.incremental_task.cancel()
+            try:
+                await self.incremental_task
+            except asyncio.CancelledError:
+                pass
+
         if self.db_pool:
             await self.db_pool.close()
 
@@ -0,0 +1,149 @@
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+
+class EndpointClassLimits(BaseModel):
+    """Uç nokta sınıfı için kapasite ayarları"""
+    max_concurrency: int
+    max_queue: int
+    queue_timeout_seconds: float
+    min_retry_after_seconds: int = 1
+
+
+DEFAULT_LIMITS: Dict[str, EndpointClassLimits] = {
+    'train': EndpointClassLimits(max_concurrency=2, max_queue=4, queue_timeout_seconds=10.0, min_retry_after_seconds=30),
+    'forecast': EndpointClassLimits(max_concurrency=6, max_queue=24, queue_timeout_seconds=5.0, min_retry_after_seconds=2),
+    'light': EndpointClassLimits(max_concurrency=12, max_queue=64, queue_timeout_seconds=2.0),
+}
+
+
+class EndpointGate:
+    """Tek bir uç nokta sınıfı için eşzamanlılık kapısı ve sınırlı bekleme kuyruğu"""
+
+    def __init__(self, name: str, limits: EndpointClassLimits):
+        self.name = name
+        self.limits = limits
+        self._semaphore = asyncio.Semaphore(limits.max_concurrency)
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.admitted_total = 0
+        self.rejected_queue_full_total = 0
+        self.rejected_timeout_total = 0
+        self.avg_service_seconds = 0.0
+
+    def _retry_after(self) -> int:
+        """Kuyruğun boşalma süresine göre Retry-After tahmini"""
+
+        backlog = (self.queue_depth + 1) / self.limits.max_concurrency
+        estimate = math.ceil(self.avg_service_seconds * backlog)
+
+        return max(self.limits.min_retry_after_seconds, estimate)
+
+    def _reject(self, status_code: int, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self._retry_after())}
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        """Kapasite varsa slot ver, yoksa 429/503 ile hızlıca reddet"""
+
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+        else:
+            if self.queue_depth >= self.limits.max_queue:
+                self.rejected_queue_full_total += 1
+                raise self._reject(429, f"{self.name} capacity exhausted, queue is full")
+
+            self.queue_depth += 1
+            try:
+                await asyncio.wait_for(
+                    self._semaphore.acquire(),
+                    timeout=self.limits.queue_timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                self.rejected_timeout_total += 1
+                raise self._reject(503, f"{self.name} queue wait exceeded {self.limits.queue_timeout_seconds}s")
+            finally:
+                self.queue_depth -= 1
+
+        self.in_flight += 1
+        self.admitted_total += 1
+        started = time.monotonic()
+
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self.avg_service_seconds = (
+                elapsed if self.avg_service_seconds == 0
+                else 0.8 * self.avg_service_seconds + 0.2 * elapsed
+            )
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def snapshot(self) -> Dict:
+        return {
+            'max_concurrency': self.limits.max_concurrency,
+            'max_queue': self.limits.max_queue,
+            'queue_timeout_seconds': self.limits.queue_timeout_seconds,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+            'admitted_total': self.admitted_total,
+            'rejected_queue_full_total': self.rejected_queue_full_total,
+            'rejected_timeout_total': self.rejected_timeout_total,
+            'avg_service_seconds': round(self.avg_service_seconds, 3)
+        }
+
+
+class AdmissionController:
+    """
+    Ağır uç noktalar için kabul kontrolü
+
+    Sınıflar:
+    - train: model eğitimi
+    - forecast: tahmin ve senaryo hesaplama
+    - light: kural ve doğruluk okumaları
+    """
+
+    def __init__(self, limits: Dict[str, EndpointClassLimits]):
+        self.gates = {name: EndpointGate(name, class_limits) for name, class_limits in limits.items()}
+
+    @classmethod
+    def from_env(cls) -> 'AdmissionController':
+        """ADMISSION_<SINIF>_CONCURRENCY / _QUEUE / _QUEUE_TIMEOUT ortam değişkenlerinden oku"""
+
+        limits = {}
+        for name, default in DEFAULT_LIMITS.items():
+            prefix = f"ADMISSION_{name.upper()}"
+            limits[name] = EndpointClassLimits(
+                max_concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", default.max_concurrency)),
+                max_queue=int(os.getenv(f"{prefix}_QUEUE", default.max_queue)),
+                queue_timeout_seconds=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", default.queue_timeout_seconds)),
+                min_retry_after_seconds=default.min_retry_after_seconds
+            )
+
+        return cls(limits)
+
+    def dependency(self, endpoint_class: str):
+        """FastAPI dependency: istek süresince ilgili sınıftan slot tutar"""
+
+        gate = self.gates[endpoint_class]
+
+        async def hold_slot():
+            async with gate.slot():
+                yield
+
+        return hold_slot
+
+    def snapshot(self) -> Dict:
+        return {name: gate.snapshot() for name, gate in self.gates.items()}
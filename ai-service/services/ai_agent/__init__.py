@@ -1,4 +1,19 @@
-from .enhanced_predictor import EnhancedCashFlowAIAgent
-from .rule_engine import CashFlowRuleEngine
+from .models import CashFlowRule, ScenarioType, PredictionResult, ModelMetrics
 
-__all__ = ['EnhancedCashFlowAIAgent', 'CashFlowRuleEngine']
+__all__ = [
+    'EnhancedCashFlowAIAgent', 'CashFlowRuleEngine',
+    'CashFlowRule', 'ScenarioType', 'PredictionResult', 'ModelMetrics'
+]
+
+
+def __getattr__(name):
+    # pandas/scikit-learn yalnızca tahmin motoru ilk kullanıldığında yüklenir
+    if name == 'EnhancedCashFlowAIAgent':
+        from .enhanced_predictor import EnhancedCashFlowAIAgent
+        return EnhancedCashFlowAIAgent
+
+    if name == 'CashFlowRuleEngine':
+        from .rule_engine import CashFlowRuleEngine
+        return CashFlowRuleEngine
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
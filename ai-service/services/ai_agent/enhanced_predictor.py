@@ -1,52 +1,250 @@
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
-from pydantic import BaseModel, Field
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from types import MappingProxyType
+from typing import List, Dict, Mapping, Optional, Tuple
+import asyncio
+import os
+import time
 import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed
 from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 import asyncpg
 import json
 import logging
+import pickle
+
+from .models import (
+    CashFlowRule, ColumnarForecast, LongHorizonForecast, ScenarioType, ScenarioOutcome, PredictionResult,
+    ModelMetrics, ProbabilisticForecast, WhatIfResult
+)
+from .model_cache import CachedModel, model_cache
+from .rule_sql import DEFAULT_SOURCE_CONFIDENCE, SOURCE_CONFIDENCE_MULTIPLIERS
+from . import forecast_math, queries
+from .sampling import StratifiedReservoirSampler
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+FEATURE_COLUMNS = [
+    'amount', 'day_of_week', 'month', 'day_of_month',
+    'is_inflow', 'is_marketplace', 'is_invoice', 'is_expense',
+    'is_weekend', 'is_month_end', 'amount_category', 'seasonal_factor'
+]
+
+TENANT_FEATURE_COLUMNS = [
+    'tenant_log_rows', 'tenant_avg_amount', 'tenant_inflow_share',
+    'tenant_marketplace_share', 'tenant_avg_delay'
+]
+
+GLOBAL_FEATURE_COLUMNS = FEATURE_COLUMNS + TENANT_FEATURE_COLUMNS
+
+GLOBAL_MODEL_KEY = 'global'
+
+# Bu sayının altındaki tenant'lar kendi modelini eğitmez, ortak modeli kullanır
+MIN_TENANT_TRAINING_ROWS = 100
+
+# Tahmin edilen gecikme bu aralığa kırpılır (gün)
+MAX_PREDICTED_DELAY_DAYS = 60
+
+# 'aggregate': kurallar SQL'e çevrilir ve günlük toplamlar veritabanında hesaplanır, 'rows': satır satır Python'da
+FORECAST_INPUT_MODE = os.getenv("FORECAST_INPUT_MODE", "aggregate")
+
+# What-if ızgarası senaryo × bekleyen grup hücresi bu sayıyı aşmayacak parçalarla hesaplanır (bellek sınırı)
+WHAT_IF_CHUNK_CELLS = int(os.getenv("WHAT_IF_CHUNK_CELLS", 2_000_000))
+
+# Monte Carlo bantları: varsayılan yol sayısı; yol × işlem hücresi bu sayıyı aşmayacak parçalarla örneklenir
+MONTE_CARLO_PATHS = int(os.getenv("MONTE_CARLO_PATHS", 2000))
+MONTE_CARLO_CHUNK_CELLS = int(os.getenv("MONTE_CARLO_CHUNK_CELLS", 4_000_000))
+
+# Uzun vade: bu güne kadar günlük, sonra bu güne kadar haftalık, sonrası aylık kovalar
+LONG_HORIZON_DAILY_DAYS = int(os.getenv("LONG_HORIZON_DAILY_DAYS", 30))
+LONG_HORIZON_WEEKLY_DAYS = int(os.getenv("LONG_HORIZON_WEEKLY_DAYS", 90))
+
+# Ay -> mevsimsel katsayı (model özelliği; yeterli geçmişi olmayan tenant'ların uzun vade projeksiyonu)
+MONTH_SEASONAL_FACTORS = {
+    1: 0.9, 2: 0.95, 3: 1.0, 4: 1.05, 5: 1.1, 6: 1.05,
+    7: 0.85, 8: 0.8, 9: 1.1, 10: 1.15, 11: 1.2, 12: 1.25
+}
+
+# Bu sayının üzerindeki geçmişte eğitim verisi katmanlı örneklemle sınırlanır
+TRAINING_MAX_ROWS = int(os.getenv("TRAINING_MAX_ROWS", 50000))
+TRAINING_SAMPLE_HALF_LIFE_DAYS = float(os.getenv("TRAINING_SAMPLE_HALF_LIFE_DAYS", 120))
+# Ortak model: tenant başına en yeni bu kadar kapanmış kayıt (büyük tenant'lar eğitimi domine etmesin)
+GLOBAL_TRAINING_MAX_ROWS_PER_TENANT = int(os.getenv("GLOBAL_TRAINING_MAX_ROWS_PER_TENANT", 2000))
+
+# ai_model_metrics başka modellerle paylaşılır (sütun varsayılanı 'production_decision')
+MODEL_METRICS_TYPE = 'cash_flow_delay'
+
+DEFAULT_HYPERPARAMETERS = {'learning_rate': 0.1, 'max_depth': 5}
+
+# Doğrulama hatası bu kadar ağaç boyunca iyileşmezse ağaç eklemeyi durdur (0: kapalı, sabit 200 ağaç)
+EARLY_STOPPING_ROUNDS = int(os.getenv("TRAINING_EARLY_STOPPING_ROUNDS", 10))
+MAX_ESTIMATORS = int(os.getenv("TRAINING_MAX_ESTIMATORS", 400))
+
+# İsteğe bağlı küçük hiperparametre araması (adaylar çekirdeklere paralel dağıtılır)
+HPARAM_SEARCH = os.getenv("TRAINING_HPARAM_SEARCH", "false").lower() in ("1", "true", "yes")
+HPARAM_SEARCH_JOBS = int(os.getenv("TRAINING_HPARAM_SEARCH_JOBS", -1))
+HPARAM_GRID = [
+    {'learning_rate': learning_rate, 'max_depth': max_depth}
+    for learning_rate in (0.05, 0.1, 0.2)
+    for max_depth in (3, 5, 7)
+]
+
+FORECAST_SCENARIOS = {
+    'pessimistic': ScenarioType(
+        name='pessimistic',
+        inflow_adjustment=-20,
+        outflow_adjustment=10,
+        delay_days=7
+    ),
+    'realistic': ScenarioType(
+        name='realistic',
+        inflow_adjustment=0,
+        outflow_adjustment=0,
+        delay_days=0
+    ),
+    'optimistic': ScenarioType(
+        name='optimistic',
+        inflow_adjustment=15,
+        outflow_adjustment=-10,
+        delay_days=-3
+    )
+}
+
+
+@dataclass(frozen=True)
+class ForecastInputs:
+    """
+    Bir tahminin veritabanı girdileri (salt okunur anlık görüntü)
+
+    Kurallar, güncel bakiye, bekleyen işlemler ve model eş zamanlı okunur; aynı görüntü tüm
+    senaryolarda yeniden kullanılır. `pending` rows modunda işlem satırları, aggregate modunda
+    senaryo başına ağırlıklı toplamları (`weighted_<senaryo>`) içeren gruplardır;
+    `predicted_delays` aynı sıradadır.
+    """
+    tenant_id: str
+    branch_id: Optional[str]
+    mode: str
+    forecast_days: int
+    end_date: datetime
+    current_balance: float
+    rules: Tuple[CashFlowRule, ...]
+    pending: Tuple[Mapping, ...]
+    predicted_delays: Tuple[int, ...]
+    change_watermark: int
+    load_seconds: float
+
+
+def _new_regressor(hyperparameters: Optional[Dict] = None) -> GradientBoostingRegressor:
+    params = {**DEFAULT_HYPERPARAMETERS, **(hyperparameters or {})}
+
+    if EARLY_STOPPING_ROUNDS <= 0:
+        return GradientBoostingRegressor(
+            n_estimators=params.get('n_estimators', 200),
+            learning_rate=params['learning_rate'],
+            max_depth=params['max_depth'],
+            random_state=42
+        )
+
+    return GradientBoostingRegressor(
+        n_estimators=params.get('n_estimators', MAX_ESTIMATORS),
+        learning_rate=params['learning_rate'],
+        max_depth=params['max_depth'],
+        n_iter_no_change=EARLY_STOPPING_ROUNDS,
+        validation_fraction=0.1,
+        random_state=42
+    )
+
+
+def _fit_candidate(hyperparameters: Dict, X_fit, y_fit, X_val, y_val) -> Tuple[float, int]:
+    """Tek aday: erken durdurmalı eğit, doğrulama MAE'si ve kullanılan ağaç sayısını döndür"""
+
+    model = _new_regressor(hyperparameters)
+    model.fit(X_fit, y_fit)
+
+    return mean_absolute_error(y_val, model.predict(X_val)), int(model.n_estimators_)
+
+
+def fit_delay_model(X_train: pd.DataFrame, y_train: pd.Series) -> Tuple[GradientBoostingRegressor, Dict]:
+    """
+    Gecikme modelini eğit (senkron, executor içinde çalıştırılır)
+
+    Arama açıksa adaylar eğitim verisinin %80'inde paralel eğitilir, kalan %20'de seçilir;
+    seçilen parametreler ve erken durdurmanın bulduğu ağaç sayısıyla tüm eğitim verisinde yeniden eğitilir.
+    """
+
+    if not HPARAM_SEARCH or len(X_train) < MIN_TENANT_TRAINING_ROWS:
+        model = _new_regressor()
+        model.fit(X_train, y_train)
+
+        return model, {
+            **DEFAULT_HYPERPARAMETERS,
+            'n_estimators': int(model.n_estimators_),
+            'early_stopping_rounds': EARLY_STOPPING_ROUNDS,
+            'search_candidates': 0
+        }
 
-class CashFlowRule(BaseModel):
-    id: str
-    rule_type: str
-    conditions: Dict
-    adjustment_factor: float
-    priority: int
+    X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
 
+    results = Parallel(n_jobs=HPARAM_SEARCH_JOBS)(
+        delayed(_fit_candidate)(candidate, X_fit, y_fit, X_val, y_val)
+        for candidate in HPARAM_GRID
+    )
 
-class ScenarioType(BaseModel):
-    name: str
-    inflow_adjustment: float = 0.0
-    outflow_adjustment: float = 0.0
-    delay_days: int = 0
+    best_index = int(np.argmin([val_mae for val_mae, _ in results]))
+    best_mae, best_estimators = results[best_index]
 
+    model = GradientBoostingRegressor(
+        n_estimators=best_estimators,
+        random_state=42,
+        **HPARAM_GRID[best_index]
+    )
+    model.fit(X_train, y_train)
 
-class PredictionResult(BaseModel):
-    date: datetime
-    predicted_balance: float
-    confidence_score: float
-    risk_level: str
-    risk_color: str
-    factors: Dict[str, float]
-    recommendations: List[str]
-    scenario_type: str = 'realistic'
+    return model, {
+        **HPARAM_GRID[best_index],
+        'n_estimators': best_estimators,
+        'early_stopping_rounds': EARLY_STOPPING_ROUNDS,
+        'search_candidates': len(HPARAM_GRID),
+        'search_validation_mae': float(best_mae)
+    }
 
 
-class ModelMetrics(BaseModel):
-    accuracy_score: float
-    mae: float
-    rmse: float
-    training_date: datetime
-    data_points: int
-    model_version: str
+@dataclass(frozen=True)
+class BranchForecast:
+    """
+    Tenant'ın tüm şubeleri için tek geçişte üretilen tahmin
+
+    `series`: şube -> günlük tahminler; None anahtarı konsolide (tüm şubeler + şubesiz kayıtlar)
+    seridir. `change_watermark` kayıtta applied_change_id olarak kullanılır.
+    """
+    tenant_id: str
+    scenario_type: str
+    series: Dict[Optional[str], List[PredictionResult]]
+    change_watermark: int
+    load_seconds: float
+
+
+@dataclass(frozen=True)
+class ForecastPatch:
+    """
+    Kayıtlı tahmin serilerine artımlı uygulanacak cash_flow değişiklikleri
+
+    `images`: (değişiklik id, işaret, satır); eski görüntü -1, yeni görüntü +1 ile uygulanır.
+    Gecikmeler tam hesaplamayla aynı ayrıntıda tahmin edilir: rows modunda bekleyen her
+    görüntü için (`row_delays`, bekleyen görüntülerle aynı sıra), aggregate modunda grubun
+    (gün, tip, kaynak, tutar aralığı) ortalama tutarıyla. `groups` etkilenen grupların
+    değişiklikler sonrası güncel toplamlarıdır; önceki durum görüntüler geri alınarak bulunur.
+    """
+    mode: str
+    rules: Tuple[CashFlowRule, ...]
+    images: Tuple[Tuple[int, int, Mapping], ...]
+    row_delays: Tuple[int, ...]
+    groups: Mapping[Tuple, Mapping]
 
 
 class EnhancedCashFlowAIAgent:
@@ -62,16 +260,18 @@ class EnhancedCashFlowAIAgent:
 
     def __init__(self, db_pool: asyncpg.Pool):
         self.db = db_pool
-        self.model = GradientBoostingRegressor(
-            n_estimators=200,
-            learning_rate=0.1,
-            max_depth=5,
-            random_state=42
-        )
+        self.model = _new_regressor()
+        self.model_scope = 'tenant'
+        self.model_features = FEATURE_COLUMNS
+        self.tenant_profile: Dict = {}
         self.is_trained = False
         self.model_version = "2.0.0"
         self.last_training_date = None
         self.accuracy_score = 0.0
+        self.model_mae = 0.0
+        self.residual_quantiles: List[float] = []
+        self.loaded_model_key = None
+        self.forecast_inputs: Optional[ForecastInputs] = None
 
         self.risk_colors = {
             'low': '#22c55e',
@@ -83,6 +283,9 @@ class EnhancedCashFlowAIAgent:
     async def train_model(self, tenant_id: str, branch_id: Optional[str] = None, force_retrain: bool = False) -> ModelMetrics:
         """Model eğitimi"""
 
+        if not force_retrain:
+            await self._load_model(tenant_id, branch_id)
+
         if not force_retrain and self.last_training_date:
             if datetime.now() - self.last_training_date < timedelta(hours=24):
                 logger.info(f"Model son 24 saatte eğitilmiş. Atlanıyor.")
@@ -92,66 +295,50 @@ class EnhancedCashFlowAIAgent:
                     rmse=0,
                     training_date=self.last_training_date,
                     data_points=0,
-                    model_version=self.model_version
+                    model_version=self.model_version,
+                    model_scope=self.model_scope
                 )
 
+        profile = await self._get_tenant_profile(tenant_id, branch_id)
+
+        if profile['tenant_rows'] < MIN_TENANT_TRAINING_ROWS:
+            logger.info(
+                f"Yetersiz veri: {profile['tenant_rows']} kayıt. "
+                f"Minimum {MIN_TENANT_TRAINING_ROWS} gerekli, ortak model kullanılacak."
+            )
+            return await self._global_fallback_metrics(tenant_id, branch_id, profile)
+
         logger.info(f"Model eğitimi başlıyor: Tenant {tenant_id}")
 
-        query = """
-            SELECT
-                cf.id,
-                cf.expected_date,
-                cf.actual_date,
-                cf.amount,
-                cf.type,
-                cf.source_module,
-                cf.status,
-                cf.ai_confidence_score,
-                cf.category,
-                EXTRACT(DOW FROM cf.expected_date) as day_of_week,
-                EXTRACT(MONTH FROM cf.expected_date) as month,
-                EXTRACT(DAY FROM cf.expected_date) as day_of_month,
-                EXTRACT(EPOCH FROM (cf.actual_date - cf.expected_date)) / 86400 as delay_days
-            FROM public.cash_flow cf
-            WHERE cf.tenant_id = $1
-            AND ($2::uuid IS NULL OR cf.branch_id = $2)
-            AND cf.actual_date IS NOT NULL
-            AND cf.created_at > NOW() - INTERVAL '12 months'
-            AND cf.status = 'cleared'
-            ORDER BY cf.expected_date
-        """
+        if profile['tenant_rows'] > TRAINING_MAX_ROWS:
+            # Büyük tenant: katmanlı, yakın tarihi fazla örnekleyen akışlı örneklem
+            sampler = StratifiedReservoirSampler(TRAINING_MAX_ROWS, TRAINING_SAMPLE_HALF_LIFE_DAYS)
+            sample_query, counts_query, args = queries.training_sample_queries(tenant_id, branch_id)
+            historical_data, source_rows = await sampler.sample(self.db, sample_query, counts_query, *args)
+        else:
+            query, args = queries.training_history_query(tenant_id, branch_id)
+            rows = await self.db.fetch(query, *args)
+            historical_data = [dict(row) for row in rows]
+            source_rows = len(historical_data)
 
-        historical_data = await self.db.fetch(query, tenant_id, branch_id)
-
-        if len(historical_data) < 100:
-            logger.warning(f"Yetersiz veri: {len(historical_data)} kayıt. Minimum 100 gerekli.")
-            return ModelMetrics(
-                accuracy_score=0.0,
-                mae=0,
-                rmse=0,
-                training_date=datetime.now(),
-                data_points=len(historical_data),
-                model_version=self.model_version
-            )
+        sampling_ratio = len(historical_data) / source_rows if source_rows else 1.0
 
-        df = pd.DataFrame([dict(row) for row in historical_data])
+        df = pd.DataFrame(historical_data)
         df = await self._engineer_features(df, tenant_id)
 
         y = df['delay_days'].fillna(0)
 
-        feature_columns = [
-            'amount', 'day_of_week', 'month', 'day_of_month',
-            'is_inflow', 'is_marketplace', 'is_invoice', 'is_expense',
-            'is_weekend', 'is_month_end', 'amount_category', 'seasonal_factor'
-        ]
-
-        X = df[feature_columns].fillna(0)
+        X = df[FEATURE_COLUMNS].fillna(0)
 
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.2, random_state=42
         )
 
-        self.model.fit(X_train, y_train)
+        training_started = time.monotonic()
+        self.model, hyperparameters = await asyncio.get_running_loop().run_in_executor(
+            None, fit_delay_model, X_train, y_train
+        )
+        training_seconds = time.monotonic() - training_started
         y_pred = self.model.predict(X_test)
 
         mae = mean_absolute_error(y_test, y_pred)
@@ -160,9 +347,22 @@ class EnhancedCashFlowAIAgent:
         correct_predictions = np.abs(y_test - y_pred) <= 3
         accuracy = correct_predictions.sum() / len(y_test) * 100
 
+        global_mae = await self._global_holdout_mae(X_test, y_test, profile)
+        if global_mae is not None and global_mae <= mae:
+            logger.info(
+                f"Tenant {tenant_id}: ortak model daha iyi "
+                f"(MAE {global_mae:.2f} <= {mae:.2f}), tenant modeli tutulmuyor"
+            )
+            await self._delete_model(tenant_id, branch_id, profile)
+            return await self._global_fallback_metrics(tenant_id, branch_id, profile)
+
         self.is_trained = True
+        self.model_scope = 'tenant'
+        self.model_features = FEATURE_COLUMNS
         self.last_training_date = datetime.now()
         self.accuracy_score = accuracy
+        self.model_mae = mae
+        self.residual_quantiles = forecast_math.residual_quantiles(y_test - y_pred)
 
         metrics = ModelMetrics(
             accuracy_score=accuracy,
@@ -170,12 +370,109 @@ class EnhancedCashFlowAIAgent:
             rmse=rmse,
             training_date=self.last_training_date,
             data_points=len(historical_data),
-            model_version=self.model_version
+            model_version=self.model_version,
+            hyperparameters=hyperparameters,
+            training_seconds=training_seconds,
+            sampling_ratio=sampling_ratio
         )
 
         await self._save_model_metrics(tenant_id, branch_id, metrics)
+        await self._save_model(self._model_key(tenant_id, branch_id), tenant_id, branch_id, metrics)
+
+        logger.info(
+            f"Model eğitimi tamamlandı. Accuracy: {accuracy:.2f}%, MAE: {mae:.2f} gün, "
+            f"Trees: {hyperparameters['n_estimators']}, Süre: {training_seconds:.1f} sn"
+        )
+
+        return metrics
+
+    async def recent_delay_mae(
+        self,
+        tenant_id: str,
+        branch_id: Optional[str],
+        since: datetime,
+        limit: int = 2000
+    ) -> Tuple[Optional[float], int]:
+        """Belirtilen tarihten sonra kapanan kayıtlarda mevcut modelin gecikme hatası (MAE, kayıt sayısı)"""
+
+        if not await self._load_model(tenant_id, branch_id):
+            return None, 0
+
+        query, args = queries.recent_cleared_query(tenant_id, branch_id, since, limit)
+        rows = await self.db.fetch(query, *args)
+
+        if not rows:
+            return None, 0
+
+        transactions = [dict(row) for row in rows]
+        actual = np.array([float(t['delay_days'] or 0) for t in transactions])
+        predicted = await self._predict_delays(transactions)
+
+        return float(np.mean(np.abs(actual - predicted))), len(transactions)
+
+    async def train_global_model(self) -> ModelMetrics:
+        """Tüm tenant'ların verisiyle ortak (pooled) gecikme modeli eğit"""
+
+        logger.info("Ortak model eğitimi başlıyor")
+
+        # Tenant başına sınır SQL'de, toplam TRAINING_MAX_ROWS sınırı tenant eğitimiyle aynı katmanlı örneklemle
+        sampler = StratifiedReservoirSampler(TRAINING_MAX_ROWS, TRAINING_SAMPLE_HALF_LIFE_DAYS)
+        sample_query, counts_query, args = queries.global_training_sample_queries(GLOBAL_TRAINING_MAX_ROWS_PER_TENANT)
+        historical_data, _ = await sampler.sample(self.db, sample_query, counts_query, *args)
+
+        if len(historical_data) < MIN_TENANT_TRAINING_ROWS:
+            raise ValueError(f"Not enough rows for the global model: {len(historical_data)}")
+
+        source_rows = int(historical_data[0]['source_rows'])
+        sampling_ratio = len(historical_data) / source_rows if source_rows else 1.0
+
+        df = pd.DataFrame(historical_data)
+        df = await self._engineer_features(df, '')
+        df = self._add_tenant_features(df)
+
+        y = df['delay_days'].astype(float).fillna(0)
+        X = df[GLOBAL_FEATURE_COLUMNS].astype(float).fillna(0)
+
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42
+        )
+
+        training_started = time.monotonic()
+        self.model, hyperparameters = await asyncio.get_running_loop().run_in_executor(
+            None, fit_delay_model, X_train, y_train
+        )
+        training_seconds = time.monotonic() - training_started
+        y_pred = self.model.predict(X_test)
+
+        mae = mean_absolute_error(y_test, y_pred)
+        rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+        accuracy = (np.abs(y_test - y_pred) <= 3).sum() / len(y_test) * 100
+
+        self.is_trained = True
+        self.model_scope = 'global'
+        self.model_features = GLOBAL_FEATURE_COLUMNS
+        self.model_mae = mae
+        self.residual_quantiles = forecast_math.residual_quantiles(y_test - y_pred)
+
+        metrics = ModelMetrics(
+            accuracy_score=accuracy,
+            mae=mae,
+            rmse=rmse,
+            training_date=datetime.now(),
+            data_points=len(historical_data),
+            model_version=self.model_version,
+            model_scope='global',
+            hyperparameters=hyperparameters,
+            training_seconds=training_seconds,
+            sampling_ratio=sampling_ratio
+        )
+
+        await self._save_model(GLOBAL_MODEL_KEY, None, None, metrics)
 
-        logger.info(f"Model eğitimi tamamlandı. Accuracy: {accuracy:.2f}%, MAE: {mae:.2f} gün")
+        logger.info(
+            f"Ortak model eğitimi tamamlandı. Accuracy: {accuracy:.2f}%, "
+            f"MAE: {mae:.2f} gün, Data points: {len(historical_data)}/{source_rows}"
+        )
 
         return metrics
 
@@ -196,13 +493,251 @@ class EnhancedCashFlowAIAgent:
             labels=[1, 2, 3, 4, 5]
         ).astype(int)
 
-        df['seasonal_factor'] = df['month'].map({
-            1: 0.9, 2: 0.95, 3: 1.0, 4: 1.05, 5: 1.1, 6: 1.05,
-            7: 0.85, 8: 0.8, 9: 1.1, 10: 1.15, 11: 1.2, 12: 1.25
-        })
+        df['seasonal_factor'] = df['month'].map(MONTH_SEASONAL_FACTORS)
 
         return df
 
+    @staticmethod
+    def _add_tenant_features(df: pd.DataFrame) -> pd.DataFrame:
+        """Tenant seviyesindeki özet özellikler (ortak model için)"""
+
+        df['tenant_log_rows'] = np.log1p(df['tenant_rows'].astype(float))
+        df['tenant_avg_amount'] = df['tenant_avg_amount'].astype(float)
+        df['tenant_inflow_share'] = df['tenant_inflow_share'].astype(float)
+        df['tenant_marketplace_share'] = df['tenant_marketplace_share'].astype(float)
+        df['tenant_avg_delay'] = df['tenant_avg_delay'].astype(float).fillna(0)
+
+        return df
+
+    async def _get_tenant_profile(self, tenant_id: str, branch_id: Optional[str]) -> Dict:
+        """Tenant'ın geçmiş özet istatistikleri (tek toplama sorgusu)"""
+
+        query, args = queries.tenant_profile_query(tenant_id, branch_id)
+        row = await self.db.fetchrow(query, *args)
+
+        return {key: (int(row[key]) if key == 'tenant_rows' else float(row[key])) for key in row.keys()}
+
+    @staticmethod
+    def _model_key(tenant_id: str, branch_id: Optional[str]) -> str:
+        return f"tenant:{tenant_id}:{branch_id or '-'}"
+
+    async def _save_model(
+        self,
+        model_key: str,
+        tenant_id: Optional[str],
+        branch_id: Optional[str],
+        metrics: ModelMetrics
+    ):
+        """Eğitilmiş modeli kaydet"""
+
+        blob = pickle.dumps(self.model, protocol=pickle.HIGHEST_PROTOCOL)
+
+        await self.db.execute("""
+            INSERT INTO public.ai_delay_models
+            (model_key, tenant_id, branch_id, model_version, feature_columns, model_blob, blob_bytes,
+             accuracy_score, mae, data_points, trained_at, residual_quantiles)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
+            ON CONFLICT (model_key)
+            DO UPDATE SET
+                model_version = EXCLUDED.model_version,
+                feature_columns = EXCLUDED.feature_columns,
+                model_blob = EXCLUDED.model_blob,
+                blob_bytes = EXCLUDED.blob_bytes,
+                accuracy_score = EXCLUDED.accuracy_score,
+                mae = EXCLUDED.mae,
+                data_points = EXCLUDED.data_points,
+                trained_at = EXCLUDED.trained_at,
+                residual_quantiles = EXCLUDED.residual_quantiles,
+                updated_at = NOW()
+        """,
+            model_key,
+            tenant_id,
+            branch_id,
+            metrics.model_version,
+            self.model_features,
+            blob,
+            len(blob),
+            metrics.accuracy_score,
+            metrics.mae,
+            metrics.data_points,
+            metrics.training_date,
+            self.residual_quantiles
+        )
+
+        model_cache.put_model(
+            model_key,
+            self.model,
+            self.model_features,
+            metrics.accuracy_score,
+            metrics.mae,
+            metrics.training_date,
+            len(blob),
+            self.residual_quantiles
+        )
+
+        self.loaded_model_key = model_key
+
+    async def _delete_model(self, tenant_id: str, branch_id: Optional[str], profile: Optional[Dict] = None):
+        """Tenant modelini sil (ortak model kullanılacak)"""
+
+        model_key = self._model_key(tenant_id, branch_id)
+
+        await self.db.execute("""
+            DELETE FROM public.ai_delay_models WHERE model_key = $1
+        """, model_key)
+
+        model_cache.mark_missing(model_key, profile)
+
+    async def _get_global_entry(self) -> Optional[CachedModel]:
+        """Ortak modeli önbellekten, yoksa veritabanından getir"""
+
+        entry = model_cache.get(GLOBAL_MODEL_KEY)
+        if entry is not None:
+            return entry
+
+        row = await self.db.fetchrow("""
+            SELECT model_blob, feature_columns, accuracy_score, mae, trained_at, residual_quantiles
+            FROM public.ai_delay_models
+            WHERE model_key = $1
+        """, GLOBAL_MODEL_KEY)
+
+        if not row:
+            return None
+
+        return await model_cache.put_row(GLOBAL_MODEL_KEY, row)
+
+    async def _global_holdout_mae(self, X_test: pd.DataFrame, y_test: pd.Series, profile: Dict) -> Optional[float]:
+        """Ortak modelin tenant test verisindeki hatası"""
+
+        entry = await self._get_global_entry()
+        if entry is None:
+            return None
+
+        X_global = self._with_profile(X_test.copy(), profile)
+
+        return mean_absolute_error(y_test, entry.model.predict(X_global[GLOBAL_FEATURE_COLUMNS]))
+
+    def _with_profile(self, df: pd.DataFrame, profile: Dict) -> pd.DataFrame:
+        for key in ('tenant_rows', 'tenant_avg_amount', 'tenant_inflow_share',
+                    'tenant_marketplace_share', 'tenant_avg_delay'):
+            df[key] = profile[key]
+
+        return self._add_tenant_features(df)
+
+    async def _global_fallback_metrics(
+        self,
+        tenant_id: str,
+        branch_id: Optional[str],
+        profile: Dict
+    ) -> ModelMetrics:
+        """Küçük tenant: ortak modelin metriklerini döndür"""
+
+        entry = await self._get_global_entry()
+        model_cache.mark_missing(self._model_key(tenant_id, branch_id), profile)
+
+        self.loaded_model_key = None
+        self.last_training_date = None
+
+        metrics = ModelMetrics(
+            accuracy_score=entry.accuracy_score if entry else 0.0,
+            mae=entry.mae if entry else 0,
+            rmse=0,
+            training_date=entry.trained_at if entry else datetime.now(),
+            data_points=profile['tenant_rows'],
+            model_version=self.model_version,
+            model_scope='global'
+        )
+
+        # Tahminler ortak modelle üretildiğinden /accuracy bu tenant'ı eğitilmiş gösterir
+        if entry is not None and entry.trained_at is not None:
+            await self._save_rollup_model_metrics(tenant_id, branch_id, metrics)
+
+        return metrics
+
+    async def _load_model(self, tenant_id: str, branch_id: Optional[str]) -> bool:
+        """Tenant modelini, yoksa ortak modeli yükle (süreç içi önbellekten, yoksa veritabanından)"""
+
+        model_key = self._model_key(tenant_id, branch_id)
+        if self.loaded_model_key == model_key:
+            return self.is_trained
+
+        self.loaded_model_key = model_key
+
+        entry = model_cache.get(model_key)
+
+        if entry is None:
+            row = await self.db.fetchrow("""
+                SELECT model_blob, feature_columns, accuracy_score, mae, trained_at, residual_quantiles
+                FROM public.ai_delay_models
+                WHERE model_key = $1
+            """, model_key)
+
+            if row:
+                entry = await model_cache.put_row(model_key, row)
+            else:
+                entry = model_cache.mark_missing(
+                    model_key, await self._get_tenant_profile(tenant_id, branch_id)
+                )
+
+        if entry.model is not None:
+            self.model_scope = 'tenant'
+
+        else:
+            self.tenant_profile = entry.tenant_profile or await self._get_tenant_profile(tenant_id, branch_id)
+
+            entry = await self._get_global_entry()
+            if entry is None:
+                return False
+
+            # Ortak modelin tarihi geçerli; tenant modeli gece eğitiminde yeniden denenir
+            self.model_scope = 'global'
+
+        self.model = entry.model
+        self.model_features = entry.feature_columns or FEATURE_COLUMNS
+        self.is_trained = True
+        self.accuracy_score = entry.accuracy_score
+        self.model_mae = entry.mae
+        self.residual_quantiles = entry.residual_quantiles
+        self.last_training_date = entry.trained_at.astimezone().replace(tzinfo=None)
+
+        return True
+
+    async def _predict_delays(self, transactions: List[Dict]) -> np.ndarray:
+        """Bekleyen işlemlerin gecikmesini tek seferde (vektörel) tahmin et"""
+
+        delays = np.zeros(len(transactions), dtype=int)
+
+        if not self.is_trained or not transactions:
+            return delays
+
+        try:
+            expected = pd.to_datetime([t['expected_date'] for t in transactions], utc=True)
+
+            df = pd.DataFrame({
+                'amount': [float(t['amount']) for t in transactions],
+                'type': [t['type'] for t in transactions],
+                'source_module': [t['source_module'] for t in transactions],
+                'day_of_week': (expected.dayofweek + 1) % 7,
+                'month': expected.month,
+                'day_of_month': expected.day
+            })
+            df = await self._engineer_features(df, '')
+
+            if self.model_scope == 'global':
+                df = self._with_profile(df, self.tenant_profile)
+
+            predicted = self.model.predict(df[self.model_features].fillna(0))
+            delays = np.clip(
+                np.rint(predicted),
+                -MAX_PREDICTED_DELAY_DAYS,
+                MAX_PREDICTED_DELAY_DAYS
+            ).astype(int)
+
+        except Exception as e:
+            logger.error(f"Delay prediction error: {str(e)}")
+
+        return delays
+
     async def _get_active_rules(self, tenant_id: str) -> List[CashFlowRule]:
         """Aktif nakit akış kurallarını çek"""
 
@@ -232,22 +767,13 @@ class EnhancedCashFlowAIAgent:
     ) -> float:
         """Gelişmiş güven skoru hesaplama"""
 
-        base_confidence = float(transaction.get('ai_confidence_score', 1.0))
-
-        source_multipliers = {
-            'bank': 1.0,
-            'e-invoice': 0.85,
-            'marketplace': 0.75,
-            'sales_order': 0.70,
-            'purchase_order': 0.95,
-            'expense': 0.90,
-            'payroll': 0.98,
-            'manual': 0.60
-        }
+        # SQL tarafındaki COALESCE(ai_confidence_score, 1.0) ile aynı
+        ai_confidence_score = transaction.get('ai_confidence_score')
+        base_confidence = float(ai_confidence_score) if ai_confidence_score is not None else 1.0
 
-        source_confidence = source_multipliers.get(
+        source_confidence = SOURCE_CONFIDENCE_MULTIPLIERS.get(
             transaction['source_module'],
-            0.5
+            DEFAULT_SOURCE_CONFIDENCE
         )
 
         for rule in rules:
@@ -255,7 +781,7 @@ class EnhancedCashFlowAIAgent:
                 if rule.rule_type == 'marketplace_delay':
                     if transaction['source_module'] == 'marketplace':
                         marketplace_prefix = rule.conditions.get('marketplace_prefix', '')
-                        reference_no = transaction.get('reference_no', '')
+                        reference_no = transaction.get('reference_no') or ''
 
                         if reference_no.startswith(marketplace_prefix):
                             source_confidence *= rule.adjustment_factor
@@ -270,11 +796,17 @@ class EnhancedCashFlowAIAgent:
 
                         expected_date = transaction['expected_date']
                         if isinstance(expected_date, str):
-                            expected_date = datetime.fromisoformat(expected_date).date()
+                            expected_date = datetime.fromisoformat(expected_date)
+                        if isinstance(expected_date, datetime):
+                            expected_date = expected_date.date()
 
                         if start_date <= expected_date <= end_date:
                             source_confidence *= rule.adjustment_factor
 
+                elif rule.rule_type == 'payment_term':
+                    if (transaction.get('payment_term_days') or 0) >= rule.conditions.get('term_days', 0):
+                        source_confidence *= rule.adjustment_factor
+
             except Exception as e:
                 logger.error(f"Rule application error: {rule.rule_type} - {str(e)}")
                 continue
@@ -291,163 +823,999 @@ class EnhancedCashFlowAIAgent:
 
         return final_confidence
 
-    async def predict_cash_flow(
+    async def load_forecast_inputs(
         self,
         tenant_id: str,
         forecast_days: int = 30,
-        branch_id: Optional[str] = None,
-        scenario_type: str = 'realistic'
-    ) -> List[PredictionResult]:
-        """Nakit akışı tahmini yap"""
+        branch_id: Optional[str] = None
+    ) -> ForecastInputs:
+        """
+        Tahmin girdilerini eş zamanlı oku
 
-        logger.info(f"Prediction started: Tenant {tenant_id}, Scenario: {scenario_type}")
+        Kurallar, bakiye, bekleyen işlemler ve model yüklemesi birbirinden bağımsızdır; havuzdan ayrı
+        bağlantılarla aynı anda çalışır, süre en yavaş sorgu kadardır. Aggregate modunda kurallar
+        sorgu içinde de okunur ve tüm senaryoların ağırlıklı toplamları tek sorguda döner.
+        """
+
+        started = time.perf_counter()
+        end_date = datetime.now() + timedelta(days=forecast_days)
 
-        scenarios = {
-            'pessimistic': ScenarioType(
-                name='pessimistic',
-                inflow_adjustment=-20,
-                outflow_adjustment=10,
-                delay_days=7
-            ),
-            'realistic': ScenarioType(
-                name='realistic',
-                inflow_adjustment=0,
-                outflow_adjustment=0,
-                delay_days=0
-            ),
-            'optimistic': ScenarioType(
-                name='optimistic',
-                inflow_adjustment=15,
-                outflow_adjustment=-10,
-                delay_days=-3
+        if FORECAST_INPUT_MODE == 'rows':
+            pending_query, pending_args = queries.pending_rows_query(tenant_id, branch_id, end_date)
+        else:
+            pending_query, pending_args = queries.pending_aggregate_query(
+                tenant_id,
+                branch_id,
+                end_date,
+                {
+                    name: (1 + scenario.inflow_adjustment / 100, 1 + scenario.outflow_adjustment / 100)
+                    for name, scenario in FORECAST_SCENARIOS.items()
+                }
             )
-        }
 
-        scenario = scenarios.get(scenario_type, scenarios['realistic'])
-        rules = await self._get_active_rules(tenant_id)
+        # Değişiklik kaydı filigranı okumalardan önce alınır; sonrasındaki değişiklikler artımlı uygulanır
+        change_watermark = await self._get_change_watermark()
 
-        current_balance = await self._get_current_balance(tenant_id, branch_id)
+        rules, current_balance, pending_rows, _ = await asyncio.gather(
+            self._get_active_rules(tenant_id),
+            self._get_current_balance(tenant_id, branch_id),
+            self.db.fetch(pending_query, *pending_args),
+            self._load_model(tenant_id, branch_id)
+        )
 
-        end_date = datetime.now() + timedelta(days=forecast_days)
-        pending_transactions = await self.db.fetch("""
-            SELECT *
-            FROM public.cash_flow
-            WHERE tenant_id = $1
-            AND ($2::uuid IS NULL OR branch_id = $2)
-            AND status IN ('pending', 'partial', 'overdue')
-            AND expected_date <= $3
-            ORDER BY expected_date
-        """, tenant_id, branch_id, end_date)
+        pending = tuple(MappingProxyType(dict(row)) for row in pending_rows)
+
+        if FORECAST_INPUT_MODE == 'rows':
+            predicted_delays = await self._predict_delays(pending)
+        else:
+            predicted_delays = await self._predict_group_delays(pending)
+
+        inputs = ForecastInputs(
+            tenant_id=tenant_id,
+            branch_id=branch_id,
+            mode=FORECAST_INPUT_MODE,
+            forecast_days=forecast_days,
+            end_date=end_date,
+            current_balance=current_balance,
+            rules=tuple(rules),
+            pending=pending,
+            predicted_delays=tuple(int(delay) for delay in predicted_delays),
+            change_watermark=change_watermark,
+            load_seconds=time.perf_counter() - started
+        )
 
-        logger.info(f"Pending transactions: {len(pending_transactions)}")
+        logger.info(
+            f"Forecast inputs loaded in {inputs.load_seconds:.3f}s: "
+            f"{len(pending)} pending {'rows' if inputs.mode == 'rows' else 'groups'}, {len(rules)} rules"
+        )
 
-        predictions = []
-        running_balance = current_balance
+        return inputs
 
-        transactions_by_date = {}
-        for trans in pending_transactions:
-            trans_dict = dict(trans)
+    async def predict_cash_flow(
+        self,
+        tenant_id: str,
+        forecast_days: int = 30,
+        branch_id: Optional[str] = None,
+        scenario_type: str = 'realistic',
+        inputs: Optional[ForecastInputs] = None
+    ) -> List[PredictionResult]:
+        """Nakit akışı tahmini yap (`inputs` verilirse veritabanına gidilmez)"""
 
-            expected_date = trans_dict['expected_date']
-            if scenario.delay_days != 0 and trans_dict['type'] == 'inflow':
-                expected_date = expected_date + timedelta(days=scenario.delay_days)
+        logger.info(f"Prediction started: Tenant {tenant_id}, Scenario: {scenario_type}")
 
-            date_key = expected_date.date()
+        scenario = FORECAST_SCENARIOS.get(scenario_type, FORECAST_SCENARIOS['realistic'])
+
+        if (
+            inputs is None
+            or (inputs.tenant_id, inputs.branch_id) != (tenant_id, branch_id)
+            or inputs.forecast_days < forecast_days
+        ):
+            inputs = await self.load_forecast_inputs(tenant_id, forecast_days, branch_id)
+
+        if inputs.mode == 'rows':
+            daily_flows = await self._daily_flows_from_rows(inputs, scenario)
+        else:
+            daily_flows = self._daily_flows_from_aggregates(inputs, scenario)
+
+        # Kaydedilen tahmin hangi değişiklik kaydına kadar olan veriyi içeriyor (artımlı güncelleme için)
+        self.forecast_inputs = inputs
+
+        start = datetime.now()
+        predictions = await self.build_predictions(
+            inputs.current_balance,
+            [(start + timedelta(days=day), day) for day in range(forecast_days)],
+            daily_flows,
+            scenario,
+            scenario_type
+        )
 
-            if date_key not in transactions_by_date:
-                transactions_by_date[date_key] = []
+        logger.info(f"Prediction completed: {len(predictions)} days")
 
-            transactions_by_date[date_key].append(trans_dict)
+        return predictions
 
-        for day in range(forecast_days):
-            target_date = datetime.now() + timedelta(days=day)
-            date_key = target_date.date()
+    async def build_predictions(
+        self,
+        start_balance: float,
+        days: List[Tuple[datetime, int]],
+        daily_flows: Dict,
+        scenario: ScenarioType,
+        scenario_type: str
+    ) -> List[PredictionResult]:
+        """
+        Günlük akışlardan yürüyen bakiye, risk ve önerileri üret
 
-            day_transactions = transactions_by_date.get(date_key, [])
+        `days`: (tarih, bugünden itibaren gün) listesi. Günün akışları `factors` içinde saklanır;
+        artımlı güncelleme kayıtlı günleri bu alanlardan yeniden kurar.
+        """
 
-            day_inflow = 0
-            day_outflow = 0
+        dates = [target_date for target_date, _ in days]
+        days_ahead = np.array([day for _, day in days])
+
+        flows = forecast_math.flows_from_days(daily_flows, [target_date.date() for target_date in dates])
+        balances = forecast_math.running_balances(np.array([start_balance]), flows['inflow'], flows['outflow'])
+        codes = forecast_math.risk_codes(balances, flows['outflow'], days_ahead)
+
+        return await self._series_predictions(
+            dates,
+            days_ahead,
+            {key: matrix[0] for key, matrix in flows.items()},
+            balances[0],
+            codes[0],
+            scenario,
+            scenario_type
+        )
 
-            for trans in day_transactions:
-                confidence = await self._calculate_confidence(trans, rules, scenario)
-                adjusted_amount = trans['amount'] * confidence
+    async def _series_predictions(
+        self,
+        dates: List[datetime],
+        days_ahead: np.ndarray,
+        flows: Dict[str, np.ndarray],
+        balances: np.ndarray,
+        codes: np.ndarray,
+        scenario: ScenarioType,
+        scenario_type: str
+    ) -> List[PredictionResult]:
+        """Bir serinin dizilerini gün başına PredictionResult nesnelerine çevir"""
 
-                if trans['type'] == 'inflow':
-                    day_inflow += adjusted_amount
-                else:
-                    day_outflow += adjusted_amount
+        predictions = []
 
-            net_flow = day_inflow - day_outflow
-            running_balance += net_flow
+        for i, target_date in enumerate(dates):
+            day_inflow = float(flows['inflow'][i])
+            day_outflow = float(flows['outflow'][i])
+            transaction_count = int(flows['transactions'][i])
+            overdue_inflow_count = int(flows['overdue_inflow_count'][i])
+            overdue_inflow_amount = float(flows['overdue_inflow_amount'][i])
+            balance = float(balances[i])
+            risk_level = forecast_math.RISK_LEVELS[codes[i]]
 
             confidence_factors = {
                 'inflow_confidence': (day_inflow / (day_inflow + day_outflow)) if (day_inflow + day_outflow) > 0 else 0.5,
-                'transaction_count': len(day_transactions),
-                'scenario_adjustment': scenario.inflow_adjustment
+                'transaction_count': transaction_count,
+                'scenario_adjustment': scenario.inflow_adjustment,
+                'day_inflow': day_inflow,
+                'day_outflow': day_outflow,
+                'overdue_inflow_count': overdue_inflow_count,
+                'overdue_inflow_amount': overdue_inflow_amount
             }
 
-            overall_confidence = 0.8 if day_transactions else 0.5
-
-            risk_level, risk_color = self._calculate_risk_level(
-                running_balance,
-                day_outflow,
-                day
-            )
-
             recommendations = await self._generate_recommendations(
-                running_balance,
-                day_transactions,
+                balance,
+                overdue_inflow_count,
+                overdue_inflow_amount,
                 risk_level,
-                day,
+                int(days_ahead[i]),
                 scenario_type
             )
 
             predictions.append(PredictionResult(
                 date=target_date,
-                predicted_balance=running_balance,
-                confidence_score=overall_confidence,
+                predicted_balance=balance,
+                confidence_score=0.8 if transaction_count else 0.5,
                 risk_level=risk_level,
-                risk_color=risk_color,
+                risk_color=self.risk_colors[risk_level],
                 factors=confidence_factors,
                 recommendations=recommendations,
                 scenario_type=scenario_type
             ))
 
-        logger.info(f"Prediction completed: {len(predictions)} days")
-
         return predictions
 
-    def _calculate_risk_level(
+    async def predict_branch_fanout(
         self,
-        balance: float,
-        daily_outflow: float,
-        days_ahead: int
-    ) -> Tuple[str, str]:
-        """Risk seviyesi hesapla"""
+        tenant_id: str,
+        forecast_days: int = 30,
+        scenario_type: str = 'realistic'
+    ) -> BranchForecast:
+        """
+        Tenant'ın tüm şubeleri ve konsolide toplamı için tahmin
 
-        if balance < 0:
-            return ('critical', self.risk_colors['critical'])
+        Bakiyeler ve bekleyen gruplar şubeye göre birer sorguda okunur (şube başına ayrı sorgu
+        yok). Tüm şube serileri (seri × gün) matrisleriyle tek vektörel geçişte hesaplanır.
+        Konsolide seri şube toplamı değil, aynı sorgunun tenant geneli gruplarından hesaplanır:
+        gruplar, ortalama tutar gecikmeleri ve bakiye şubesiz /predict ile aynıdır (kayıtlı seri
+        iki yol arasında sürüm atlamaz). Gecikmeler tenant modeliyle tahmin edilir.
+        """
 
-        if daily_outflow > 0:
-            runway_days = balance / daily_outflow
+        logger.info(f"Branch fan-out prediction started: Tenant {tenant_id}, Scenario: {scenario_type}")
 
-            if runway_days < 7:
-                return ('critical', self.risk_colors['critical'])
-            elif runway_days < 15:
-                return ('high', self.risk_colors['high'])
-            elif runway_days < 30:
-                return ('medium', self.risk_colors['medium'])
+        started = time.perf_counter()
+        scenario = FORECAST_SCENARIOS.get(scenario_type, FORECAST_SCENARIOS['realistic'])
+        start = datetime.now()
 
-        if days_ahead > 60:
-            if balance < 50000:
-                return ('medium', self.risk_colors['medium'])
+        pending_query, pending_args = queries.pending_aggregate_query(
+            tenant_id,
+            None,
+            start + timedelta(days=forecast_days),
+            {scenario.name: (1 + scenario.inflow_adjustment / 100, 1 + scenario.outflow_adjustment / 100)},
+            by_branch=True
+        )
+        balance_query, balance_args = queries.branch_balances_query(tenant_id)
+
+        change_watermark = await self._get_change_watermark()
+
+        balance_rows, rows, _ = await asyncio.gather(
+            self.db.fetch(balance_query, *balance_args),
+            self.db.fetch(pending_query, *pending_args),
+            self._load_model(tenant_id, None)
+        )
+
+        def branch_key(value) -> Optional[str]:
+            return str(value) if value is not None else None
 
-        return ('low', self.risk_colors['low'])
+        branch_groups = [row for row in rows if not row['tenant_total']]
+        total_groups = [row for row in rows if row['tenant_total']]
+
+        start_by_branch = {branch_key(row['branch_id']): float(row['balance']) for row in balance_rows}
+        # Şubesiz kayıtlar (None) ilk satırdadır ve yalnızca konsolide seriye girer
+        branches = sorted(
+            set(start_by_branch) | {branch_key(group['branch_id']) for group in branch_groups},
+            key=lambda branch: (branch is not None, branch or '')
+        )
+        row_index = {branch: i for i, branch in enumerate(branches)}
+
+        # Konsolide seri son satırdır
+        groups = branch_groups + total_groups
+        series_index = [row_index[branch_key(group['branch_id'])] for group in branch_groups]
+        series_index += [len(branches)] * len(total_groups)
+
+        predicted_delays = await self._predict_group_delays(groups)
+
+        is_inflow = np.array([group['type'] == 'inflow' for group in groups], dtype=bool)
+        expected = np.array([group['expected_date'] for group in groups], dtype='datetime64[D]')
+        day_index = (
+            (expected - np.datetime64(start.date())).astype(int)
+            + np.asarray(predicted_delays, dtype=int)
+            + np.where(is_inflow, scenario.delay_days, 0)
+        )
+
+        flows = forecast_math.daily_flow_matrix(
+            np.array(series_index, dtype=int),
+            day_index,
+            is_inflow,
+            np.array([group[f"weighted_{scenario.name}"] for group in groups], dtype=float),
+            np.array([group['transactions'] for group in groups], dtype=float),
+            np.array([group['overdue_count'] for group in groups], dtype=float),
+            np.array([group['overdue_amount'] for group in groups], dtype=float),
+            len(branches) + 1,
+            forecast_days
+        )
+
+        # Konsolide başlangıç bakiyesi numeric toplamdır (current_balance_query ile aynı)
+        start_balances = np.array(
+            [start_by_branch.get(branch, 0.0) for branch in branches]
+            + [float(sum(row['balance'] for row in balance_rows))],
+            dtype=float
+        )
+        balances = forecast_math.running_balances(start_balances, flows['inflow'], flows['outflow'])
+        days_ahead = np.arange(forecast_days)
+        codes = forecast_math.risk_codes(balances, flows['outflow'], days_ahead)
+
+        dates = [start + timedelta(days=day) for day in range(forecast_days)]
+        series = {}
+
+        for row, branch in enumerate(branches + [None]):
+            if branch is None and row < len(branches):
+                continue
+
+            series[branch] = await self._series_predictions(
+                dates,
+                days_ahead,
+                {key: matrix[row] for key, matrix in flows.items()},
+                balances[row],
+                codes[row],
+                scenario,
+                scenario_type
+            )
+
+        forecast = BranchForecast(
+            tenant_id=tenant_id,
+            scenario_type=scenario_type,
+            series=series,
+            change_watermark=change_watermark,
+            load_seconds=time.perf_counter() - started
+        )
+
+        logger.info(
+            f"Branch fan-out completed in {forecast.load_seconds:.3f}s: "
+            f"{len(series) - 1} branches + consolidated, {len(branch_groups)} pending groups"
+        )
+
+        return forecast
+
+    async def evaluate_scenarios(
+        self,
+        tenant_id: str,
+        scenarios: List[ScenarioType],
+        forecast_days: int = 30,
+        branch_id: Optional[str] = None
+    ) -> WhatIfResult:
+        """
+        Keyfi senaryoları tek girdi okumasıyla, toplu (vektörel) değerlendir
+
+        Bekleyen işlemler ham güvene göre gruplu okunur (pending_confidence_groups_query), gecikmeler
+        grup başına bir kez tahmin edilir. Tüm senaryolar (senaryo × gün) matrisleriyle birlikte
+        hesaplanır; gün başına tahmin nesnesi üretilmez, yalnızca senaryo özetleri döner.
+        """
+
+        started = time.perf_counter()
+        start = datetime.now()
+
+        pending_query, pending_args = queries.pending_confidence_groups_query(
+            tenant_id, branch_id, start + timedelta(days=forecast_days)
+        )
+
+        current_balance, groups, _ = await asyncio.gather(
+            self._get_current_balance(tenant_id, branch_id),
+            self.db.fetch(pending_query, *pending_args),
+            self._load_model(tenant_id, branch_id)
+        )
+
+        predicted_delays = await self._predict_group_delays(groups)
+
+        is_inflow = np.array([group['type'] == 'inflow' for group in groups], dtype=bool)
+        expected = np.array([group['expected_date'] for group in groups], dtype='datetime64[D]')
+        base_day = (expected - np.datetime64(start.date())).astype(int) + np.asarray(predicted_delays, dtype=int)
+
+        base_day, is_inflow, raw_confidence, group_arrays = forecast_math.collapse_groups(
+            base_day,
+            is_inflow,
+            np.array([group['raw_confidence'] for group in groups], dtype=float),
+            {
+                key: np.array([group[key] for group in groups], dtype=float)
+                for key in ('amount', 'transactions', 'overdue_count', 'overdue_amount')
+            }
+        )
+
+        inflow_factors = np.array([1 + scenario.inflow_adjustment / 100 for scenario in scenarios])
+        outflow_factors = np.array([1 + scenario.outflow_adjustment / 100 for scenario in scenarios])
+        delay_days = np.array([scenario.delay_days for scenario in scenarios], dtype=int)
+        days_ahead = np.arange(forecast_days)
+
+        chunk = max(1, WHAT_IF_CHUNK_CELLS // max(len(base_day), 1))
+        summaries = []
+
+        for offset in range(0, len(scenarios), chunk):
+            part = slice(offset, offset + chunk)
+
+            flows = forecast_math.scenario_flows(
+                base_day,
+                is_inflow,
+                group_arrays['amount'],
+                raw_confidence,
+                group_arrays['transactions'],
+                group_arrays['overdue_count'],
+                group_arrays['overdue_amount'],
+                inflow_factors[part],
+                outflow_factors[part],
+                delay_days[part],
+                forecast_days
+            )
+            balances = forecast_math.running_balances(
+                np.full(len(inflow_factors[part]), current_balance), flows['inflow'], flows['outflow']
+            )
+            summaries.append(
+                forecast_math.balance_summary(balances, forecast_math.risk_codes(balances, flows['outflow'], days_ahead))
+            )
+
+        summary = {key: np.concatenate([part[key] for part in summaries]) for key in summaries[0]} if summaries else {}
+
+        outcomes = [
+            ScenarioOutcome(
+                name=scenario.name,
+                inflow_adjustment=scenario.inflow_adjustment,
+                outflow_adjustment=scenario.outflow_adjustment,
+                delay_days=scenario.delay_days,
+                final_balance=float(summary['final_balance'][i]),
+                min_balance=float(summary['min_balance'][i]),
+                min_balance_date=start + timedelta(days=int(summary['min_day'][i])),
+                runway_days=int(summary['runway_days'][i]) if summary['runway_days'][i] >= 0 else None,
+                critical_days=int(summary['critical_days'][i])
+            )
+            for i, scenario in enumerate(scenarios)
+        ]
+
+        result = WhatIfResult(
+            forecast_days=forecast_days,
+            current_balance=current_balance,
+            pending_groups=len(groups),
+            elapsed_ms=(time.perf_counter() - started) * 1000,
+            outcomes=outcomes
+        )
+
+        logger.info(
+            f"What-if evaluated for tenant {tenant_id}: {len(scenarios)} scenarios, "
+            f"{len(groups)} pending groups in {result.elapsed_ms:.1f} ms"
+        )
+
+        return result
+
+    async def simulate_cash_flow(
+        self,
+        tenant_id: str,
+        forecast_days: int = 30,
+        branch_id: Optional[str] = None,
+        scenario_type: str = 'realistic',
+        paths: Optional[int] = None,
+        seed: Optional[int] = None
+    ) -> ProbabilisticForecast:
+        """
+        Gecikme belirsizliğinden Monte Carlo bakiye bantları
+
+        Bekleyen işlemler what-if ile aynı gruplu sorgudan okunur, gecikme grup başına tahmin edilir.
+        Her yolda her işlemin gecikmesine modelin eğitimde ölçülen test hatası dağılımından bağımsız
+        bir örnek eklenir; tutarlar senaryonun güveniyle ağırlıklıdır (hata sıfırsa P50 = /predict).
+        """
+
+        started = time.perf_counter()
+        start = datetime.now()
+        scenario = FORECAST_SCENARIOS[scenario_type]
+        paths = paths or MONTE_CARLO_PATHS
+
+        pending_query, pending_args = queries.pending_confidence_groups_query(
+            tenant_id, branch_id, start + timedelta(days=forecast_days)
+        )
+
+        current_balance, groups, _ = await asyncio.gather(
+            self._get_current_balance(tenant_id, branch_id),
+            self.db.fetch(pending_query, *pending_args),
+            self._load_model(tenant_id, branch_id)
+        )
+
+        predicted_delays = await self._predict_group_delays(groups)
+
+        is_inflow = np.array([group['type'] == 'inflow' for group in groups], dtype=bool)
+        expected = np.array([group['expected_date'] for group in groups], dtype='datetime64[D]')
+        amount = np.array([group['amount'] for group in groups], dtype=float)
+        raw_confidence = np.array([group['raw_confidence'] for group in groups], dtype=float)
+        transactions = np.array([group['transactions'] for group in groups], dtype=np.int64)
+
+        factors = np.where(
+            is_inflow, 1 + scenario.inflow_adjustment / 100, 1 + scenario.outflow_adjustment / 100
+        )
+        weighted = amount * np.clip(raw_confidence * factors, 0.05, 1.0)
+
+        offsets, residual_source = forecast_math.residual_offsets(
+            self.residual_quantiles if self.is_trained else None,
+            self.model_mae if self.is_trained else 0.0
+        )
+
+        balances = forecast_math.monte_carlo_balances(
+            (expected - np.datetime64(start.date())).astype(int) + np.where(is_inflow, scenario.delay_days, 0),
+            np.asarray(predicted_delays, dtype=int),
+            np.where(is_inflow, weighted, -weighted),
+            transactions,
+            offsets,
+            current_balance,
+            forecast_days,
+            paths,
+            MAX_PREDICTED_DELAY_DAYS,
+            MONTE_CARLO_CHUNK_CELLS,
+            np.random.default_rng(seed)
+        )
+        bands = forecast_math.balance_bands(balances)
+
+        result = ProbabilisticForecast(
+            scenario_type=scenario_type,
+            forecast_days=forecast_days,
+            paths=paths,
+            current_balance=current_balance,
+            pending_transactions=int(transactions.sum()),
+            residual_source=residual_source,
+            elapsed_ms=(time.perf_counter() - started) * 1000,
+            dates=[start + timedelta(days=i) for i in range(forecast_days)],
+            **{key: values.tolist() for key, values in bands.items()}
+        )
+
+        logger.info(
+            f"Monte Carlo bands for tenant {tenant_id}: {paths} paths, "
+            f"{result.pending_transactions} pending transactions ({residual_source}) in {result.elapsed_ms:.1f} ms"
+        )
+
+        return result
+
+    async def predict_long_horizon(
+        self,
+        tenant_id: str,
+        forecast_days: int = 365,
+        branch_id: Optional[str] = None,
+        scenario_type: str = 'realistic'
+    ) -> LongHorizonForecast:
+        """
+        Günlük / haftalık / aylık kovalarla uzun vadeli tahmin
+
+        Bekleyen işlemler what-if ile aynı gruplu sorgudan günlük akışa çevrilir (ilk LONG_HORIZON_DAILY_DAYS
+        gün /predict ile aynıdır). Sonraki kovalarda akış, bekleyen akış ile son 12 ayın günlük ortalamasından
+        mevsimsel katsayı ve seasonal_factor kurallarıyla projekte edilen akışın büyüğüdür.
+        Gün başına tahmin nesnesi üretilmez; sonuç kova dizileridir.
+        """
+
+        started = time.perf_counter()
+        start = datetime.now()
+        today = start.date()
+        scenario = FORECAST_SCENARIOS[scenario_type]
+
+        this_month = np.datetime64(today, 'M')
+        profile_months = np.arange(this_month - 12, this_month)
+
+        pending_query, pending_args = queries.pending_confidence_groups_query(
+            tenant_id, branch_id, start + timedelta(days=forecast_days)
+        )
+        profile_query, profile_args = queries.monthly_flow_profile_query(
+            tenant_id, branch_id, profile_months[0].astype(datetime), this_month.astype(datetime)
+        )
+
+        current_balance, groups, profile, rules, _ = await asyncio.gather(
+            self._get_current_balance(tenant_id, branch_id),
+            self.db.fetch(pending_query, *pending_args),
+            self.db.fetch(profile_query, *profile_args),
+            self._get_active_rules(tenant_id),
+            self._load_model(tenant_id, branch_id)
+        )
+
+        predicted_delays = await self._predict_group_delays(groups)
+
+        is_inflow = np.array([group['type'] == 'inflow' for group in groups], dtype=bool)
+        expected = np.array([group['expected_date'] for group in groups], dtype='datetime64[D]')
+
+        booked = forecast_math.scenario_flows(
+            (expected - np.datetime64(today)).astype(int) + np.asarray(predicted_delays, dtype=int),
+            is_inflow,
+            np.array([group['amount'] for group in groups], dtype=float),
+            np.array([group['raw_confidence'] for group in groups], dtype=float),
+            np.array([group['transactions'] for group in groups], dtype=float),
+            np.array([group['overdue_count'] for group in groups], dtype=float),
+            np.array([group['overdue_amount'] for group in groups], dtype=float),
+            np.array([1 + scenario.inflow_adjustment / 100]),
+            np.array([1 + scenario.outflow_adjustment / 100]),
+            np.array([scenario.delay_days]),
+            forecast_days
+        )
+
+        dates = np.datetime64(today) + np.arange(forecast_days)
+        run_rates, month_factors, seasonal_source = self._monthly_flow_profile(profile, profile_months)
+        daily_factors = {
+            trans_type: month_factors[trans_type][dates.astype('datetime64[M]').astype(int) % 12]
+            * self._seasonal_rule_factors(rules, dates)
+            for trans_type in ('inflow', 'outflow')
+        }
+
+        starts, granularity = forecast_math.horizon_buckets(
+            today, forecast_days, LONG_HORIZON_DAILY_DAYS, LONG_HORIZON_WEEKLY_DAYS
+        )
+        buckets = forecast_math.bucket_flows(
+            current_balance,
+            booked['inflow'][0],
+            booked['outflow'][0],
+            run_rates['inflow'] * daily_factors['inflow'] * (1 + scenario.inflow_adjustment / 100),
+            run_rates['outflow'] * daily_factors['outflow'] * (1 + scenario.outflow_adjustment / 100),
+            starts,
+            LONG_HORIZON_DAILY_DAYS
+        )
+
+        def bucket_mean(values: np.ndarray) -> List[float]:
+            return (np.add.reduceat(values, starts) / buckets['days']).tolist()
+
+        result = LongHorizonForecast(
+            scenario_type=scenario_type,
+            forecast_days=forecast_days,
+            generated_at=start,
+            current_balance=current_balance,
+            seasonal_source=seasonal_source,
+            granularity=granularity,
+            start_dates=dates[starts].tolist(),
+            end_dates=dates[starts + buckets['days'] - 1].tolist(),
+            inflow=buckets['inflow'].tolist(),
+            outflow=buckets['outflow'].tolist(),
+            booked_share=buckets['booked_share'].tolist(),
+            inflow_seasonal_factor=bucket_mean(daily_factors['inflow']),
+            outflow_seasonal_factor=bucket_mean(daily_factors['outflow']),
+            closing_balance=buckets['closing_balance'].tolist(),
+            min_balance=buckets['min_balance'].tolist(),
+            risk_level=[forecast_math.RISK_LEVELS[code] for code in buckets['risk_code']]
+        )
+
+        logger.info(
+            f"Long-horizon forecast for tenant {tenant_id}: {forecast_days} days in {len(starts)} buckets "
+            f"({seasonal_source} seasonality) in {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+
+        return result
+
+    @staticmethod
+    def _monthly_flow_profile(profile, months: np.ndarray) -> Tuple[Dict, Dict, str]:
+        """
+        Tip başına günlük ortalama akış ve ay katsayıları (indeks: ay - 1)
+
+        Katsayı, ayın günlük ortalamasının yıllık günlük ortalamaya oranıdır; 12 ayın hepsinde
+        veri yoksa MONTH_SEASONAL_FACTORS kullanılır. Ortalama ilk kayıttan itibaren hesaplanır (yeni tenant).
+        """
+
+        month_days = ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(float)
+        month_index = months.astype(int) % 12
+        days_by_month = np.zeros(12)
+        days_by_month[month_index] = month_days
+
+        first_day = min((row['first_day'] for row in profile), default=None)
+        window_start = max(np.datetime64(first_day, 'D'), months[0].astype('datetime64[D]')) if first_day else None
+        window_days = (
+            float(((months[-1] + 1).astype('datetime64[D]') - window_start).astype(int)) if window_start else 0.0
+        )
+
+        default_factors = np.array([MONTH_SEASONAL_FACTORS[month] for month in range(1, 13)])
+        run_rates, month_factors = {}, {}
+        sources = set()
+
+        for trans_type in ('inflow', 'outflow'):
+            amounts = np.zeros(12)
+            for row in profile:
+                if row['type'] == trans_type:
+                    amounts[row['month'] - 1] = row['amount']
+
+            run_rates[trans_type] = amounts.sum() / window_days if window_days else 0.0
+
+            if run_rates[trans_type] > 0 and (amounts > 0).all():
+                month_factors[trans_type] = (amounts / days_by_month) / run_rates[trans_type]
+                sources.add('history')
+            else:
+                month_factors[trans_type] = default_factors
+                sources.add('default')
+
+        return run_rates, month_factors, 'history' if sources == {'history'} else 'default'
+
+    @staticmethod
+    def _seasonal_rule_factors(rules: List[CashFlowRule], dates: np.ndarray) -> np.ndarray:
+        """Aktif seasonal_factor kurallarının gün başına çarpımı (tarih aralığı _calculate_confidence ile aynı)"""
+
+        factors = np.ones(len(dates))
+
+        for rule in rules:
+            if rule.rule_type != 'seasonal_factor':
+                continue
+
+            start_date = rule.conditions.get('start_date')
+            end_date = rule.conditions.get('end_date')
+            if not start_date or not end_date:
+                continue
+
+            factors[(dates >= np.datetime64(start_date)) & (dates <= np.datetime64(end_date))] *= rule.adjustment_factor
+
+        return factors
+
+    async def _predict_group_delays(self, groups) -> np.ndarray:
+        """Gecikme grup başına bir kez, grubun ortalama tutarıyla tahmin edilir"""
+
+        return await self._predict_delays([
+            {
+                'expected_date': group['expected_date'],
+                'amount': group['amount'] / group['transactions'],
+                'type': group['type'],
+                'source_module': group['source_module']
+            }
+            for group in groups
+        ])
+
+    @staticmethod
+    def _empty_day() -> Dict:
+        return {
+            'inflow': 0.0,
+            'outflow': 0.0,
+            'transactions': 0,
+            'overdue_inflow_count': 0,
+            'overdue_inflow_amount': 0.0
+        }
+
+    def _add_to_day(
+        self,
+        daily_flows: Dict,
+        date_key,
+        trans_type: str,
+        weighted_amount: float,
+        transactions: int,
+        overdue_count: int,
+        overdue_amount: float
+    ):
+        flows = daily_flows.setdefault(date_key, self._empty_day())
+
+        if trans_type == 'inflow':
+            flows['inflow'] += weighted_amount
+            flows['overdue_inflow_count'] += overdue_count
+            flows['overdue_inflow_amount'] += overdue_amount
+        else:
+            flows['outflow'] += weighted_amount
+
+        flows['transactions'] += transactions
+
+    def _shift_days(self, trans_type: str, predicted_delay: int, scenario: ScenarioType) -> int:
+        delay_days = int(predicted_delay)
+        if trans_type == 'inflow':
+            delay_days += scenario.delay_days
+
+        return delay_days
+
+    async def _daily_flows_from_rows(self, inputs: ForecastInputs, scenario: ScenarioType) -> Dict:
+        """Bekleyen işlem satırlarını günlük akışa dönüştür"""
+
+        daily_flows = {}
+
+        for trans, predicted_delay in zip(inputs.pending, inputs.predicted_delays):
+            expected_date = trans['expected_date']
+
+            delay_days = self._shift_days(trans['type'], predicted_delay, scenario)
+            if delay_days != 0:
+                expected_date = expected_date + timedelta(days=delay_days)
+
+            amount = float(trans['amount'])
+            confidence = await self._calculate_confidence(trans, inputs.rules, scenario)
+            is_overdue = trans.get('status') == 'overdue'
+
+            self._add_to_day(
+                daily_flows,
+                expected_date.date(),
+                trans['type'],
+                amount * confidence,
+                1,
+                int(is_overdue),
+                amount if is_overdue else 0.0
+            )
+
+        return daily_flows
+
+    def _daily_flows_from_aggregates(self, inputs: ForecastInputs, scenario: ScenarioType) -> Dict:
+        """
+        Veritabanında toplanmış grupları günlük akışa dönüştür
+
+        Satırlar gün, tip, kaynak modül ve tutar aralığına göre gruplanmıştır; senaryonun güven ağırlıklı
+        tutarı SQL'de hesaplanmıştır. Grubun tamamı tahmin edilen gecikme kadar kaydırılır.
+        """
+
+        weighted_column = f"weighted_{scenario.name}"
+
+        daily_flows = {}
+
+        for group, predicted_delay in zip(inputs.pending, inputs.predicted_delays):
+            date_key = group['expected_date'] + timedelta(
+                days=self._shift_days(group['type'], predicted_delay, scenario)
+            )
+
+            self._add_to_day(
+                daily_flows,
+                date_key,
+                group['type'],
+                group[weighted_column],
+                group['transactions'],
+                group['overdue_count'],
+                group['overdue_amount']
+            )
+
+        return daily_flows
+
+    @staticmethod
+    def _group_key(row: Mapping) -> Tuple:
+        """Bekleyen satırın aggregate grubu (pending_aggregate_query GROUP BY ile aynı)"""
+
+        return (
+            row['expected_date'].date(),
+            row['type'],
+            row['source_module'],
+            queries.amount_bucket(row['amount'])
+        )
+
+    async def load_forecast_patch(
+        self,
+        tenant_id: str,
+        branch_id: Optional[str],
+        images: List[Tuple[int, int, Mapping]],
+        end_date: datetime,
+        conn: Optional[asyncpg.Connection] = None
+    ) -> ForecastPatch:
+        """
+        Değişiklik görüntüleri için artımlı güncelleme girdilerini oku
+
+        Kurallar ve model yüklenir; aggregate modunda etkilenen günlerin grupları okunur. `conn`
+        değişiklik kaydını okuyan anlık görüntünün bağlantısıdır: gruplar tam olarak okunan
+        değişiklikleri içermelidir.
+        """
+
+        rules, _ = await asyncio.gather(
+            self._get_active_rules(tenant_id),
+            self._load_model(tenant_id, branch_id)
+        )
+
+        pending = [image for _, _, image in images if image['status'] in queries.PENDING_STATUSES]
+        row_delays: Tuple[int, ...] = ()
+        groups: Dict[Tuple, Mapping] = {}
+
+        if FORECAST_INPUT_MODE == 'rows':
+            row_delays = tuple(int(delay) for delay in await self._predict_delays(pending))
+
+        elif pending:
+            query, args = queries.pending_aggregate_query(
+                tenant_id,
+                branch_id,
+                end_date,
+                {
+                    name: (1 + scenario.inflow_adjustment / 100, 1 + scenario.outflow_adjustment / 100)
+                    for name, scenario in FORECAST_SCENARIOS.items()
+                },
+                expected_dates=sorted({image['expected_date'].date() for image in pending})
+            )
+
+            groups = {
+                (row['expected_date'], row['type'], row['source_module'], row['amount_bucket']): dict(row)
+                for row in await (conn or self.db).fetch(query, *args)
+            }
+
+        return ForecastPatch(
+            mode=FORECAST_INPUT_MODE,
+            rules=tuple(rules),
+            images=tuple(images),
+            row_delays=row_delays,
+            groups=groups
+        )
+
+    async def patch_predictions(
+        self,
+        patch: ForecastPatch,
+        scenario_type: str,
+        days: List[Mapping],
+        after_change_id: int
+    ) -> List[PredictionResult]:
+        """
+        Kayıtlı günlere `after_change_id` sonrasındaki değişiklikleri ekleyip seriyi yeniden üret
+
+        `days`: prediction_date, predicted_balance ve günlük akışları (factors_used) ile sıralı
+        kayıtlı günler. Kapanmış görüntüler başlangıç bakiyesini, bekleyenler tahmin edilen günün
+        akışını değiştirir; pencere dışına düşenler atlanır.
+        """
+
+        scenario = FORECAST_SCENARIOS[scenario_type]
+        weighted_column = f"weighted_{scenario.name}"
+        rules = list(patch.rules)
+
+        first = days[0]['factors_used']
+        start_balance = float(days[0]['predicted_balance']) - (first['day_inflow'] - first['day_outflow'])
+
+        daily_flows = {
+            day['prediction_date']: {
+                'inflow': day['factors_used']['day_inflow'],
+                'outflow': day['factors_used']['day_outflow'],
+                'transactions': int(day['factors_used']['transaction_count']),
+                'overdue_inflow_count': int(day['factors_used']['overdue_inflow_count']),
+                'overdue_inflow_amount': day['factors_used']['overdue_inflow_amount']
+            }
+            for day in days
+        }
+
+        # Tam hesaplamadaki `expected_date <= bitiş` süzgeci
+        window_end = datetime.combine(
+            days[-1]['prediction_date'] + timedelta(days=1), datetime.min.time(), timezone.utc
+        )
+
+        # Aggregate modunda grup başına fark: [işlem, tutar, ağırlıklı tutar, vadesi geçmiş sayı, tutar]
+        group_deltas: Dict[Tuple, List[float]] = {}
+        pending_index = -1
+
+        for change_id, sign, image in patch.images:
+            is_pending = image['status'] in queries.PENDING_STATUSES
+            pending_index += int(is_pending)
+
+            if change_id <= after_change_id:
+                continue
+
+            amount = image['amount']
+
+            if image['status'] == 'cleared':
+                start_balance += sign * (amount if image['type'] == 'inflow' else -amount)
+                continue
+
+            if not is_pending or image['expected_date'] > window_end:
+                continue
+
+            weighted = amount * await self._calculate_confidence(image, rules, scenario)
+            is_overdue = image['status'] == 'overdue'
+
+            if patch.mode == 'rows':
+                date_key = (
+                    image['expected_date']
+                    + timedelta(days=self._shift_days(image['type'], patch.row_delays[pending_index], scenario))
+                ).date()
+
+                if date_key in daily_flows:
+                    self._add_to_day(
+                        daily_flows,
+                        date_key,
+                        image['type'],
+                        sign * weighted,
+                        sign,
+                        sign * int(is_overdue),
+                        sign * amount if is_overdue else 0.0
+                    )
+                continue
+
+            delta = group_deltas.setdefault(self._group_key(image), [0, 0.0, 0.0, 0, 0.0])
+            delta[0] += sign
+            delta[1] += sign * amount
+            delta[2] += sign * weighted
+            delta[3] += sign * int(is_overdue)
+            delta[4] += sign * amount if is_overdue else 0.0
+
+        # Grubun önceki katkısı önceki ortalamanın gecikmesiyle çıkarılır, güncel katkı yenisiyle eklenir
+        states = []
+        for key, delta in group_deltas.items():
+            group = patch.groups.get(key)
+            current = [
+                group['transactions'], group['amount'], group[weighted_column],
+                group['overdue_count'], group['overdue_amount']
+            ] if group else [0, 0.0, 0.0, 0, 0.0]
+            previous = [value - change for value, change in zip(current, delta)]
+
+            for state, sign in ((previous, -1), (current, 1)):
+                if state[0] > 0:
+                    states.append((key, sign, state))
+
+        delays = await self._predict_group_delays([
+            {
+                'expected_date': key[0],
+                'type': key[1],
+                'source_module': key[2],
+                'amount': state[1],
+                'transactions': state[0]
+            }
+            for key, _, state in states
+        ])
+
+        for (key, sign, state), delay in zip(states, delays):
+            date_key = key[0] + timedelta(days=self._shift_days(key[1], delay, scenario))
+
+            if date_key in daily_flows:
+                self._add_to_day(
+                    daily_flows,
+                    date_key,
+                    key[1],
+                    sign * state[2],
+                    sign * int(state[0]),
+                    sign * int(state[3]),
+                    sign * state[4]
+                )
+
+        today = datetime.now().date()
+
+        return await self.build_predictions(
+            start_balance,
+            [
+                (datetime.combine(day['prediction_date'], datetime.min.time()), (day['prediction_date'] - today).days)
+                for day in days
+            ],
+            daily_flows,
+            scenario,
+            scenario_type
+        )
 
     async def _generate_recommendations(
         self,
         balance: float,
-        transactions: List[Dict],
+        overdue_count: int,
+        total_overdue: float,
         risk_level: str,
         days_ahead: int,
         scenario_type: str
@@ -471,35 +1839,24 @@ class EnhancedCashFlowAIAgent:
                 "⚠️ YÜKSEK RİSK: Nakit akışı dikkatle izlenmeli."
             )
 
-        overdue = [
-            t for t in transactions
-            if t['type'] == 'inflow' and t.get('status') == 'overdue'
-        ]
-
-        if overdue:
-            total_overdue = sum(t['amount'] for t in overdue)
+        if overdue_count:
             recommendations.append(
-                f"📞 {len(overdue)} vadesi geçmiş alacak var (₺{total_overdue:,.2f}). "
+                f"📞 {overdue_count} vadesi geçmiş alacak var (₺{total_overdue:,.2f}). "
                 "Tahsilat ekibi bilgilendirilmeli."
             )
 
         return recommendations[:5]
 
+    async def _get_change_watermark(self) -> int:
+        """cash_flow değişiklik kaydındaki son kayıt (artımlı güncelleme filigranı)"""
+
+        return await self.db.fetchval("SELECT COALESCE(MAX(id), 0) FROM public.ai_cash_flow_changes")
+
     async def _get_current_balance(self, tenant_id: str, branch_id: Optional[str]) -> float:
         """Güncel nakit bakiyesi"""
 
-        result = await self.db.fetchrow("""
-            SELECT COALESCE(SUM(
-                CASE
-                    WHEN type = 'inflow' THEN amount
-                    WHEN type = 'outflow' THEN -amount
-                END
-            ), 0) as balance
-            FROM public.cash_flow
-            WHERE tenant_id = $1
-            AND ($2::uuid IS NULL OR branch_id = $2)
-            AND status = 'cleared'
-        """, tenant_id, branch_id)
+        query, args = queries.current_balance_query(tenant_id, branch_id)
+        result = await self.db.fetchrow(query, *args)
 
         return float(result['balance']) if result else 0.0
 
@@ -508,8 +1865,9 @@ class EnhancedCashFlowAIAgent:
 
         await self.db.execute("""
             INSERT INTO public.ai_model_metrics
-            (tenant_id, branch_id, accuracy_score, mae, rmse, training_date, data_points, model_version)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+            (tenant_id, branch_id, accuracy_score, mae, rmse, training_date, data_points, model_version,
+             training_duration_seconds, additional_metrics, sampling_ratio, model_type)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
         """,
             tenant_id,
             branch_id,
@@ -518,29 +1876,341 @@ class EnhancedCashFlowAIAgent:
             metrics.rmse,
             metrics.training_date,
             metrics.data_points,
-            metrics.model_version
+            metrics.model_version,
+            int(round(metrics.training_seconds)),
+            {'hyperparameters': metrics.hyperparameters},
+            metrics.sampling_ratio,
+            MODEL_METRICS_TYPE
+        )
+
+        await self._save_rollup_model_metrics(tenant_id, branch_id, metrics)
+
+    async def _save_rollup_model_metrics(self, tenant_id: str, branch_id: Optional[str], metrics: ModelMetrics):
+        """/accuracy uç noktası son model metriklerini özet tablosundan okur (tenant veya ortak model)"""
+
+        await self.db.execute("""
+            INSERT INTO public.ai_accuracy_rollups
+            (tenant_id, branch_id, model_accuracy_score, model_mae, model_rmse, model_training_date,
+             model_data_points, model_version, model_sampling_ratio, model_scope, updated_at)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, NOW())
+            ON CONFLICT (tenant_id, branch_id)
+            DO UPDATE SET
+                model_accuracy_score = EXCLUDED.model_accuracy_score,
+                model_mae = EXCLUDED.model_mae,
+                model_rmse = EXCLUDED.model_rmse,
+                model_training_date = EXCLUDED.model_training_date,
+                model_data_points = EXCLUDED.model_data_points,
+                model_version = EXCLUDED.model_version,
+                model_sampling_ratio = EXCLUDED.model_sampling_ratio,
+                model_scope = EXCLUDED.model_scope,
+                updated_at = NOW()
+        """,
+            tenant_id,
+            branch_id,
+            metrics.accuracy_score,
+            metrics.mae,
+            metrics.rmse,
+            metrics.training_date,
+            metrics.data_points,
+            metrics.model_version,
+            metrics.sampling_ratio,
+            metrics.model_scope
+        )
+
+    async def save_predictions(
+        self,
+        tenant_id: str,
+        branch_id: Optional[str],
+        predictions: List[PredictionResult],
+        applied_change_id: Optional[int] = None,
+        expected_version: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        Tahminleri sürümlü kaydet, serinin güncel sürümünü döndür
+
+        Seri (tenant, şube, senaryo) satırı kilitlenir; yalnızca değeri değişen günler yazılır ve
+        yeni sürümü alır. Hiçbir gün değişmediyse sürüm artmaz (delta uç noktası boş döner).
+
+        `applied_change_id`: tahminin içerdiği son cash_flow değişiklik kaydı; verilmezse bu
+        ajanın son tahmin girdilerinin filigranı kullanılır. `expected_version` verilirse ve
+        seri bu arada başka bir yazımla ilerlemişse hiçbir şey yazılmaz, None döner.
+        """
+
+        if not predictions:
+            return 0
+
+        inputs = self.forecast_inputs
+        if applied_change_id is None and inputs and (inputs.tenant_id, inputs.branch_id) == (tenant_id, branch_id):
+            applied_change_id = inputs.change_watermark
+
+        versions = await self.save_prediction_series(
+            tenant_id,
+            {branch_id: predictions},
+            applied_change_id,
+            {branch_id: expected_version} if expected_version is not None else None
+        )
+
+        return versions.get(branch_id)
+
+    async def save_prediction_series(
+        self,
+        tenant_id: str,
+        series: Dict[Optional[str], List[PredictionResult]],
+        applied_change_id: Optional[int] = None,
+        expected_versions: Optional[Dict[Optional[str], int]] = None
+    ) -> Dict[Optional[str], int]:
+        """
+        Aynı senaryonun birden çok şube serisini tek işlemde, tek toplu yazımla kaydet
+
+        Seri satırları sıralı kilitlenir, tüm günler tek INSERT ... SELECT FROM unnest(...) ile
+        yazılır; değişen gün sayıları RETURNING ile seri başına sayılır. Şube -> güncel sürüm
+        döner; `expected_versions` tutmayan seriler yazılmaz ve sonuçta yer almaz.
+
+        Tam yazımlar serinin penceresini (`forecast_days`, saatlik tazelemenin gün sayısı) günceller;
+        `expected_versions` verilen artımlı yamalar yalnızca kalan günleri yazdığı için pencereyi korur.
+        """
+
+        series = {branch_id: predictions for branch_id, predictions in series.items() if predictions}
+        if not series:
+            return {}
+
+        scenario_type = next(iter(series.values()))[0].scenario_type
+        branch_ids = [branch_id for branch_id in series if branch_id is not None]
+        includes_tenant = None in series
+        full_write = expected_versions is None
+
+        async with self.db.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("""
+                    INSERT INTO public.ai_forecast_versions (tenant_id, branch_id, scenario_type)
+                    SELECT $1, b.branch_id, $2
+                    FROM unnest($3::uuid[]) AS b(branch_id)
+                    ON CONFLICT (tenant_id, branch_id, scenario_type) DO NOTHING
+                """, tenant_id, scenario_type, list(series))
+
+                locked = await conn.fetch("""
+                    SELECT branch_id, version
+                    FROM public.ai_forecast_versions
+                    WHERE tenant_id = $1
+                    AND scenario_type = $2
+                    AND (branch_id = ANY($3::uuid[]) OR (branch_id IS NULL AND $4))
+                    ORDER BY branch_id NULLS FIRST
+                    FOR UPDATE
+                """, tenant_id, scenario_type, branch_ids, includes_tenant)
+
+                current = {str(row['branch_id']) if row['branch_id'] else None: row['version'] for row in locked}
+
+                if expected_versions:
+                    series = {
+                        branch_id: predictions
+                        for branch_id, predictions in series.items()
+                        if expected_versions.get(branch_id, current[branch_id]) == current[branch_id]
+                    }
+                    if not series:
+                        return {}
+
+                rows = [
+                    (branch_id, current[branch_id] + 1, pred)
+                    for branch_id, predictions in series.items()
+                    for pred in predictions
+                ]
+
+                written = await conn.fetch("""
+                    INSERT INTO public.cash_flow_predictions
+                    (tenant_id, branch_id, prediction_date, predicted_balance, model_version, factors_used,
+                     confidence_score, risk_level, risk_color, scenario_type, recommendations, version)
+                    SELECT
+                        $1, u.branch_id, u.prediction_date, u.predicted_balance, $2, u.factors_used::jsonb,
+                        u.confidence_score, u.risk_level, u.risk_color, $3, u.recommendations::jsonb, u.version
+                    FROM unnest(
+                        $4::uuid[], $5::int8[], $6::date[], $7::float8[], $8::text[], $9::float8[],
+                        $10::text[], $11::text[], $12::text[]
+                    ) AS u(branch_id, version, prediction_date, predicted_balance, factors_used, confidence_score,
+                           risk_level, risk_color, recommendations)
+                    ON CONFLICT (tenant_id, branch_id, prediction_date, scenario_type)
+                    DO UPDATE SET
+                        predicted_balance = EXCLUDED.predicted_balance,
+                        model_version = EXCLUDED.model_version,
+                        factors_used = EXCLUDED.factors_used,
+                        confidence_score = EXCLUDED.confidence_score,
+                        risk_level = EXCLUDED.risk_level,
+                        risk_color = EXCLUDED.risk_color,
+                        recommendations = EXCLUDED.recommendations,
+                        version = EXCLUDED.version,
+                        updated_at = NOW()
+                    WHERE (
+                        cash_flow_predictions.predicted_balance,
+                        cash_flow_predictions.factors_used,
+                        cash_flow_predictions.confidence_score,
+                        cash_flow_predictions.risk_level,
+                        cash_flow_predictions.risk_color,
+                        cash_flow_predictions.recommendations
+                    ) IS DISTINCT FROM (
+                        EXCLUDED.predicted_balance,
+                        EXCLUDED.factors_used,
+                        EXCLUDED.confidence_score,
+                        EXCLUDED.risk_level,
+                        EXCLUDED.risk_color,
+                        EXCLUDED.recommendations
+                    )
+                    RETURNING branch_id
+                """,
+                    tenant_id,
+                    self.model_version,
+                    scenario_type,
+                    [branch_id for branch_id, _, _ in rows],
+                    [version for _, version, _ in rows],
+                    [pred.date.date() for _, _, pred in rows],
+                    [pred.predicted_balance for _, _, pred in rows],
+                    [json.dumps(pred.factors) for _, _, pred in rows],
+                    [pred.confidence_score for _, _, pred in rows],
+                    [pred.risk_level for _, _, pred in rows],
+                    [pred.risk_color for _, _, pred in rows],
+                    [json.dumps(pred.recommendations, ensure_ascii=False) for _, _, pred in rows]
+                )
+
+                changed_days = Counter(str(row['branch_id']) if row['branch_id'] else None for row in written)
+                versions = {
+                    branch_id: current[branch_id] + 1 if changed_days[branch_id] else current[branch_id]
+                    for branch_id in series
+                }
+
+                await conn.execute("""
+                    UPDATE public.ai_forecast_versions v
+                    SET version = u.version,
+                        changed_days = CASE WHEN u.changed_days > 0 THEN u.changed_days ELSE v.changed_days END,
+                        applied_change_id = COALESCE($3, v.applied_change_id),
+                        forecast_days = CASE WHEN $8 THEN u.forecast_days ELSE v.forecast_days END,
+                        updated_at = NOW()
+                    FROM unnest($4::uuid[], $5::int8[], $6::int[], $7::int[])
+                        AS u(branch_id, version, changed_days, forecast_days)
+                    WHERE v.tenant_id = $1
+                    AND v.scenario_type = $2
+                    AND v.branch_id IS NOT DISTINCT FROM u.branch_id
+                """,
+                    tenant_id,
+                    scenario_type,
+                    applied_change_id,
+                    list(versions),
+                    list(versions.values()),
+                    [changed_days[branch_id] for branch_id in versions],
+                    [len(series[branch_id]) for branch_id in versions],
+                    full_write
+                )
+
+        logger.info(
+            f"Forecast {tenant_id}/{scenario_type}: {len(series)} series, "
+            f"{sum(changed_days.values())}/{len(rows)} days changed"
+        )
+
+        return versions
+
+    async def refresh_tenant_forecasts(self, tenant_id: str, branch_fanout: bool, forecast_days: int = 30) -> int:
+        """
+        Saatlik güncelleme: gerçekçi seriyi ve tenant'ın kayıtlı diğer serilerini yeniden hesapla
+
+        Gerçekçi seri (`branch_fanout` ise tüm şubeler ve konsolide; fan-out aggregate gruplarıyla
+        çalıştığı için yalnızca aggregate modunda) en az `forecast_days`, kayıtlı
+        penceresi daha uzunsa o kadar gün hesaplanır. /predict ile istek üzerine kaydedilmiş diğer
+        seriler (senaryo, şube) kendi pencereleriyle tazelenir; girdiler şube başına bir kez okunur.
+        Yazılan seri sayısı döner.
+        """
+
+        rows = await self.db.fetch("""
+            SELECT branch_id, scenario_type, forecast_days
+            FROM public.ai_forecast_versions
+            WHERE tenant_id = $1
+        """, tenant_id)
+
+        windows = {
+            (str(row['branch_id']) if row['branch_id'] else None, row['scenario_type']): row['forecast_days']
+            for row in rows
+        }
+
+        if branch_fanout and FORECAST_INPUT_MODE == 'aggregate':
+            days = max(
+                [forecast_days] + [d for (_, scenario_type), d in windows.items() if scenario_type == 'realistic']
+            )
+            forecast = await self.predict_branch_fanout(tenant_id, days, 'realistic')
+            await self.save_prediction_series(tenant_id, forecast.series, forecast.change_watermark)
+            written = {(branch_id, 'realistic') for branch_id in forecast.series}
+        else:
+            days = max(forecast_days, windows.get((None, 'realistic'), forecast_days))
+            predictions = await self.predict_cash_flow(tenant_id, days, None, 'realistic')
+            await self.save_predictions(tenant_id, None, predictions)
+            written = {(None, 'realistic')}
+
+        stale: Dict[Optional[str], List[Tuple[str, int]]] = {}
+        for (branch_id, scenario_type), days in windows.items():
+            if (branch_id, scenario_type) not in written:
+                stale.setdefault(branch_id, []).append((scenario_type, days))
+
+        for branch_id, series in stale.items():
+            inputs = await self.load_forecast_inputs(tenant_id, max(days for _, days in series), branch_id)
+            for scenario_type, days in series:
+                predictions = await self.predict_cash_flow(tenant_id, days, branch_id, scenario_type, inputs=inputs)
+                await self.save_predictions(tenant_id, branch_id, predictions)
+
+        return len(written) + sum(len(series) for series in stale.values())
+
+    async def save_long_horizon(self, tenant_id: str, branch_id: Optional[str], forecast: LongHorizonForecast):
+        """Uzun vade tahminini seri başına tek satır (kova dizileri jsonb) olarak kaydet"""
+
+        buckets = json.loads(forecast.json(
+            exclude={'format', 'scenario_type', 'forecast_days', 'generated_at', 'current_balance'}
+        ))
+
+        await self.db.execute("""
+            INSERT INTO public.ai_long_horizon_forecasts
+            (tenant_id, branch_id, scenario_type, forecast_days, current_balance, bucket_count, buckets, generated_at)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+            ON CONFLICT (tenant_id, branch_id, scenario_type)
+            DO UPDATE SET
+                forecast_days = EXCLUDED.forecast_days,
+                current_balance = EXCLUDED.current_balance,
+                bucket_count = EXCLUDED.bucket_count,
+                buckets = EXCLUDED.buckets,
+                generated_at = EXCLUDED.generated_at,
+                updated_at = NOW()
+        """,
+            tenant_id,
+            branch_id,
+            forecast.scenario_type,
+            forecast.forecast_days,
+            forecast.current_balance,
+            len(forecast.granularity),
+            buckets,
+            forecast.generated_at
         )
 
     async def calculate_scenario_comparison(
         self,
         tenant_id: str,
         forecast_days: int = 30,
-        branch_id: Optional[str] = None
+        branch_id: Optional[str] = None,
+        columnar: bool = False
     ) -> Dict:
-        """Tüm senaryoları karşılaştır"""
+        """Tüm senaryoları karşılaştır (`columnar`: tahminler ColumnarForecast biçiminde)"""
 
         scenarios = {}
 
-        for scenario_type in ['pessimistic', 'realistic', 'optimistic']:
+        # Girdiler bir kez okunur, üç senaryo aynı anlık görüntüden hesaplanır
+        inputs = await self.load_forecast_inputs(tenant_id, forecast_days, branch_id)
+
+        for scenario_type in FORECAST_SCENARIOS:
             predictions = await self.predict_cash_flow(
                 tenant_id,
                 forecast_days,
                 branch_id,
-                scenario_type
+                scenario_type,
+                inputs=inputs
             )
 
             scenarios[scenario_type] = {
-                'predictions': [p.dict() for p in predictions],
+                'predictions': (
+                    ColumnarForecast.from_predictions(predictions, scenario_type).dict()
+                    if columnar else [p.dict() for p in predictions]
+                ),
                 'final_balance': predictions[-1].predicted_balance if predictions else 0,
                 'min_balance': min(p.predicted_balance for p in predictions) if predictions else 0,
                 'critical_days': [
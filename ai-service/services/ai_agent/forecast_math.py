@@ -0,0 +1,358 @@
+"""
+Tahmin serileri için vektörel hesaplar
+
+Seriler (şube, senaryo...) satır, günler sütun olan matrislerle işlenir; tek seri de
+1 satırlı matristir. Risk eşikleri (nakit yetme süresi, uzun vadede düşük bakiye) burada tanımlıdır.
+"""
+from datetime import date, timedelta
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+FLOW_KEYS = ('inflow', 'outflow', 'transactions', 'overdue_inflow_count', 'overdue_inflow_amount')
+
+# risk_codes çıktısının karşılığı
+RISK_LEVELS = ('low', 'medium', 'high', 'critical')
+
+# Gecikme hata dağılımı eşit olasılıklı bu kadar kantille saklanır (2'nin kuvveti: örnekleme rastgele
+# baytların maskelenmesiyle yapılır)
+RESIDUAL_QUANTILE_COUNT = 128
+
+BAND_PERCENTILES = (10, 50, 90)
+
+
+def daily_flow_matrix(
+    series_index: np.ndarray,
+    day_index: np.ndarray,
+    is_inflow: np.ndarray,
+    weighted: np.ndarray,
+    transactions: np.ndarray,
+    overdue_count: np.ndarray,
+    overdue_amount: np.ndarray,
+    n_series: int,
+    n_days: int
+) -> Dict[str, np.ndarray]:
+    """
+    Grup/satır dizilerini (seri, gün) akış matrislerine topla
+
+    Pencere dışına düşen günler atılır. Giriş olmayan her kayıt çıkış sayılır; vadesi geçmiş
+    alanları yalnızca girişler için toplanır.
+    """
+
+    mask = (day_index >= 0) & (day_index < n_days)
+    flat = series_index[mask] * n_days + day_index[mask]
+    inflow_mask = is_inflow[mask]
+
+    def accumulate(values: np.ndarray) -> np.ndarray:
+        return np.bincount(
+            flat, weights=np.asarray(values, dtype=float), minlength=n_series * n_days
+        ).reshape(n_series, n_days)
+
+    weighted = np.asarray(weighted, dtype=float)[mask]
+
+    return {
+        'inflow': accumulate(np.where(inflow_mask, weighted, 0.0)),
+        'outflow': accumulate(np.where(inflow_mask, 0.0, weighted)),
+        'transactions': accumulate(np.asarray(transactions)[mask]),
+        'overdue_inflow_count': accumulate(np.where(inflow_mask, np.asarray(overdue_count)[mask], 0)),
+        'overdue_inflow_amount': accumulate(np.where(inflow_mask, np.asarray(overdue_amount)[mask], 0.0))
+    }
+
+
+def flows_from_days(daily_flows: Dict, dates: List[date]) -> Dict[str, np.ndarray]:
+    """Gün -> akış sözlüğünü 1 satırlı akış matrislerine çevir"""
+
+    return {
+        key: np.array([[daily_flows[day][key] if day in daily_flows else 0.0 for day in dates]], dtype=float)
+        for key in FLOW_KEYS
+    }
+
+
+def running_balances(start_balances: np.ndarray, inflow: np.ndarray, outflow: np.ndarray) -> np.ndarray:
+    """
+    Gün sonu bakiyeleri
+
+    Başlangıç bakiyesi toplamın ilk elemanıdır; toplama sırası gün gün döngüyle aynıdır.
+    """
+
+    net = inflow - outflow
+
+    return np.cumsum(np.column_stack([np.asarray(start_balances, dtype=float), net]), axis=1)[:, 1:]
+
+
+def risk_codes(balances: np.ndarray, outflow: np.ndarray, days_ahead: np.ndarray) -> np.ndarray:
+    """RISK_LEVELS sırası: bakiye eksi veya nakit yetme süresi 7/15/30 günün altı, 60 gün sonrası düşük bakiye"""
+
+    runway = np.divide(balances, outflow, out=np.full_like(balances, np.inf), where=outflow > 0)
+
+    return np.select(
+        [
+            balances < 0,
+            runway < 7,
+            runway < 15,
+            runway < 30,
+            (days_ahead > 60) & (balances < 50000)
+        ],
+        [3, 3, 2, 1, 1],
+        default=0
+    )
+
+
+def collapse_groups(
+    base_day: np.ndarray,
+    is_inflow: np.ndarray,
+    raw_confidence: np.ndarray,
+    values: Dict[str, np.ndarray]
+):
+    """
+    Aynı gün, tip ve ham güvene sahip grupları birleştir
+
+    Senaryo sonucu bu üçlüye ve tutar toplamlarına bağlıdır; birleştirme sonucu değiştirmez,
+    grup sayısını (gün × tip × farklı güven değeri) sınırına indirir.
+    """
+
+    keys, inverse = np.unique(
+        np.column_stack([base_day, is_inflow, raw_confidence]), axis=0, return_inverse=True
+    )
+    inverse = inverse.ravel()
+
+    return (
+        keys[:, 0].astype(int),
+        keys[:, 1].astype(bool),
+        keys[:, 2],
+        {key: np.bincount(inverse, weights=array, minlength=len(keys)) for key, array in values.items()}
+    )
+
+
+def scenario_flows(
+    base_day: np.ndarray,
+    is_inflow: np.ndarray,
+    amount: np.ndarray,
+    raw_confidence: np.ndarray,
+    transactions: np.ndarray,
+    overdue_count: np.ndarray,
+    overdue_amount: np.ndarray,
+    inflow_factors: np.ndarray,
+    outflow_factors: np.ndarray,
+    delay_days: np.ndarray,
+    n_days: int
+) -> Dict[str, np.ndarray]:
+    """
+    Aynı bekleyen gruplar için birden çok senaryonun akış matrisleri (senaryo × gün)
+
+    Güven `amount * clip(ham güven * çarpan, 0.05, 1)` ile aggregate sorgusundaki gibi
+    hesaplanır; senaryonun gecikme günü yalnızca girişleri kaydırır. Bellek senaryo × grup
+    kadardır, çağıran taraf büyük ızgaraları parçalara böler.
+    """
+
+    n_scenarios, n_groups = len(inflow_factors), len(base_day)
+    shape = (n_scenarios, n_groups)
+
+    factors = np.where(is_inflow[None, :], inflow_factors[:, None], outflow_factors[:, None])
+    weighted = amount[None, :] * np.clip(raw_confidence[None, :] * factors, 0.05, 1.0)
+    day_index = base_day[None, :] + np.where(is_inflow[None, :], delay_days[:, None], 0)
+
+    return daily_flow_matrix(
+        np.broadcast_to(np.arange(n_scenarios)[:, None], shape).ravel(),
+        day_index.ravel(),
+        np.broadcast_to(is_inflow, shape).ravel(),
+        weighted.ravel(),
+        np.broadcast_to(transactions, shape).ravel(),
+        np.broadcast_to(overdue_count, shape).ravel(),
+        np.broadcast_to(overdue_amount, shape).ravel(),
+        n_scenarios,
+        n_days
+    )
+
+
+def balance_summary(balances: np.ndarray, codes: np.ndarray) -> Dict[str, np.ndarray]:
+    """Seri başına son/en düşük bakiye, ilk eksi gün (-1: yok) ve kritik gün sayısı"""
+
+    negative = balances < 0
+
+    return {
+        'final_balance': balances[:, -1],
+        'min_balance': balances.min(axis=1),
+        'min_day': balances.argmin(axis=1),
+        'runway_days': np.where(negative.any(axis=1), negative.argmax(axis=1), -1),
+        'critical_days': (codes == RISK_LEVELS.index('critical')).sum(axis=1)
+    }
+
+
+def residual_quantiles(residuals: np.ndarray) -> List[float]:
+    """Test hatalarının (gerçek - tahmin, gün) eşit olasılıklı kantilleri; her biri 1/N olasılık taşır"""
+
+    levels = (np.arange(RESIDUAL_QUANTILE_COUNT) + 0.5) / RESIDUAL_QUANTILE_COUNT
+
+    return np.quantile(np.asarray(residuals, dtype=float), levels).tolist()
+
+
+def residual_offsets(quantiles: Optional[List[float]], mae: float) -> Tuple[np.ndarray, str]:
+    """
+    Örneklenecek gecikme hatası tablosu (RESIDUAL_QUANTILE_COUNT adet tam gün) ve kaynağı
+
+    Kantiller yoksa (eski model) MAE'den normal dağılım yaklaşımı (sd = MAE × √(π/2)),
+    o da yoksa sıfır hata kullanılır.
+    """
+
+    levels = (np.arange(RESIDUAL_QUANTILE_COUNT) + 0.5) / RESIDUAL_QUANTILE_COUNT
+
+    if quantiles:
+        # Farklı sayıda saklanmış kantiller tablo boyuna enterpole edilir
+        stored = np.asarray(quantiles, dtype=float)
+        stored_levels = (np.arange(len(stored)) + 0.5) / len(stored)
+        return np.rint(np.interp(levels, stored_levels, stored)).astype(np.int32), 'holdout'
+
+    if mae > 0:
+        normal = NormalDist(0.0, mae * np.sqrt(np.pi / 2))
+        return np.rint([normal.inv_cdf(level) for level in levels]).astype(np.int32), 'mae'
+
+    return np.zeros(RESIDUAL_QUANTILE_COUNT, dtype=np.int32), 'none'
+
+
+def monte_carlo_balances(
+    expected_day: np.ndarray,
+    predicted_delay: np.ndarray,
+    signed_amount: np.ndarray,
+    transactions: np.ndarray,
+    offsets: np.ndarray,
+    start_balance: float,
+    n_days: int,
+    n_paths: int,
+    max_delay: int,
+    chunk_cells: int,
+    rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Yol × gün bakiye matrisi
+
+    Gruplar işlem sayısı kadar açılır (işlem başına grubun ortalama tutarı); her yolda her işlemin
+    gecikmesi tahmin + `offsets` içinden bağımsız örneklenen hatadır ve [-max_delay, max_delay]
+    aralığına kırpılır. Kırpılmış gecikmeler (tahmin × hata sırası) tablosundan okunur; pencere
+    dışına düşen işlemler yol başına iki taşma gününe toplanıp atılır. Yollar, yol × işlem hücresi
+    `chunk_cells` sınırını aşmayacak parçalarla işlenir.
+    """
+
+    counts = np.asarray(transactions, dtype=np.int64)
+    day = np.repeat(np.asarray(expected_day, dtype=np.int32), counts)
+    delay = np.repeat(np.clip(np.asarray(predicted_delay), -max_delay, max_delay), counts)
+    amount = np.repeat(np.asarray(signed_amount, dtype=float) / np.maximum(counts, 1), counts)
+
+    shift_table = np.clip(
+        np.arange(-max_delay, max_delay + 1)[:, None] + offsets[None, :], -max_delay, max_delay
+    ).astype(np.int32).ravel()
+    row_start = ((delay + max_delay) * len(offsets)).astype(np.intp)
+
+    n_items = len(day)
+    width = n_days + 2
+    balances = np.empty((n_paths, n_days))
+    chunk = max(1, chunk_cells // max(n_items, 1))
+
+    for offset in range(0, n_paths, chunk):
+        paths = min(chunk, n_paths - offset)
+
+        sampled = np.frombuffer(rng.bytes(paths * n_items), dtype=np.uint8).reshape(paths, n_items) & (len(offsets) - 1)
+        day_index = day + shift_table[row_start + sampled]
+
+        np.clip(day_index, -1, n_days, out=day_index)
+        day_index += np.arange(paths, dtype=np.int32)[:, None] * width + 1
+
+        net = np.bincount(
+            day_index.ravel(), weights=np.broadcast_to(amount, (paths, n_items)).ravel(), minlength=paths * width
+        ).reshape(paths, width)[:, 1:-1]
+
+        balances[offset:offset + paths] = start_balance + np.cumsum(net, axis=1)
+
+    return balances
+
+
+def balance_bands(balances: np.ndarray) -> Dict[str, np.ndarray]:
+    """Gün başına P10/P50/P90 bakiye, ortalama ve eksi bakiye olasılığı"""
+
+    p10, p50, p90 = np.percentile(balances, BAND_PERCENTILES, axis=0)
+
+    return {
+        'p10': p10,
+        'p50': p50,
+        'p90': p90,
+        'mean': balances.mean(axis=0),
+        'negative_probability': (balances < 0).mean(axis=0)
+    }
+
+
+def horizon_buckets(start: date, n_days: int, daily_days: int, weekly_until: int) -> Tuple[np.ndarray, List[str]]:
+    """
+    Uzun vade kovalarının başlangıç günleri (başlangıca göre) ve türleri
+
+    İlk `daily_days` gün günlük, `weekly_until` gününe kadar 7 günlük, sonrası takvim ayı
+    (ilk ay kovası ay sonuna kadar kısa olabilir); son kova `n_days` ile kesilir.
+    """
+
+    starts, kinds = [], []
+    day = 0
+
+    while day < n_days:
+        starts.append(day)
+
+        if day < daily_days:
+            kinds.append('day')
+            day += 1
+        elif day < weekly_until:
+            kinds.append('week')
+            day += 7
+        else:
+            kinds.append('month')
+            current = start + timedelta(days=day)
+            next_month = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+            day += (next_month - current).days
+
+    return np.array(starts, dtype=int), kinds
+
+
+def bucket_flows(
+    start_balance: float,
+    booked_inflow: np.ndarray,
+    booked_outflow: np.ndarray,
+    projected_inflow: np.ndarray,
+    projected_outflow: np.ndarray,
+    starts: np.ndarray,
+    projection_from: int
+) -> Dict[str, np.ndarray]:
+    """
+    Günlük akışları kovalara topla
+
+    Bekleyen işlemlerden gelen (kesinleşmiş) akış her kovada kullanılır. `projection_from` gününden
+    sonra başlayan kovalarda akış kesinleşmiş ve mevsimsel projeksiyonun büyüğüdür: defter uzak
+    kovaları eksik kapsar, dolu kovada projeksiyon ikinci kez sayılmaz. Ek akış kova günlerine eşit
+    dağıtılır; bakiye günlük yürütülür, kovanın en düşük bakiyesi buradan okunur.
+    """
+
+    n_days = len(booked_inflow)
+    lengths = np.diff(np.append(starts, n_days))
+    projecting = starts >= projection_from
+
+    booked_in = np.add.reduceat(booked_inflow, starts)
+    booked_out = np.add.reduceat(booked_outflow, starts)
+    inflow = np.where(projecting, np.maximum(booked_in, np.add.reduceat(projected_inflow, starts)), booked_in)
+    outflow = np.where(projecting, np.maximum(booked_out, np.add.reduceat(projected_outflow, starts)), booked_out)
+
+    balances = running_balances(
+        np.array([start_balance]),
+        (booked_inflow + np.repeat((inflow - booked_in) / lengths, lengths))[None, :],
+        (booked_outflow + np.repeat((outflow - booked_out) / lengths, lengths))[None, :]
+    )[0]
+
+    total = inflow + outflow
+    min_balance = np.minimum.reduceat(balances, starts)
+
+    return {
+        'days': lengths,
+        'inflow': inflow,
+        'outflow': outflow,
+        'booked_share': np.divide(booked_in + booked_out, total, out=np.ones_like(total), where=total > 0),
+        'closing_balance': balances[starts + lengths - 1],
+        'min_balance': min_balance,
+        # Kovanın en düşük bakiyesi ve ortalama günlük çıkışıyla (nakit yetme süresi)
+        'risk_code': risk_codes(min_balance, outflow / lengths, starts)
+    }
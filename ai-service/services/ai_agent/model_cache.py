@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import os
+import pickle
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedModel:
+    """Bellekteki model kaydı; model=None ise tenant'a ait model yok (ortak model kullanılır)"""
+    model_key: str
+    model: object
+    feature_columns: List[str]
+    accuracy_score: float
+    mae: float
+    trained_at: Optional[datetime]
+    size_bytes: int
+    expires_at: float
+    tenant_profile: Dict = field(default_factory=dict)
+    # Test verisindeki gecikme hatası kantilleri (Monte Carlo bantları); eski modellerde boş
+    residual_quantiles: List[float] = field(default_factory=list)
+
+
+class ModelCache:
+    """
+    Bellek bütçeli LRU model önbelleği (süreç başına bir tane)
+
+    - Boyut, modelin pickle edilmiş halinin bayt uzunluğu ile yaklaşık hesaplanır
+    - Bütçe aşılınca en uzun süredir kullanılmayan modeller çıkarılır
+    - Kayıtlar TTL sonunda düşer; başka süreçte eğitilen modeller böylece yeniden okunur
+    """
+
+    MISSING_ENTRY_BYTES = 1024
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[str, CachedModel]' = OrderedDict()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> 'ModelCache':
+        return cls(
+            max_bytes=int(float(os.getenv("MODEL_CACHE_MAX_MB", 512)) * 1024 * 1024),
+            ttl_seconds=float(os.getenv("MODEL_CACHE_TTL_SECONDS", 3600))
+        )
+
+    def get(self, model_key: str) -> Optional[CachedModel]:
+        entry = self._entries.get(model_key)
+
+        if entry is not None and entry.expires_at < time.monotonic():
+            self._remove(model_key)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(model_key)
+        self.hits += 1
+
+        return entry
+
+    async def put_row(self, model_key: str, row) -> CachedModel:
+        """ai_delay_models satırından modeli aç ve önbelleğe koy (unpickle olay döngüsünü bloklamaz)"""
+
+        blob = row['model_blob']
+        model = await asyncio.get_running_loop().run_in_executor(None, pickle.loads, blob)
+
+        return self.put(CachedModel(
+            model_key=model_key,
+            model=model,
+            feature_columns=row['feature_columns'],
+            accuracy_score=float(row['accuracy_score'] or 0),
+            mae=float(row['mae'] or 0),
+            trained_at=row['trained_at'],
+            size_bytes=len(blob),
+            expires_at=time.monotonic() + self.ttl_seconds,
+            residual_quantiles=list(row['residual_quantiles'] or [])
+        ))
+
+    def put_model(self, model_key: str, model, feature_columns: List[str], accuracy_score: float,
+                  mae: float, trained_at: datetime, size_bytes: int,
+                  residual_quantiles: Optional[List[float]] = None) -> CachedModel:
+        return self.put(CachedModel(
+            model_key=model_key,
+            model=model,
+            feature_columns=feature_columns,
+            accuracy_score=accuracy_score,
+            mae=mae,
+            trained_at=trained_at,
+            size_bytes=size_bytes,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            residual_quantiles=list(residual_quantiles or [])
+        ))
+
+    def mark_missing(self, model_key: str, tenant_profile: Optional[Dict] = None) -> CachedModel:
+        """Tenant'ın kendi modeli olmadığını (ve profilini) önbelleğe al"""
+
+        return self.put(CachedModel(
+            model_key=model_key,
+            model=None,
+            feature_columns=[],
+            accuracy_score=0.0,
+            mae=0.0,
+            trained_at=None,
+            size_bytes=self.MISSING_ENTRY_BYTES,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            tenant_profile=tenant_profile or {}
+        ))
+
+    def put(self, entry: CachedModel) -> CachedModel:
+        self._remove(entry.model_key)
+
+        if entry.size_bytes > self.max_bytes:
+            logger.warning(f"Model {entry.model_key} ({entry.size_bytes} bytes) exceeds cache budget, not cached")
+            return entry
+
+        self._entries[entry.model_key] = entry
+        self.resident_bytes += entry.size_bytes
+
+        while self.resident_bytes > self.max_bytes:
+            evicted_key, _ = next(iter(self._entries.items()))
+            self._remove(evicted_key)
+            self.evictions += 1
+
+        return entry
+
+    def invalidate(self, model_key: str):
+        self._remove(model_key)
+
+    def _remove(self, model_key: str):
+        entry = self._entries.pop(model_key, None)
+        if entry is not None:
+            self.resident_bytes -= entry.size_bytes
+
+    async def warm_up(self, db: asyncpg.Pool, tenant_limit: int) -> int:
+        """En aktif tenant'ların modellerini ve ortak modeli önceden yükle"""
+
+        tenants = await db.fetch("""
+            SELECT tenant_id
+            FROM public.cash_flow
+            WHERE status IN ('pending', 'partial', 'overdue')
+            GROUP BY tenant_id
+            ORDER BY COUNT(*) DESC
+            LIMIT $1
+        """, tenant_limit)
+
+        tenant_ids = [row['tenant_id'] for row in tenants]
+        model_keys = ['global'] + [f"tenant:{tenant_id}:-" for tenant_id in tenant_ids]
+
+        rows = await db.fetch("""
+            SELECT model_key, model_blob, feature_columns, accuracy_score, mae, trained_at, residual_quantiles
+            FROM public.ai_delay_models
+            WHERE model_key = ANY($1::text[])
+        """, model_keys)
+
+        rows_by_key = {row['model_key']: row for row in rows}
+        loaded = 0
+
+        for model_key in model_keys:
+            row = rows_by_key.get(model_key)
+            if row is None:
+                continue
+
+            if self.resident_bytes + len(row['model_blob']) > self.max_bytes:
+                break
+
+            await self.put_row(model_key, row)
+            loaded += 1
+
+        logger.info(f"Model cache warmed up: {loaded} models, {self.resident_bytes} bytes")
+
+        return loaded
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+
+        return {
+            'entries': len(self._entries),
+            'resident_bytes': self.resident_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            'evictions': self.evictions,
+            'ttl_seconds': self.ttl_seconds
+        }
+
+
+model_cache = ModelCache.from_env()
@@ -0,0 +1,200 @@
+from datetime import date, datetime
+from itertools import product
+from typing import Annotated, List, Dict, Optional
+from pydantic import BaseModel, Field
+
+# Senaryo ayarları yüzde olarak uygulanır (1 + ayar / 100); -100 akışı sıfırlar
+Adjustment = Annotated[float, Field(ge=-100, le=1000)]
+# Gecikme en fazla tahmin penceresi (90 gün) kadar kaydırır
+DelayDays = Annotated[int, Field(ge=-90, le=90)]
+
+
+class CashFlowRule(BaseModel):
+    id: str
+    rule_type: str
+    conditions: Dict
+    adjustment_factor: float
+    priority: int
+
+
+class ScenarioType(BaseModel):
+    name: str
+    inflow_adjustment: Adjustment = 0.0
+    outflow_adjustment: Adjustment = 0.0
+    delay_days: DelayDays = 0
+
+
+class ScenarioGrid(BaseModel):
+    """Giriş ayarı × çıkış ayarı × gecikme günü ızgarası (her kombinasyon bir senaryo)"""
+    inflow_adjustments: List[Adjustment] = [0.0]
+    outflow_adjustments: List[Adjustment] = [0.0]
+    delay_days: List[DelayDays] = [0]
+
+    def size(self) -> int:
+        """Izgaranın nokta sayısı (points() çağırmadan)"""
+        return len(self.inflow_adjustments) * len(self.outflow_adjustments) * len(self.delay_days)
+
+    def points(self) -> List[ScenarioType]:
+        return [
+            ScenarioType(
+                name=f"in{inflow:+g}_out{outflow:+g}_d{delay:+d}",
+                inflow_adjustment=inflow,
+                outflow_adjustment=outflow,
+                delay_days=delay
+            )
+            for inflow, outflow, delay in product(self.inflow_adjustments, self.outflow_adjustments, self.delay_days)
+        ]
+
+
+class WhatIfRequest(BaseModel):
+    """Keyfi senaryolar ve/veya ızgara; ikisi birlikte verilirse senaryolar önce gelir"""
+    scenarios: List[ScenarioType] = []
+    grid: Optional[ScenarioGrid] = None
+
+    def size(self) -> int:
+        """expand() ile üretilecek senaryo sayısı"""
+        return len(self.scenarios) + (self.grid.size() if self.grid else 0)
+
+    def expand(self) -> List[ScenarioType]:
+        return self.scenarios + (self.grid.points() if self.grid else [])
+
+
+class ScenarioOutcome(BaseModel):
+    """Bir senaryonun tahmin penceresi özeti"""
+    name: str
+    inflow_adjustment: float
+    outflow_adjustment: float
+    delay_days: int
+    final_balance: float
+    min_balance: float
+    min_balance_date: datetime
+    runway_days: Optional[int] = None
+    critical_days: int
+
+
+class WhatIfResult(BaseModel):
+    """
+    What-if değerlendirmesi
+
+    `runway_days`: bakiyenin ilk eksiye düştüğü gün (pencere içinde düşmüyorsa None);
+    `critical_days`: risk seviyesi 'critical' olan gün sayısı.
+    """
+    forecast_days: int
+    current_balance: float
+    pending_groups: int
+    elapsed_ms: float
+    outcomes: List[ScenarioOutcome]
+
+
+class ProbabilisticForecast(BaseModel):
+    """
+    Monte Carlo bakiye bantları (sütunsal)
+
+    `p10`/`p50`/`p90`: yolların gün sonu bakiyesi yüzdelikleri; `negative_probability`: bakiyesi
+    eksi olan yolların oranı. `residual_source`: 'holdout' (eğitimdeki test hataları),
+    'mae' (yalnızca MAE'den normal yaklaşım) veya 'none' (model yok, gecikme belirsizliği yok).
+    """
+    scenario_type: str
+    forecast_days: int
+    paths: int
+    current_balance: float
+    pending_transactions: int
+    residual_source: str
+    elapsed_ms: float
+    dates: List[datetime]
+    p10: List[float]
+    p50: List[float]
+    p90: List[float]
+    mean: List[float]
+    negative_probability: List[float]
+
+
+class LongHorizonForecast(BaseModel):
+    """
+    Uzun vadeli kova tahmini (sütunsal)
+
+    Kova başına alanlar paralel dizilerdir; `granularity` 'day' / 'week' / 'month', `end_dates` dahildir.
+    `booked_share`: akışın bekleyen işlemlerden gelen payı (kalanı mevsimsel projeksiyon);
+    `seasonal_source`: 'history' (son 12 ayın aylık profili) veya 'default' (sabit aylık katsayılar).
+    """
+    format: str = 'buckets'
+    scenario_type: str
+    forecast_days: int
+    generated_at: datetime
+    current_balance: float
+    seasonal_source: str
+    granularity: List[str]
+    start_dates: List[date]
+    end_dates: List[date]
+    inflow: List[float]
+    outflow: List[float]
+    booked_share: List[float]
+    inflow_seasonal_factor: List[float]
+    outflow_seasonal_factor: List[float]
+    closing_balance: List[float]
+    min_balance: List[float]
+    risk_level: List[str]
+
+
+class PredictionResult(BaseModel):
+    date: datetime
+    predicted_balance: float
+    confidence_score: float
+    risk_level: str
+    risk_color: str
+    factors: Dict[str, float]
+    recommendations: List[str]
+    scenario_type: str = 'realistic'
+
+
+class ColumnarForecast(BaseModel):
+    """
+    Sütunsal tahmin yanıtı (`format=columnar`)
+
+    Gün başına alanlar paralel dizilerdir; `recommendations[i]`, i. günün önerilerinin
+    `recommendation_table` içindeki sıralarıdır (tekrarlanan metinler bir kez gönderilir).
+    """
+    format: str = 'columnar'
+    scenario_type: str
+    dates: List[datetime]
+    predicted_balance: List[float]
+    confidence_score: List[float]
+    risk_level: List[str]
+    risk_colors: Dict[str, str]
+    factors: Dict[str, List[float]]
+    recommendation_table: List[str]
+    recommendations: List[List[int]]
+
+    @classmethod
+    def from_predictions(cls, predictions: List[PredictionResult], scenario_type: str = 'realistic') -> 'ColumnarForecast':
+        table: Dict[str, int] = {}
+        recommendations = [
+            [table.setdefault(text, len(table)) for text in p.recommendations]
+            for p in predictions
+        ]
+        factor_keys = sorted({key for p in predictions for key in p.factors})
+
+        return cls(
+            scenario_type=predictions[0].scenario_type if predictions else scenario_type,
+            dates=[p.date for p in predictions],
+            predicted_balance=[p.predicted_balance for p in predictions],
+            confidence_score=[p.confidence_score for p in predictions],
+            risk_level=[p.risk_level for p in predictions],
+            risk_colors={p.risk_level: p.risk_color for p in predictions},
+            factors={key: [p.factors.get(key, 0.0) for p in predictions] for key in factor_keys},
+            recommendation_table=list(table),
+            recommendations=recommendations
+        )
+
+
+class ModelMetrics(BaseModel):
+    accuracy_score: float
+    mae: float
+    rmse: float
+    training_date: datetime
+    data_points: int
+    model_version: str
+    model_scope: str = 'tenant'
+    hyperparameters: Dict = {}
+    training_seconds: float = 0.0
+    sampling_ratio: float = 1.0
@@ -0,0 +1,445 @@
+"""
+cash_flow üzerindeki sık çalışan sorgular
+
+Şube filtresi `($2::uuid IS NULL OR branch_id = $2)` yerine şubeli/şubesiz iki ayrı metinle
+üretilir; böylece hazırlanmış (prepared) sorgunun genel planı da uygun kısmi indeksi kullanır
+(bkz. supabase/migrations/20261019160000_cash_flow_hot_query_indexes.sql).
+benchmarks/explain_harness.py aynı fonksiyonlarla sorguları üretip planlarını izler.
+"""
+
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .rule_sql import SqlParams, active_rules_cte, compile_source_confidence, compile_table_rules_multiplier
+from .sampling import STRATUM_SQL
+
+PENDING_STATUSES = ('pending', 'partial', 'overdue')
+PENDING_STATUSES_SQL = "(" + ", ".join(f"'{status}'" for status in PENDING_STATUSES) + ")"
+
+# Bekleyen işlem gruplarının tutar aralığı sınırları (width_bucket ile aynı)
+AMOUNT_BUCKET_BOUNDS = (1000, 5000, 20000, 50000)
+
+# Senaryo çarpanı ve [0.05, 1] sınırı uygulanmadan önceki güven (rules_multiplier LATERAL'dan gelir)
+RAW_CONFIDENCE_SQL = "COALESCE(cf.ai_confidence_score, 1.0)::float8 * {source_confidence} * rules_multiplier"
+
+TRAINING_COLUMNS_SQL = """
+    cf.id,
+    cf.expected_date,
+    cf.actual_date,
+    cf.amount,
+    cf.type,
+    cf.source_module,
+    cf.status,
+    cf.ai_confidence_score,
+    cf.category,
+    EXTRACT(DOW FROM cf.expected_date) as day_of_week,
+    EXTRACT(MONTH FROM cf.expected_date) as month,
+    EXTRACT(DAY FROM cf.expected_date) as day_of_month,
+    EXTRACT(EPOCH FROM (cf.actual_date - cf.expected_date)) / 86400 as delay_days
+"""
+
+
+def tenant_scope(params: SqlParams, tenant_id: str, branch_id: Optional[str], alias: str = 'cf') -> str:
+    """Tenant (ve verilmişse şube) koşulu; parametreleri `params` içine ekler"""
+
+    scope = f"{alias}.tenant_id = {params.add(tenant_id)}"
+
+    if branch_id is not None:
+        scope += f" AND {alias}.branch_id = {params.add(branch_id)}"
+
+    return scope
+
+
+def current_balance_query(tenant_id: str, branch_id: Optional[str]) -> Tuple[str, List]:
+    params = SqlParams()
+
+    return f"""
+        SELECT COALESCE(SUM(
+            CASE
+                WHEN cf.type = 'inflow' THEN cf.amount
+                WHEN cf.type = 'outflow' THEN -cf.amount
+            END
+        ), 0) as balance
+        FROM public.cash_flow cf
+        WHERE {tenant_scope(params, tenant_id, branch_id)}
+        AND cf.status = 'cleared'
+    """, params.values
+
+
+def branch_balances_query(tenant_id: str) -> Tuple[str, List]:
+    """
+    Tenant'ın şube başına güncel bakiyesi (şubesiz kayıtlar branch_id NULL satırında)
+
+    numeric döner: konsolide bakiye toplamı current_balance_query ile tam olarak aynıdır.
+    """
+
+    params = SqlParams()
+
+    return f"""
+        SELECT
+            cf.branch_id,
+            COALESCE(SUM(
+                CASE
+                    WHEN cf.type = 'inflow' THEN cf.amount
+                    WHEN cf.type = 'outflow' THEN -cf.amount
+                END
+            ), 0) as balance
+        FROM public.cash_flow cf
+        WHERE {tenant_scope(params, tenant_id, None)}
+        AND cf.status = 'cleared'
+        GROUP BY cf.branch_id
+    """, params.values
+
+
+def tenant_profile_query(tenant_id: str, branch_id: Optional[str]) -> Tuple[str, List]:
+    params = SqlParams()
+
+    return f"""
+        SELECT
+            COUNT(*) as tenant_rows,
+            COALESCE(AVG(cf.amount), 0) as tenant_avg_amount,
+            COALESCE(AVG((cf.type = 'inflow')::int), 0) as tenant_inflow_share,
+            COALESCE(AVG((cf.source_module = 'marketplace')::int), 0) as tenant_marketplace_share,
+            COALESCE(AVG(EXTRACT(EPOCH FROM (cf.actual_date - cf.expected_date)) / 86400), 0) as tenant_avg_delay
+        FROM public.cash_flow cf
+        WHERE {tenant_scope(params, tenant_id, branch_id)}
+        AND cf.actual_date IS NOT NULL
+        AND cf.created_at > NOW() - INTERVAL '12 months'
+        AND cf.status = 'cleared'
+    """, params.values
+
+
+def training_history_filter(tenant_id: str, branch_id: Optional[str]) -> Tuple[str, List]:
+    """Eğitim geçmişinin FROM/WHERE kısmı (tam sorgu, örneklem ve katman sayımı ortak kullanır)"""
+
+    params = SqlParams()
+
+    return f"""
+        FROM public.cash_flow cf
+        WHERE {tenant_scope(params, tenant_id, branch_id)}
+        AND cf.actual_date IS NOT NULL
+        AND cf.created_at > NOW() - INTERVAL '12 months'
+        AND cf.status = 'cleared'
+    """, params.values
+
+
+def training_history_query(tenant_id: str, branch_id: Optional[str]) -> Tuple[str, List]:
+    history_filter, args = training_history_filter(tenant_id, branch_id)
+
+    return f"SELECT {TRAINING_COLUMNS_SQL} {history_filter} ORDER BY cf.expected_date", args
+
+
+def training_sample_queries(tenant_id: str, branch_id: Optional[str]) -> Tuple[str, str, List]:
+    """Katmanlı örneklem için satır ve katman sayımı sorguları (aynı parametrelerle)"""
+
+    history_filter, args = training_history_filter(tenant_id, branch_id)
+
+    return (
+        f"SELECT {TRAINING_COLUMNS_SQL}, {STRATUM_SQL} {history_filter}",
+        f"SELECT {STRATUM_SQL}, COUNT(*) as rows {history_filter} GROUP BY 1, 2, 3, 4",
+        args
+    )
+
+
+def global_training_sample_queries(max_rows_per_tenant: int) -> Tuple[str, str, List]:
+    """
+    Ortak model için katmanlı örneklem sorguları: tenant başına en yeni `max_rows_per_tenant` kapanmış kayıt
+
+    Tenant özet özellikleri ve `source_rows` (sınırlamadan önceki toplam) tenant'ın tüm
+    12 aylık geçmişi üzerinden hesaplanır; yalnızca döndürülen satırlar sınırlanır.
+    Katman sayımı aynı sınırlanmış küme üzerindendir (aynı parametrelerle).
+    """
+
+    params = SqlParams()
+
+    capped = f"""
+        FROM (
+            SELECT
+                cf.amount,
+                cf.type,
+                cf.source_module,
+                cf.expected_date,
+                EXTRACT(DOW FROM cf.expected_date) as day_of_week,
+                EXTRACT(MONTH FROM cf.expected_date) as month,
+                EXTRACT(DAY FROM cf.expected_date) as day_of_month,
+                EXTRACT(EPOCH FROM (cf.actual_date - cf.expected_date)) / 86400 as delay_days,
+                COUNT(*) OVER w as tenant_rows,
+                AVG(cf.amount) OVER w as tenant_avg_amount,
+                AVG((cf.type = 'inflow')::int) OVER w as tenant_inflow_share,
+                AVG((cf.source_module = 'marketplace')::int) OVER w as tenant_marketplace_share,
+                (SUM(EXTRACT(EPOCH FROM (cf.actual_date - cf.expected_date)) / 86400) OVER w
+                    - EXTRACT(EPOCH FROM (cf.actual_date - cf.expected_date)) / 86400)
+                    / NULLIF(COUNT(*) OVER w - 1, 0) as tenant_avg_delay,
+                COUNT(*) OVER () as source_rows,
+                row_number() OVER (PARTITION BY cf.tenant_id ORDER BY cf.actual_date DESC) as tenant_rank,
+                {STRATUM_SQL}
+            FROM public.cash_flow cf
+            WHERE cf.actual_date IS NOT NULL
+            AND cf.created_at > NOW() - INTERVAL '12 months'
+            AND cf.status = 'cleared'
+            WINDOW w AS (PARTITION BY cf.tenant_id)
+        ) ranked
+        WHERE tenant_rank <= {params.add(max_rows_per_tenant)}
+    """
+
+    return (
+        f"""
+        SELECT
+            amount, type, source_module, expected_date, day_of_week, month, day_of_month, delay_days,
+            tenant_rows, tenant_avg_amount, tenant_inflow_share, tenant_marketplace_share, tenant_avg_delay,
+            source_rows, stratum_module, stratum_type, stratum_month, stratum_bucket
+        {capped}
+        """,
+        f"SELECT stratum_module, stratum_type, stratum_month, stratum_bucket, COUNT(*) as rows {capped} GROUP BY 1, 2, 3, 4",
+        params.values
+    )
+
+
+def recent_cleared_query(tenant_id: str, branch_id: Optional[str], since: datetime, limit: int) -> Tuple[str, List]:
+    params = SqlParams()
+    scope = tenant_scope(params, tenant_id, branch_id)
+
+    return f"""
+        SELECT
+            cf.expected_date,
+            cf.amount,
+            cf.type,
+            cf.source_module,
+            EXTRACT(EPOCH FROM (cf.actual_date - cf.expected_date)) / 86400 as delay_days
+        FROM public.cash_flow cf
+        WHERE {scope}
+        AND cf.status = 'cleared'
+        AND cf.actual_date > {params.add(since)}
+        ORDER BY cf.actual_date DESC
+        LIMIT {params.add(limit)}
+    """, params.values
+
+
+def pending_rows_query(tenant_id: str, branch_id: Optional[str], end_date: datetime) -> Tuple[str, List]:
+    params = SqlParams()
+    scope = tenant_scope(params, tenant_id, branch_id)
+
+    return f"""
+        SELECT *
+        FROM public.cash_flow cf
+        WHERE {scope}
+        AND cf.status IN {PENDING_STATUSES_SQL}
+        AND cf.expected_date <= {params.add(end_date)}
+        ORDER BY cf.expected_date
+    """, params.values
+
+
+def pending_aggregate_query(
+    tenant_id: str,
+    branch_id: Optional[str],
+    end_date: datetime,
+    scenario_factors: Dict[str, Tuple[float, float]],
+    by_branch: bool = False,
+    expected_dates: Optional[Sequence[date]] = None
+) -> Tuple[str, List]:
+    """
+    Bekleyen işlemlerin gün/tip/kaynak/tutar aralığı gruplarında güven ağırlıklı toplamları
+
+    Aktif kurallar sorgu içinde (active_rules CTE) okunur, böylece kurallar için ayrı bir tur
+    gerekmez. `scenario_factors` senaryo adı -> (giriş, çıkış) çarpanı; her senaryo için
+    `weighted_<ad>` sütunu döner ve tek sorgu tüm senaryolara yeter. `by_branch` ile gruplar
+    ayrıca şubeye bölünür (tüm şubelerin tahmini tek sorgudan); aynı sorgu GROUPING SETS ile
+    şubesiz sorgunun gruplarını da `tenant_total` satırları olarak döndürür, böylece konsolide
+    seri şubesiz tahminle aynı gruplardan (aynı ortalama tutar gecikmeleriyle) hesaplanır.
+    `expected_dates` verilirse yalnızca bu günlerin grupları döner (artımlı güncelleme).
+    Gruplar anahtara göre sıralıdır: günlük toplamların toplama sırası çalıştırmalar arasında aynıdır.
+    """
+
+    params = SqlParams()
+    scope = tenant_scope(params, tenant_id, branch_id)
+    end_param = params.add(end_date)
+
+    day_filter = ''
+    if expected_dates:
+        day_filter = f"""
+        AND cf.expected_date >= {params.add(min(expected_dates))}::date
+        AND cf.expected_date < {params.add(max(expected_dates) + timedelta(days=1))}::date
+        AND cf.expected_date::date = ANY({params.add(list(expected_dates))}::date[])"""
+
+    raw_confidence = RAW_CONFIDENCE_SQL.format(source_confidence=compile_source_confidence())
+
+    weighted_columns = []
+    for name, (inflow_factor, outflow_factor) in scenario_factors.items():
+        if not name.isidentifier():
+            raise ValueError(f"Invalid scenario name: {name}")
+
+        weighted_columns.append(f"""
+            SUM(cf.amount * GREATEST(0.05, LEAST(1.0,
+                {raw_confidence}
+                * CASE cf.type
+                    WHEN 'inflow' THEN {params.add(float(inflow_factor))}::float8
+                    WHEN 'outflow' THEN {params.add(float(outflow_factor))}::float8
+                    ELSE 1
+                  END
+            )))::float8 as weighted_{name}""")
+
+    group_key = (
+        "cf.expected_date::date, cf.type, cf.source_module, "
+        f"width_bucket(cf.amount, ARRAY{list(AMOUNT_BUCKET_BOUNDS)}::numeric[])"
+    )
+
+    if by_branch:
+        branch_columns = ", cf.branch_id, GROUPING(cf.branch_id) = 1 as tenant_total"
+        group_by = f"GROUPING SETS (({group_key}, cf.branch_id), ({group_key}))"
+    else:
+        branch_columns = ""
+        group_by = group_key
+
+    return f"""
+        WITH {active_rules_cte('$1')}
+        SELECT
+            cf.expected_date::date as expected_date,
+            cf.type,
+            cf.source_module,
+            width_bucket(cf.amount, ARRAY{list(AMOUNT_BUCKET_BOUNDS)}::numeric[]) as amount_bucket,
+            COUNT(*) as transactions,
+            SUM(cf.amount)::float8 as amount,
+            {','.join(weighted_columns)},
+            COUNT(*) FILTER (WHERE cf.status = 'overdue') as overdue_count,
+            COALESCE(SUM(cf.amount) FILTER (WHERE cf.status = 'overdue'), 0)::float8 as overdue_amount
+            {branch_columns}
+        FROM public.cash_flow cf
+        CROSS JOIN LATERAL (SELECT {compile_table_rules_multiplier()} as rules_multiplier) rm
+        WHERE {scope}
+        AND cf.status IN {PENDING_STATUSES_SQL}
+        AND cf.expected_date <= {end_param}{day_filter}
+        GROUP BY {group_by}
+        ORDER BY 1, 2, 3, 4
+    """, params.values
+
+
+def amount_bucket(amount: float) -> int:
+    """`width_bucket(amount, AMOUNT_BUCKET_BOUNDS)` karşılığı"""
+
+    return bisect_right(AMOUNT_BUCKET_BOUNDS, amount)
+
+
+def pending_confidence_groups_query(
+    tenant_id: str,
+    branch_id: Optional[str],
+    end_date: datetime
+) -> Tuple[str, List]:
+    """
+    Bekleyen işlemler, senaryodan bağımsız ham güvene göre gruplu
+
+    Grup içindeki satırların ham güveni aynıdır; bu yüzden herhangi bir giriş/çıkış çarpanı
+    için sınırlandırılmış güven gruba bir kez uygulanır ve satır satır hesapla aynı sonucu verir.
+    Keyfi senaryolar (what-if ızgarası) bu tek sorgudan hesaplanır.
+    """
+
+    params = SqlParams()
+    scope = tenant_scope(params, tenant_id, branch_id)
+    end_param = params.add(end_date)
+
+    return f"""
+        WITH {active_rules_cte('$1')}
+        SELECT
+            cf.expected_date::date as expected_date,
+            cf.type,
+            cf.source_module,
+            width_bucket(cf.amount, ARRAY{list(AMOUNT_BUCKET_BOUNDS)}::numeric[]) as amount_bucket,
+            rc.raw_confidence,
+            COUNT(*) as transactions,
+            SUM(cf.amount)::float8 as amount,
+            COUNT(*) FILTER (WHERE cf.status = 'overdue') as overdue_count,
+            COALESCE(SUM(cf.amount) FILTER (WHERE cf.status = 'overdue'), 0)::float8 as overdue_amount
+        FROM public.cash_flow cf
+        CROSS JOIN LATERAL (SELECT {compile_table_rules_multiplier()} as rules_multiplier) rm
+        CROSS JOIN LATERAL (
+            SELECT {RAW_CONFIDENCE_SQL.format(source_confidence=compile_source_confidence())} as raw_confidence
+        ) rc
+        WHERE {scope}
+        AND cf.status IN {PENDING_STATUSES_SQL}
+        AND cf.expected_date <= {end_param}
+        GROUP BY 1, 2, 3, 4, 5
+    """, params.values
+
+
+def monthly_flow_profile_query(
+    tenant_id: str,
+    branch_id: Optional[str],
+    from_date: date,
+    to_date: date
+) -> Tuple[str, List]:
+    """Kapanmış akışların tip ve takvim ayı bazında toplamları [from_date, to_date) (mevsimsel profil)"""
+
+    params = SqlParams()
+    scope = tenant_scope(params, tenant_id, branch_id)
+    from_param = params.add(from_date)
+    to_param = params.add(to_date)
+
+    return f"""
+        SELECT
+            cf.type,
+            EXTRACT(MONTH FROM d.day)::int as month,
+            SUM(cf.amount)::float8 as amount,
+            MIN(d.day) as first_day
+        FROM public.cash_flow cf
+        CROSS JOIN LATERAL (SELECT COALESCE(cf.actual_date, cf.expected_date)::date as day) d
+        WHERE {scope}
+        AND cf.status = 'cleared'
+        AND cf.type IN ('inflow', 'outflow')
+        AND d.day >= {from_param}
+        AND d.day < {to_param}
+        GROUP BY 1, 2
+    """, params.values
+
+
+def backtest_history_query(tenant_id: str, window_start: date) -> Tuple[str, List]:
+    """
+    Geriye dönük test için tenant geçmişi (tek okuma)
+
+    `window_start` öncesinde kapanmış kayıtlar tek bir açılış bakiyesi satırına (type 'opening')
+    indirgenir; kalan kapanmış ve bekleyen kayıtlar oluşturma / kapanma günleri ve ham güveniyle döner.
+    Kapanma günü reconciliation ile aynı tanımdır: COALESCE(actual_date, expected_date).
+    """
+
+    params = SqlParams()
+    scope = tenant_scope(params, tenant_id, None)
+    start_param = params.add(window_start)
+    cleared_day = "COALESCE(cf.actual_date, cf.expected_date)::date"
+
+    return f"""
+        WITH {active_rules_cte('$1')}
+        SELECT
+            'opening' as type,
+            NULL::date as created_day,
+            NULL::timestamptz as expected_date,
+            NULL::date as expected_day,
+            NULL::date as cleared_day,
+            COALESCE(SUM(CASE WHEN cf.type = 'inflow' THEN cf.amount ELSE -cf.amount END), 0)::float8 as amount,
+            NULL::text as source_module,
+            1.0::float8 as raw_confidence
+        FROM public.cash_flow cf
+        WHERE {scope}
+        AND cf.status = 'cleared'
+        AND cf.type IN ('inflow', 'outflow')
+        AND {cleared_day} < {start_param}
+        UNION ALL
+        SELECT
+            cf.type,
+            cf.created_at::date as created_day,
+            cf.expected_date,
+            cf.expected_date::date as expected_day,
+            CASE WHEN cf.status = 'cleared' THEN {cleared_day} END as cleared_day,
+            cf.amount::float8 as amount,
+            cf.source_module,
+            rc.raw_confidence
+        FROM public.cash_flow cf
+        CROSS JOIN LATERAL (SELECT {compile_table_rules_multiplier()} as rules_multiplier) rm
+        CROSS JOIN LATERAL (
+            SELECT {RAW_CONFIDENCE_SQL.format(source_confidence=compile_source_confidence())} as raw_confidence
+        ) rc
+        WHERE {scope}
+        AND cf.type IN ('inflow', 'outflow')
+        AND (
+            cf.status IN {PENDING_STATUSES_SQL}
+            OR (cf.status = 'cleared' AND {cleared_day} >= {start_param})
+        )
+    """, params.values
@@ -0,0 +1,212 @@
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional
+
+import asyncpg
+from pydantic import BaseModel
+
+from .enhanced_predictor import EnhancedCashFlowAIAgent, MIN_TENANT_TRAINING_ROWS
+
+logger = logging.getLogger(__name__)
+
+
+class RetrainDecision(BaseModel):
+    """Bir tenant için yeniden eğitim kararı ve gerekçesi"""
+    tenant_id: str
+    retrain: bool
+    reason: str
+    total_rows: int
+    new_rows: int
+    model_age_days: Optional[float] = None
+    baseline_mae: Optional[float] = None
+    rolling_mae: Optional[float] = None
+
+
+class RetrainPolicy:
+    """
+    Gece eğitimi için tenant bazlı yeniden eğitim kararı
+
+    Sinyaller ucuzdan pahalıya sırayla değerlendirilir:
+    - Model yok / model yaşı (`max_model_age_days`)
+    - Son eğitimden sonra kapanan yeni kayıt sayısı (`min_new_rows` veya toplamın `new_rows_ratio` kadarı)
+    - Yeni kayıtlarda mevcut modelin MAE'si, eğitimdeki MAE'den `mae_drift_ratio` kadar kötüleştiyse
+    """
+
+    def __init__(
+        self,
+        db_pool: asyncpg.Pool,
+        min_new_rows: int = 200,
+        new_rows_ratio: float = 0.1,
+        mae_drift_ratio: float = 0.2,
+        min_eval_rows: int = 30,
+        max_model_age_days: float = 14
+    ):
+        self.db = db_pool
+        self.min_new_rows = min_new_rows
+        self.new_rows_ratio = new_rows_ratio
+        self.mae_drift_ratio = mae_drift_ratio
+        self.min_eval_rows = min_eval_rows
+        self.max_model_age_days = max_model_age_days
+
+    @classmethod
+    def from_env(cls, db_pool: asyncpg.Pool) -> 'RetrainPolicy':
+        return cls(
+            db_pool,
+            min_new_rows=int(os.getenv("RETRAIN_MIN_NEW_ROWS", 200)),
+            new_rows_ratio=float(os.getenv("RETRAIN_NEW_ROWS_RATIO", 0.1)),
+            mae_drift_ratio=float(os.getenv("RETRAIN_MAE_DRIFT_RATIO", 0.2)),
+            min_eval_rows=int(os.getenv("RETRAIN_MIN_EVAL_ROWS", 30)),
+            max_model_age_days=float(os.getenv("RETRAIN_MAX_MODEL_AGE_DAYS", 14))
+        )
+
+    async def _fetch_signals(self) -> List[asyncpg.Record]:
+        """Tüm aday tenant'ların sinyallerini tek sorguda topla"""
+
+        # Kendi modeli olmayan (ortak modeli kullanan) tenant'larda son eğitim kararı referans alınır
+        return await self.db.fetch("""
+            WITH candidates AS (
+                SELECT tenant_id, COUNT(*) as total_rows
+                FROM public.cash_flow
+                WHERE status = 'cleared'
+                AND actual_date IS NOT NULL
+                AND created_at > NOW() - INTERVAL '12 months'
+                GROUP BY tenant_id
+                HAVING COUNT(*) >= $1
+                AND MAX(created_at) > NOW() - INTERVAL '30 days'
+            ),
+            fits AS (
+                SELECT
+                    c.tenant_id,
+                    c.total_rows,
+                    m.trained_at as model_trained_at,
+                    m.mae as baseline_mae,
+                    COALESCE(m.trained_at, d.decided_at) as fitted_at
+                FROM candidates c
+                LEFT JOIN public.ai_delay_models m
+                    ON m.model_key = 'tenant:' || c.tenant_id::text || ':-'
+                LEFT JOIN LATERAL (
+                    SELECT decided_at
+                    FROM public.ai_retrain_decisions
+                    WHERE tenant_id = c.tenant_id AND branch_id IS NULL AND retrain = true
+                    ORDER BY decided_at DESC
+                    LIMIT 1
+                ) d ON true
+            )
+            SELECT
+                f.tenant_id,
+                f.total_rows,
+                f.model_trained_at,
+                f.baseline_mae,
+                f.fitted_at,
+                EXTRACT(EPOCH FROM (NOW() - f.fitted_at)) / 86400 as model_age_days,
+                (
+                    SELECT COUNT(*)
+                    FROM public.cash_flow cf
+                    WHERE cf.tenant_id = f.tenant_id
+                    AND cf.status = 'cleared'
+                    AND cf.actual_date > f.fitted_at
+                ) as new_rows
+            FROM fits f
+        """, MIN_TENANT_TRAINING_ROWS)
+
+    async def _rolling_mae(self, tenant_id: str, since: datetime) -> Optional[float]:
+        """Son eğitimden sonra kapanan kayıtlarda mevcut modelin hatası"""
+
+        agent = EnhancedCashFlowAIAgent(self.db)
+        mae, rows = await agent.recent_delay_mae(tenant_id, None, since)
+
+        return mae if rows >= self.min_eval_rows else None
+
+    async def _decide(self, row: asyncpg.Record) -> RetrainDecision:
+        tenant_id = str(row['tenant_id'])
+        total_rows = int(row['total_rows'])
+        new_rows = int(row['new_rows'] or 0)
+        model_age_days = float(row['model_age_days']) if row['model_age_days'] is not None else None
+        baseline_mae = float(row['baseline_mae']) if row['baseline_mae'] is not None else None
+
+        decision = RetrainDecision(
+            tenant_id=tenant_id,
+            retrain=True,
+            reason='stable',
+            total_rows=total_rows,
+            new_rows=new_rows,
+            model_age_days=model_age_days,
+            baseline_mae=baseline_mae
+        )
+
+        if row['fitted_at'] is None:
+            decision.reason = 'no_model'
+            return decision
+
+        if model_age_days >= self.max_model_age_days:
+            decision.reason = 'model_age'
+            return decision
+
+        if new_rows >= max(self.min_new_rows, self.new_rows_ratio * total_rows):
+            decision.reason = 'new_rows'
+            return decision
+
+        # Ortak model kullanan tenant'da karşılaştırılacak tenant MAE'si yok
+        if row['model_trained_at'] is not None and baseline_mae is not None and new_rows >= self.min_eval_rows:
+            decision.rolling_mae = await self._rolling_mae(tenant_id, row['model_trained_at'])
+
+            if decision.rolling_mae is not None and decision.rolling_mae > baseline_mae * (1 + self.mae_drift_ratio):
+                decision.reason = 'mae_drift'
+                return decision
+
+        decision.retrain = False
+        return decision
+
+    async def _record(self, decisions: List[RetrainDecision]):
+        """Kararları toplu kaydet"""
+
+        if not decisions:
+            return
+
+        await self.db.execute("""
+            INSERT INTO public.ai_retrain_decisions
+            (tenant_id, retrain, reason, total_rows, new_rows, model_age_days, baseline_mae, rolling_mae)
+            SELECT * FROM unnest(
+                $1::uuid[], $2::boolean[], $3::text[], $4::int[], $5::int[],
+                $6::float8[], $7::float8[], $8::float8[]
+            )
+        """,
+            [d.tenant_id for d in decisions],
+            [d.retrain for d in decisions],
+            [d.reason for d in decisions],
+            [d.total_rows for d in decisions],
+            [d.new_rows for d in decisions],
+            [d.model_age_days for d in decisions],
+            [d.baseline_mae for d in decisions],
+            [d.rolling_mae for d in decisions]
+        )
+
+    async def evaluate(self) -> List[RetrainDecision]:
+        """Aday tenant'ları değerlendir, kararları kaydet ve döndür"""
+
+        decisions = []
+
+        for row in await self._fetch_signals():
+            try:
+                decisions.append(await self._decide(row))
+            except Exception as e:
+                logger.error(f"Retrain policy failed for tenant {row['tenant_id']}: {str(e)}")
+                decisions.append(RetrainDecision(
+                    tenant_id=str(row['tenant_id']),
+                    retrain=True,
+                    reason='policy_error',
+                    total_rows=int(row['total_rows']),
+                    new_rows=int(row['new_rows'] or 0)
+                ))
+
+        await self._record(decisions)
+
+        retrain_count = sum(1 for d in decisions if d.retrain)
+        reasons = {}
+        for d in decisions:
+            reasons[d.reason] = reasons.get(d.reason, 0) + 1
+
+        logger.info(f"Retrain policy: {retrain_count}/{len(decisions)} tenants selected, reasons: {reasons}")
+
+        return decisions
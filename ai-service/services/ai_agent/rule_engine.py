@@ -1,8 +1,11 @@
 from typing import List, Dict, Optional
-from datetime import datetime
+import asyncio
 import asyncpg
 from pydantic import BaseModel
 
+from .rule_sql import SqlParams, compile_rule_predicate, compile_rules_multiplier, compile_source_confidence
+from .queries import PENDING_STATUSES_SQL, tenant_scope
+
 
 class RuleDefinition(BaseModel):
     """Kural tanımı"""
@@ -152,64 +155,156 @@ class CashFlowRuleEngine:
             WHERE id = $1
         """, rule_id)
 
-    async def test_rule_impact(
+    async def simulate_rule_impact(
         self,
         tenant_id: str,
         rule: RuleDefinition,
-        sample_size: int = 100
+        branch_id: Optional[str] = None,
+        horizon_days: int = 90,
+        histogram_buckets: int = 20
     ) -> Dict:
-        """Kural etkisini test et"""
-
-        transactions = await self.db.fetch("""
-            SELECT *
-            FROM public.cash_flow
-            WHERE tenant_id = $1
-            AND status = 'pending'
-            ORDER BY expected_date
-            LIMIT $2
-        """, tenant_id, sample_size)
-
-        affected_count = 0
-        total_adjustment = 0
-
-        for trans in transactions:
-            trans_dict = dict(trans)
+        """
+        Aday kuralın etkisini tenant'ın tüm bekleyen işlemleri üzerinde SQL içinde hesapla
+
+        Güven skoru tahmin motoruyla aynı şekilde hesaplanır (temel skor x kaynak çarpanı x aktif kurallar,
+        0.05-1.0 aralığında); aday kural etkilediği satırlarda ayrıca adjustment_factor ile çarpılır.
+        Günlük bakiye değişimi beklenen tarihe göre, bugünden itibaren `horizon_days` gün için verilir.
+        """
+
+        active_rules = [
+            (row['rule_type'], row['conditions'], float(row['adjustment_factor']))
+            for row in await self.get_active_rules(tenant_id)
+        ]
+
+        params = SqlParams()
+        scope = tenant_scope(params, tenant_id, branch_id)
+        existing_multiplier = compile_rules_multiplier(active_rules, params)
+        affected = compile_rule_predicate(rule.rule_type, rule.conditions, params)
+        factor = params.add(float(rule.adjustment_factor))
+
+        scored = f"""
+            WITH base AS (
+                SELECT
+                    cf.type,
+                    cf.amount::float8 as amount,
+                    cf.expected_date::date as day,
+                    {affected} as affected,
+                    COALESCE(cf.ai_confidence_score, 1.0)::float8 * {compile_source_confidence()}
+                        * {existing_multiplier} as raw_confidence
+                FROM public.cash_flow cf
+                WHERE {scope}
+                AND cf.status IN {PENDING_STATUSES_SQL}
+            ),
+            scored AS (
+                SELECT
+                    type,
+                    amount,
+                    day,
+                    affected,
+                    CASE WHEN type = 'inflow' THEN 1 ELSE -1 END as sign,
+                    GREATEST(0.05, LEAST(1.0, raw_confidence)) as old_confidence,
+                    GREATEST(0.05, LEAST(1.0, raw_confidence * CASE WHEN affected THEN {factor}::float8 ELSE 1 END))
+                        as new_confidence
+                FROM base
+            )
+        """
+
+        # Histogram ve günlük sorgular ortak parametrelere bir parametre daha ekler
+        extra_param = f"${len(params.values) + 1}::int"
+
+        summary, histogram, daily = await asyncio.gather(
+            self.db.fetchrow(scored + """
+                SELECT
+                    COUNT(*) as total_transactions,
+                    COUNT(*) FILTER (WHERE affected) as affected_transactions,
+                    COALESCE(SUM(amount) FILTER (WHERE affected), 0) as affected_amount,
+                    COALESCE(SUM(amount) FILTER (WHERE affected AND type = 'inflow'), 0) as affected_inflow_amount,
+                    COALESCE(SUM(amount) FILTER (WHERE affected AND type <> 'inflow'), 0) as affected_outflow_amount,
+                    COALESCE(AVG(ABS(new_confidence - old_confidence)) FILTER (WHERE affected), 0) as average_adjustment,
+                    COALESCE(AVG(new_confidence - old_confidence) FILTER (WHERE affected), 0) as mean_delta,
+                    percentile_cont(0.1) WITHIN GROUP (ORDER BY new_confidence - old_confidence)
+                        FILTER (WHERE affected) as p10_delta,
+                    percentile_cont(0.5) WITHIN GROUP (ORDER BY new_confidence - old_confidence)
+                        FILTER (WHERE affected) as p50_delta,
+                    percentile_cont(0.9) WITHIN GROUP (ORDER BY new_confidence - old_confidence)
+                        FILTER (WHERE affected) as p90_delta,
+                    COALESCE(SUM(sign * amount * (new_confidence - old_confidence)) FILTER (WHERE affected), 0)
+                        as total_balance_delta
+                FROM scored
+            """, *params.values),
+            self.db.fetch(scored + f"""
+                SELECT
+                    width_bucket(new_confidence - old_confidence, -1.0, 1.0, {extra_param}) as bucket,
+                    COUNT(*) as transactions
+                FROM scored
+                WHERE affected
+                GROUP BY 1
+                ORDER BY 1
+            """, *params.values, histogram_buckets),
+            self.db.fetch(scored + f"""
+                SELECT
+                    day,
+                    SUM(sign * amount * (new_confidence - old_confidence)) as net_delta,
+                    SUM(SUM(sign * amount * (new_confidence - old_confidence))) OVER (ORDER BY day) as balance_delta
+                FROM scored
+                WHERE affected
+                AND day >= CURRENT_DATE
+                AND day < CURRENT_DATE + {extra_param}
+                GROUP BY day
+                ORDER BY day
+            """, *params.values, horizon_days)
+        )
 
-            if await self._rule_applies(trans_dict, rule):
-                affected_count += 1
-                original_confidence = trans_dict.get('ai_confidence_score', 1.0)
-                new_confidence = original_confidence * rule.adjustment_factor
-                total_adjustment += abs(new_confidence - original_confidence)
+        total = summary['total_transactions']
+        affected_count = summary['affected_transactions']
+        bucket_width = 2.0 / histogram_buckets
 
         return {
+            'total_transactions': total,
             'affected_transactions': affected_count,
-            'total_transactions': len(transactions),
-            'impact_percentage': (affected_count / len(transactions) * 100) if transactions else 0,
-            'average_adjustment': (total_adjustment / affected_count) if affected_count > 0 else 0
+            'impact_percentage': (affected_count / total * 100) if total else 0,
+            'affected_amount': float(summary['affected_amount']),
+            'affected_inflow_amount': float(summary['affected_inflow_amount']),
+            'affected_outflow_amount': float(summary['affected_outflow_amount']),
+            'average_adjustment': float(summary['average_adjustment']),
+            'confidence_delta': {
+                'mean': float(summary['mean_delta']),
+                'p10': float(summary['p10_delta']) if summary['p10_delta'] is not None else 0.0,
+                'p50': float(summary['p50_delta']) if summary['p50_delta'] is not None else 0.0,
+                'p90': float(summary['p90_delta']) if summary['p90_delta'] is not None else 0.0,
+                'histogram': [
+                    {
+                        'from': -1.0 + (row['bucket'] - 1) * bucket_width,
+                        'to': -1.0 + row['bucket'] * bucket_width,
+                        'transactions': row['transactions']
+                    }
+                    for row in histogram
+                ]
+            },
+            'total_balance_delta': float(summary['total_balance_delta']),
+            'daily_balance_delta': [
+                {
+                    'date': row['day'].isoformat(),
+                    'net_delta': float(row['net_delta']),
+                    'balance_delta': float(row['balance_delta'])
+                }
+                for row in daily
+            ]
         }
 
-    async def _rule_applies(self, transaction: Dict, rule: RuleDefinition) -> bool:
-        """Kural bu işleme uygulanır mı?"""
-
-        if rule.rule_type == 'marketplace_delay':
-            return (
-                transaction['source_module'] == 'marketplace' and
-                transaction.get('reference_no', '').startswith(
-                    rule.conditions.get('marketplace_prefix', '')
-                )
-            )
-
-        elif rule.rule_type == 'seasonal_factor':
-            start_date = datetime.strptime(rule.conditions['start_date'], '%Y-%m-%d').date()
-            end_date = datetime.strptime(rule.conditions['end_date'], '%Y-%m-%d').date()
-            expected_date = transaction['expected_date']
-
-            if isinstance(expected_date, str):
-                expected_date = datetime.fromisoformat(expected_date).date()
-
-            return start_date <= expected_date <= end_date
+    async def test_rule_impact(
+        self,
+        tenant_id: str,
+        rule: RuleDefinition,
+        branch_id: Optional[str] = None
+    ) -> Dict:
+        """Kural etkisini test et (tüm bekleyen işlemler üzerinde özet)"""
 
-        elif rule.rule_type == 'payment_term':
-            return transaction.get('payment_term_days', 0) >= rule.conditions.get('term_days', 0)
+        impact = await self.simulate_rule_impact(tenant_id, rule, branch_id)
 
-        return False
+        return {
+            'affected_transactions': impact['affected_transactions'],
+            'total_transactions': impact['total_transactions'],
+            'impact_percentage': impact['impact_percentage'],
+            'average_adjustment': impact['average_adjustment']
+        }
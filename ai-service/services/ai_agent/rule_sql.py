@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from ..db import optional_cash_flow_columns
+
+# Kaynağa göre güven çarpanı (tahmin motoru ve SQL simülasyonu aynı tabloyu kullanır)
+SOURCE_CONFIDENCE_MULTIPLIERS = {
+    'bank': 1.0,
+    'e-invoice': 0.85,
+    'marketplace': 0.75,
+    'sales_order': 0.70,
+    'purchase_order': 0.95,
+    'expense': 0.90,
+    'payroll': 0.98,
+    'manual': 0.60
+}
+
+DEFAULT_SOURCE_CONFIDENCE = 0.5
+
+# Tahmin motorunun güven skoruna uyguladığı kural tipleri
+FORECAST_RULE_TYPES = ('marketplace_delay', 'seasonal_factor', 'payment_term')
+
+
+class SqlParams:
+    """Sorgu parametrelerini biriktirir ve $n yer tutucusu üretir"""
+
+    def __init__(self, initial: List = None):
+        self.values: List = list(initial or [])
+
+    def add(self, value) -> str:
+        self.values.append(value)
+        return f"${len(self.values)}"
+
+
+def payment_term_days_sql(alias: str = 'cf') -> Optional[str]:
+    """payment_term_days sütunu varsa doğrudan referansı, yoksa None (ödeme vadesi koşulu atlanır)"""
+
+    if 'payment_term_days' not in optional_cash_flow_columns:
+        return None
+
+    return f"COALESCE({alias}.payment_term_days, 0)"
+
+
+def compile_rule_predicate(rule_type: str, conditions: Dict, params: SqlParams, alias: str = 'cf') -> str:
+    """Kural koşulunu `cash_flow` satırı için SQL koşuluna çevir (rule_engine ile aynı anlam)"""
+
+    if rule_type == 'marketplace_delay':
+        prefix = params.add(conditions.get('marketplace_prefix', ''))
+        return (
+            f"({alias}.source_module = 'marketplace' "
+            f"AND starts_with(COALESCE({alias}.reference_no, ''), {prefix}::text))"
+        )
+
+    if rule_type == 'seasonal_factor':
+        if not conditions.get('start_date') or not conditions.get('end_date'):
+            return "false"
+
+        start_date = datetime.strptime(conditions['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(conditions['end_date'], '%Y-%m-%d').date()
+        return f"({alias}.expected_date::date BETWEEN {params.add(start_date)}::date AND {params.add(end_date)}::date)"
+
+    if rule_type == 'payment_term':
+        payment_term_days = payment_term_days_sql(alias)
+        if payment_term_days is None:
+            return "false"
+
+        term_days = params.add(int(conditions.get('term_days', 0)))
+        return f"({payment_term_days} >= {term_days}::int)"
+
+    return "false"
+
+
+def compile_source_confidence(alias: str = 'cf') -> str:
+    """Kaynak modül güven çarpanı için CASE ifadesi"""
+
+    cases = ' '.join(
+        f"WHEN '{source}' THEN {multiplier}"
+        for source, multiplier in SOURCE_CONFIDENCE_MULTIPLIERS.items()
+    )
+
+    return f"(CASE {alias}.source_module {cases} ELSE {DEFAULT_SOURCE_CONFIDENCE} END)"
+
+
+def compile_rules_multiplier(rules: List[Tuple[str, Dict, float]], params: SqlParams, alias: str = 'cf') -> str:
+    """Aktif kuralların satır bazında çarpımı; (rule_type, conditions, adjustment_factor) listesi"""
+
+    factors = []
+
+    for rule_type, conditions, adjustment_factor in rules:
+        if rule_type not in FORECAST_RULE_TYPES:
+            continue
+
+        predicate = compile_rule_predicate(rule_type, conditions, params, alias)
+        factors.append(f"(CASE WHEN {predicate} THEN {params.add(float(adjustment_factor))}::float8 ELSE 1 END)")
+
+    return ' * '.join(factors) if factors else '1'
+
+
+def active_rules_cte(tenant_param: str) -> str:
+    """Tenant'ın aktif kurallarını sorgu içinde bir kez okuyan CTE (`active_rules`)"""
+
+    return f"""
+        active_rules AS MATERIALIZED (
+            SELECT rule_type, conditions, adjustment_factor::float8 as adjustment_factor
+            FROM public.cash_flow_rules
+            WHERE tenant_id = {tenant_param}::uuid
+            AND is_active = true
+            AND rule_type IN ({', '.join(f"'{rule_type}'" for rule_type in FORECAST_RULE_TYPES)})
+        )
+    """
+
+
+def compile_table_rules_multiplier(alias: str = 'cf') -> str:
+    """
+    `active_rules` CTE'sindeki kuralların satır bazında çarpımı
+
+    compile_rule_predicate ile aynı koşullar, kural parametreleri jsonb `conditions` alanından okunur;
+    adjustment_factor > 0 (tablo kısıtı) olduğundan çarpım exp(sum(ln)) ile alınır.
+    payment_term_days sütunu yoksa ödeme vadesi kuralları eşleşmez.
+    """
+
+    payment_term_days = payment_term_days_sql(alias)
+    payment_term = f"""
+            WHEN 'payment_term' THEN
+                {payment_term_days} >= COALESCE((r.conditions ->> 'term_days')::numeric, 0)""" if payment_term_days else ''
+
+    return f"""(
+        SELECT COALESCE(exp(SUM(ln(r.adjustment_factor))), 1)
+        FROM active_rules r
+        WHERE CASE r.rule_type
+            WHEN 'marketplace_delay' THEN
+                {alias}.source_module = 'marketplace'
+                AND starts_with(COALESCE({alias}.reference_no, ''), COALESCE(r.conditions ->> 'marketplace_prefix', ''))
+            WHEN 'seasonal_factor' THEN
+                COALESCE({alias}.expected_date::date BETWEEN NULLIF(r.conditions ->> 'start_date', '')::date
+                    AND NULLIF(r.conditions ->> 'end_date', '')::date, false){payment_term}
+            ELSE false
+        END
+    )"""
@@ -0,0 +1,144 @@
+import heapq
+import itertools
+import logging
+import math
+import random
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Katman: kaynak modül, tip, ay ve tutar aralığı (amount_category ile aynı sınırlar)
+STRATUM_SQL = """
+    cf.source_module as stratum_module,
+    cf.type as stratum_type,
+    EXTRACT(MONTH FROM cf.expected_date)::int as stratum_month,
+    width_bucket(cf.amount, ARRAY[1000, 5000, 20000, 50000]::numeric[]) as stratum_bucket
+"""
+
+STRATUM_COLUMNS = ('stratum_module', 'stratum_type', 'stratum_month', 'stratum_bucket')
+
+
+def allocate_quotas(stratum_counts: Dict[Tuple, int], max_rows: int, min_per_stratum: int) -> Dict[Tuple, int]:
+    """
+    Satır bütçesini katmanlara dağıt
+
+    Her katmana önce küçük bir taban (`min_per_stratum`) verilir ki seyrek kombinasyonlar kaybolmasın,
+    kalan bütçe katman büyüklüğüyle orantılı (en büyük kalan yöntemi) paylaştırılır.
+    """
+
+    total = sum(stratum_counts.values())
+    if total <= max_rows:
+        return dict(stratum_counts)
+
+    floors = {key: min(count, min_per_stratum) for key, count in stratum_counts.items()}
+    if sum(floors.values()) > max_rows:
+        floors = {key: 0 for key in stratum_counts}
+
+    budget = max_rows - sum(floors.values())
+    remaining = {key: stratum_counts[key] - floors[key] for key in stratum_counts}
+    remaining_total = sum(remaining.values())
+
+    shares = {key: budget * count / remaining_total for key, count in remaining.items()} if remaining_total else {}
+    quotas = {key: floors[key] + int(shares.get(key, 0)) for key in stratum_counts}
+
+    leftover = max_rows - sum(quotas.values())
+    by_remainder = sorted(shares, key=lambda key: shares[key] - int(shares[key]), reverse=True)
+
+    for key in by_remainder:
+        if leftover <= 0:
+            break
+        if quotas[key] < stratum_counts[key]:
+            quotas[key] += 1
+            leftover -= 1
+
+    return quotas
+
+
+class StratifiedReservoirSampler:
+    """
+    Eğitim geçmişi için katmanlı, ağırlıklı rezervuar örnekleyici
+
+    - Katman sayıları tek bir toplama sorgusuyla alınır, bütçe katmanlara dağıtılır
+    - Satırlar sunucu tarafı imleçle akış halinde okunur; bellekte katman kotası kadar satır tutulur
+    - Her katmanda ağırlıklı rezervuar örneklemesi (A-Res) uygulanır; ağırlık, işlemin yaşıyla
+      `half_life_days` yarı ömürle azalır, böylece yakın tarihli veri fazla örneklenir
+    """
+
+    def __init__(
+        self,
+        max_rows: int,
+        half_life_days: float = 120.0,
+        min_per_stratum: int = 20,
+        prefetch: int = 2000,
+        seed: int = 42
+    ):
+        self.max_rows = max_rows
+        self.half_life_days = half_life_days
+        self.min_per_stratum = min_per_stratum
+        self.prefetch = prefetch
+        self.rng = random.Random(seed)
+
+    def _weight(self, expected_date, now: datetime) -> float:
+        if expected_date is None:
+            return 1.0
+
+        if not isinstance(expected_date, datetime):
+            expected_date = datetime(expected_date.year, expected_date.month, expected_date.day)
+        if expected_date.tzinfo is None:
+            expected_date = expected_date.replace(tzinfo=timezone.utc)
+
+        age_days = max((now - expected_date).total_seconds() / 86400, 0.0)
+
+        return 0.5 ** (age_days / self.half_life_days)
+
+    async def sample(
+        self,
+        db: asyncpg.Pool,
+        query: str,
+        counts_query: str,
+        *args
+    ) -> Tuple[List[Dict], int]:
+        """
+        Örneklenmiş satırları ve toplam satır sayısını döndür
+
+        `query` satırlarında STRATUM_SQL sütunları ve `expected_date` bulunmalı;
+        `counts_query` katman başına STRATUM_SQL sütunlarını ve `rows` sayısını döndürmelidir.
+        """
+
+        count_rows = await db.fetch(counts_query, *args)
+        stratum_counts = {tuple(row[c] for c in STRATUM_COLUMNS): int(row['rows']) for row in count_rows}
+        total = sum(stratum_counts.values())
+
+        quotas = allocate_quotas(stratum_counts, self.max_rows, self.min_per_stratum)
+        reservoirs: Dict[Tuple, List] = {key: [] for key in quotas}
+        tiebreak = itertools.count()
+        now = datetime.now(timezone.utc)
+
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(query, *args, prefetch=self.prefetch):
+                    key = tuple(row[c] for c in STRATUM_COLUMNS)
+                    quota = quotas.get(key, 0)
+                    if quota <= 0:
+                        continue
+
+                    # A-Res anahtarı: u^(1/w); logaritması ile sayısal olarak kararlı
+                    weight = max(self._weight(row['expected_date'], now), 1e-12)
+                    sort_key = math.log(self.rng.random() or 1e-300) / weight
+
+                    reservoir = reservoirs[key]
+                    if len(reservoir) < quota:
+                        heapq.heappush(reservoir, (sort_key, next(tiebreak), row))
+                    elif sort_key > reservoir[0][0]:
+                        heapq.heapreplace(reservoir, (sort_key, next(tiebreak), row))
+
+        sampled = [dict(row) for reservoir in reservoirs.values() for _, _, row in reservoir]
+
+        logger.info(
+            f"Stratified sample: {len(sampled)}/{total} rows from {len(stratum_counts)} strata"
+        )
+
+        return sampled, total
@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from services.ai_agent import queries
+from services.ai_agent.enhanced_predictor import (
+    EnhancedCashFlowAIAgent, FORECAST_SCENARIOS, MAX_PREDICTED_DELAY_DAYS
+)
+from services.db import create_pool
+from services.reconciliation import accuracy_scores
+
+logger = logging.getLogger(__name__)
+
+# Her süreç kendi bağlantı havuzunu açar (toplam bağlantı: süreç × bu sayı)
+BACKTEST_POOL_SIZE = int(os.getenv("BACKTEST_POOL_SIZE", 2))
+# Bir süreç işine verilen tenant sayısı
+BACKTEST_TENANT_CHUNK = int(os.getenv("BACKTEST_TENANT_CHUNK", 25))
+
+# Kapanmamış kayıtların kapanma günü
+OPEN_DAY = np.iinfo(np.int32).max // 2
+
+ERROR_SUMS = ('forecasts', 'abs_error', 'squared_error', 'error', 'accuracy')
+
+
+@dataclass(frozen=True)
+class BacktestOptions:
+    """Süreçlere gönderilen test parametreleri"""
+    from_date: date
+    to_date: date
+    horizon_days: int
+    scenario_type: str = 'realistic'
+    use_delay_model: bool = True
+
+    @property
+    def as_of_days(self) -> int:
+        return (self.to_date - self.from_date).days + 1
+
+
+class HorizonError(BaseModel):
+    """Bir ufuktaki (tahmin gününden kaç gün sonrası) hata özeti"""
+    horizon_days: int
+    forecasts: int
+    mae: float
+    rmse: float
+    bias: float
+    accuracy: float
+
+
+class BacktestReport(BaseModel):
+    """
+    Geriye dönük test özeti
+
+    `bias` ortalama (tahmin - gerçekleşen) farkıdır; `accuracy` reconciliation ile aynı gün
+    bazında doğruluk ortalamasıdır. `tenant_mae` tenant başına tüm ufukların MAE'si.
+    """
+    from_date: date
+    to_date: date
+    horizon_days: int
+    scenario_type: str
+    use_delay_model: bool
+    tenants: int
+    failed_tenants: List[str] = []
+    elapsed_seconds: float = 0.0
+    horizons: List[HorizonError] = []
+    tenant_mae: Dict[str, float] = {}
+
+
+def backtest_matrices(
+    created: np.ndarray,
+    expected: np.ndarray,
+    landing: np.ndarray,
+    cleared: np.ndarray,
+    signed_amount: np.ndarray,
+    weighted: np.ndarray,
+    opening_balance: float,
+    n_as_of: int,
+    horizon: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Tüm geçmiş tarihler için tahmin ve gerçekleşen bakiye matrisleri (as-of günü × ufuk)
+
+    Günler pencere başlangıcına göre tamsayıdır; kapanmamış kayıtların kapanma günü OPEN_DAY'dir.
+    - Gerçekleşen bakiye B(d): d gününe kadar kapanmış tutarların kümülatif toplamı
+    - D günü başındaki tahmin: başlangıç B(D-1); bekleyen küme created < D <= cleared olan kayıtlar,
+      katkı iniş günü (landing) D..D+ufuk-1 içindeyse ve expected <= D+ufuk ise (canlı tahmindeki pencere)
+    - Bir kayıt a <= D <= b olan her as-of gününde (D, landing) hücresine katkı verir; aralıklar
+      fark dizisine iki noktayla yazılıp as-of ekseninde kümülatif toplamla açılır, ufuk köşegenden okunur
+    """
+
+    n_land = n_as_of + horizon
+
+    # balance[d + 1] = B(d), d = -1 .. n_as_of + horizon - 2; daha önce kapananlar açılışa eklenir
+    in_window = cleared <= n_land - 2
+    balance = opening_balance + np.cumsum(
+        np.bincount(np.maximum(cleared[in_window], -1) + 1, weights=signed_amount[in_window], minlength=n_land)
+    )
+
+    first = np.maximum.reduce([created + 1, landing - (horizon - 1), expected - horizon, np.zeros_like(created)])
+    last = np.minimum.reduce([cleared, landing, np.full_like(cleared, n_as_of - 1)])
+    valid = first <= last
+
+    first, last, landing, weighted = first[valid], last[valid], landing[valid], weighted[valid]
+    size = (n_as_of + 1) * n_land
+
+    intervals = (
+        np.bincount(first * n_land + landing, weights=weighted, minlength=size)
+        - np.bincount((last + 1) * n_land + landing, weights=weighted, minlength=size)
+    ).reshape(n_as_of + 1, n_land)
+
+    pending = np.cumsum(intervals, axis=0)[:n_as_of]
+
+    as_of = np.arange(n_as_of)[:, None]
+    ahead = np.arange(horizon)[None, :]
+
+    predicted = balance[as_of] + np.cumsum(pending[as_of, as_of + ahead], axis=1)
+    actual = balance[as_of + ahead + 1]
+
+    return predicted, actual
+
+
+def error_sums(predicted: np.ndarray, actual: np.ndarray) -> Dict[str, np.ndarray]:
+    """Ufuk başına hata toplamları (tenant'lar arasında toplanabilir)"""
+
+    error = predicted - actual
+
+    return {
+        'forecasts': np.full(predicted.shape[1], predicted.shape[0], dtype=float),
+        'abs_error': np.abs(error).sum(axis=0),
+        'squared_error': (error ** 2).sum(axis=0),
+        'error': error.sum(axis=0),
+        'accuracy': accuracy_scores(predicted, actual).sum(axis=0)
+    }
+
+
+async def backtest_tenant(db, tenant_id: str, options: BacktestOptions) -> Optional[Dict[str, np.ndarray]]:
+    """Tenant geçmişini bir kez okuyup tüm as-of günlerini test et; geçmişi yoksa None"""
+
+    scenario = FORECAST_SCENARIOS[options.scenario_type]
+    query, args = queries.backtest_history_query(tenant_id, options.from_date)
+    rows = await db.fetch(query, *args)
+
+    opening_balance = sum(row['amount'] for row in rows if row['type'] == 'opening')
+    transactions = [dict(row) for row in rows if row['type'] != 'opening']
+
+    if not transactions:
+        return None
+
+    agent = EnhancedCashFlowAIAgent(db)
+    if options.use_delay_model:
+        await agent._load_model(tenant_id, None)
+
+    predicted_delays = await agent._predict_delays(transactions)
+
+    origin = np.datetime64(options.from_date, 'D')
+
+    def days(key: str, missing: int) -> np.ndarray:
+        values = np.array(
+            [np.datetime64(t[key], 'D') if t[key] is not None else np.datetime64('NaT') for t in transactions],
+            dtype='datetime64[D]'
+        )
+        return np.where(np.isnat(values), missing, (values - origin).astype(np.int64))
+
+    created = days('created_day', -OPEN_DAY)
+    expected = days('expected_day', 0)
+    cleared = days('cleared_day', OPEN_DAY)
+
+    is_inflow = np.array([t['type'] == 'inflow' for t in transactions], dtype=bool)
+    amount = np.array([t['amount'] for t in transactions], dtype=float)
+    raw_confidence = np.array([t['raw_confidence'] for t in transactions], dtype=float)
+
+    factors = np.where(is_inflow, 1 + scenario.inflow_adjustment / 100, 1 + scenario.outflow_adjustment / 100)
+    signed_amount = np.where(is_inflow, amount, -amount)
+
+    landing = (
+        expected
+        + np.clip(predicted_delays, -MAX_PREDICTED_DELAY_DAYS, MAX_PREDICTED_DELAY_DAYS)
+        + np.where(is_inflow, scenario.delay_days, 0)
+    )
+
+    predicted, actual = backtest_matrices(
+        created,
+        expected,
+        landing,
+        cleared,
+        signed_amount,
+        signed_amount * np.clip(raw_confidence * factors, 0.05, 1.0),
+        opening_balance,
+        options.as_of_days,
+        options.horizon_days
+    )
+
+    # Tenant'ın ilk kaydından önceki as-of günleri (boş defter) sayılmaz
+    active = np.arange(options.as_of_days) > created.min()
+
+    return error_sums(predicted[active], actual[active]) if active.any() else None
+
+
+async def _run_chunk(tenant_ids: List[str], options: BacktestOptions) -> List[Tuple[str, Optional[Dict], Optional[str]]]:
+    db = await create_pool(min_size=1, max_size=BACKTEST_POOL_SIZE)
+    results = []
+
+    try:
+        for tenant_id in tenant_ids:
+            try:
+                sums = await backtest_tenant(db, tenant_id, options)
+                results.append((tenant_id, sums, None))
+            except Exception as e:
+                logger.error(f"Backtest failed for tenant {tenant_id}: {str(e)}")
+                results.append((tenant_id, None, str(e)))
+
+    finally:
+        await db.close()
+
+    return results
+
+
+def run_tenant_chunk(tenant_ids: List[str], options: BacktestOptions):
+    """Süreç işi: kendi olay döngüsü ve bağlantı havuzuyla bir tenant grubunu test et"""
+
+    logging.basicConfig(level=logging.INFO)
+
+    return asyncio.run(_run_chunk(tenant_ids, options))
+
+
+class BacktestRunner:
+    """
+    Tahmin doğruluğunun geçmişe dönük toplu testi
+
+    - Tenant geçmişi tek sorguyla okunur, gecikme kayıt başına bir kez tahmin edilir
+    - Her geçmiş gün için bekleyen küme ve bakiye aralık mantığıyla vektörel kurulur
+      (backtest_matrices), tüm as-of günlerinin tahminleri tek matris hesabıdır
+    - Tenant grupları süreç havuzuna dağıtılır; hatalar ufuk başına toplanır
+
+    Gecikme modeli ve kurallar bugünkü hâlleridir (modelin eğitim verisi test dönemini içerebilir);
+    `use_delay_model=False` gecikmesiz temel çizgiyi verir. İptal edilen kayıtların ne zaman iptal
+    edildiği bilinmediğinden test dışıdır.
+    """
+
+    def __init__(self, processes: Optional[int] = None, chunk_size: int = BACKTEST_TENANT_CHUNK):
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def run(self, tenant_ids: List[str], options: BacktestOptions) -> BacktestReport:
+        started = time.monotonic()
+
+        report = BacktestReport(
+            from_date=options.from_date,
+            to_date=options.to_date,
+            horizon_days=options.horizon_days,
+            scenario_type=options.scenario_type,
+            use_delay_model=options.use_delay_model,
+            tenants=len(tenant_ids)
+        )
+
+        totals = {key: np.zeros(options.horizon_days) for key in ERROR_SUMS}
+        chunks = [tenant_ids[i:i + self.chunk_size] for i in range(0, len(tenant_ids), self.chunk_size)]
+
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            for results in executor.map(run_tenant_chunk, chunks, [options] * len(chunks)):
+                for tenant_id, sums, error in results:
+                    if error is not None:
+                        report.failed_tenants.append(tenant_id)
+                        continue
+
+                    if sums is None:
+                        continue
+
+                    for key in ERROR_SUMS:
+                        totals[key] += sums[key]
+
+                    report.tenant_mae[tenant_id] = float(sums['abs_error'].sum() / sums['forecasts'].sum())
+
+        forecasts = np.maximum(totals['forecasts'], 1)
+
+        report.horizons = [
+            HorizonError(
+                horizon_days=day,
+                forecasts=int(totals['forecasts'][day]),
+                mae=float(totals['abs_error'][day] / forecasts[day]),
+                rmse=float(np.sqrt(totals['squared_error'][day] / forecasts[day])),
+                bias=float(totals['error'][day] / forecasts[day]),
+                accuracy=float(totals['accuracy'][day] / forecasts[day])
+            )
+            for day in range(options.horizon_days)
+        ]
+        report.elapsed_seconds = time.monotonic() - started
+
+        logger.info(
+            f"Backtest {options.from_date} -> {options.to_date}: {len(report.tenant_mae)} tenants, "
+            f"{len(report.failed_tenants)} failed in {report.elapsed_seconds:.1f}s"
+        )
+
+        return report
+
+
+def default_options(
+    lookback_days: int,
+    horizon_days: int,
+    scenario_type: str = 'realistic',
+    use_delay_model: bool = True
+) -> BacktestOptions:
+    """Son as-of günü, tüm ufukları dün itibarıyla gerçekleşmiş olan gündür"""
+
+    to_date = date.today() - timedelta(days=horizon_days)
+
+    return BacktestOptions(
+        from_date=to_date - timedelta(days=lookback_days - 1),
+        to_date=to_date,
+        horizon_days=horizon_days,
+        scenario_type=scenario_type,
+        use_delay_model=use_delay_model
+    )
@@ -0,0 +1,57 @@
+import json
+import os
+from typing import Set
+
+import asyncpg
+
+# Her kurulumda bulunmayan cash_flow sütunları; create_pool açılışta bir kez kontrol eder
+OPTIONAL_CASH_FLOW_COLUMNS = ('payment_term_days',)
+optional_cash_flow_columns: Set[str] = set()
+
+
+async def _init_connection(conn: asyncpg.Connection):
+    """jsonb/json kolonlarını dict/list olarak oku ve yaz"""
+
+    for type_name in ('jsonb', 'json'):
+        await conn.set_type_codec(
+            type_name,
+            encoder=json.dumps,
+            decoder=json.loads,
+            schema='pg_catalog'
+        )
+
+
+async def create_pool(min_size: int, max_size: int) -> asyncpg.Pool:
+    """DATABASE_URL üzerinden bağlantı havuzu oluştur"""
+
+    db_url = os.getenv("DATABASE_URL")
+    if not db_url:
+        raise RuntimeError("DATABASE_URL environment variable not set")
+
+    pool = await asyncpg.create_pool(
+        db_url,
+        min_size=min_size,
+        max_size=max_size,
+        init=_init_connection
+    )
+
+    await detect_optional_columns(pool)
+
+    return pool
+
+
+async def detect_optional_columns(db) -> Set[str]:
+    """Opsiyonel cash_flow sütunlarından mevcut olanları kaydet (kural SQL'i bunlara göre üretilir)"""
+
+    rows = await db.fetch("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = 'public'
+        AND table_name = 'cash_flow'
+        AND column_name = ANY($1::text[])
+    """, list(OPTIONAL_CASH_FLOW_COLUMNS))
+
+    optional_cash_flow_columns.clear()
+    optional_cash_flow_columns.update(row['column_name'] for row in rows)
+
+    return optional_cash_flow_columns
@@ -0,0 +1,125 @@
+import logging
+import os
+from datetime import date, timedelta
+from typing import List, Optional
+
+import asyncpg
+from pydantic import BaseModel
+
+from services.ai_agent.models import PredictionResult
+
+logger = logging.getLogger(__name__)
+
+# İstemci bu kadar sürüm gerideyse delta yerine tam tahmin gönderilir
+FORECAST_DELTA_MAX_LAG = int(os.getenv("FORECAST_DELTA_MAX_LAG", 48))
+
+
+class ForecastDelta(BaseModel):
+    """
+    Sürümlü tahmin yanıtı
+
+    `full=False` ise `days` yalnızca `since_version` sonrasında değişen günlerdir; istemci
+    bunları tarihe göre kendi kopyasına yazar ve [window_start, window_end) dışındaki günleri atar.
+    `stored_until`: kayıtlı son günün ertesi; `window_end`'den önceyse seri pencereyi kapsamaz.
+    """
+    version: int
+    since_version: Optional[int] = None
+    full: bool
+    scenario_type: str
+    window_start: date
+    window_end: date
+    stored_until: date
+    days: List[PredictionResult]
+
+
+class ForecastDeltaReader:
+    """Kaydedilmiş tahminleri sürüme göre okur (yeniden hesaplama yapmaz)"""
+
+    def __init__(self, db_pool: asyncpg.Pool, max_lag: int = FORECAST_DELTA_MAX_LAG):
+        self.db = db_pool
+        self.max_lag = max_lag
+
+    async def read(
+        self,
+        tenant_id: str,
+        branch_id: Optional[str],
+        scenario_type: str,
+        forecast_days: int,
+        since_version: Optional[int]
+    ) -> Optional[ForecastDelta]:
+        """
+        Güncel sürümü ve değişen günleri aynı anlık görüntüden oku
+
+        İstemci çok gerideyse veya sürümü tanınmıyorsa pencerenin tamamı döner; seri hiç
+        kaydedilmemişse None.
+        """
+
+        window_start = date.today()
+        window_end = window_start + timedelta(days=forecast_days)
+        branch_filter = "branch_id = $2" if branch_id is not None else "branch_id IS NULL AND $2::uuid IS NULL"
+
+        async with self.db.acquire() as conn:
+            async with conn.transaction(isolation='repeatable_read', readonly=True):
+                version = await conn.fetchval(f"""
+                    SELECT version
+                    FROM public.ai_forecast_versions
+                    WHERE tenant_id = $1
+                    AND {branch_filter}
+                    AND scenario_type = $3
+                """, tenant_id, branch_id, scenario_type)
+
+                if version is None:
+                    return None
+
+                stored_until = await conn.fetchval(f"""
+                    SELECT MAX(prediction_date) + 1
+                    FROM public.cash_flow_predictions
+                    WHERE tenant_id = $1
+                    AND {branch_filter}
+                    AND scenario_type = $3
+                    AND prediction_date >= $4
+                """, tenant_id, branch_id, scenario_type, window_start)
+
+                full = (
+                    since_version is None
+                    or since_version > version
+                    or version - since_version > self.max_lag
+                )
+
+                rows = await conn.fetch(f"""
+                    SELECT prediction_date, predicted_balance, confidence_score, risk_level, risk_color,
+                           factors_used, recommendations
+                    FROM public.cash_flow_predictions
+                    WHERE tenant_id = $1
+                    AND {branch_filter}
+                    AND scenario_type = $3
+                    AND prediction_date >= $4
+                    AND prediction_date < $5
+                    AND version > $6
+                    ORDER BY prediction_date
+                """, tenant_id, branch_id, scenario_type, window_start, window_end, -1 if full else since_version)
+
+        days = [
+            PredictionResult(
+                date=row['prediction_date'],
+                predicted_balance=float(row['predicted_balance']),
+                confidence_score=float(row['confidence_score'] or 0),
+                risk_level=row['risk_level'],
+                risk_color=row['risk_color'],
+                factors=row['factors_used'] or {},
+                recommendations=row['recommendations'] or [],
+                scenario_type=scenario_type
+            )
+            for row in rows
+        ]
+
+        return ForecastDelta(
+            version=version,
+            since_version=since_version,
+            full=full,
+            scenario_type=scenario_type,
+            window_start=window_start,
+            window_end=window_end,
+            stored_until=stored_until or window_start,
+            days=days
+        )
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+
+from services.ai_agent.enhanced_predictor import EnhancedCashFlowAIAgent
+
+logger = logging.getLogger(__name__)
+
+CHANGES_CHANNEL = 'cash_flow_changes'
+
+# NOTIFY kaçırılırsa (bağlantı koptuğunda) değişiklik kaydı bu aralıkla yoklanır
+INCREMENTAL_POLL_INTERVAL_SECONDS = float(os.getenv("INCREMENTAL_POLL_INTERVAL_SECONDS", 30))
+INCREMENTAL_SERIES_BATCH_SIZE = int(os.getenv("INCREMENTAL_SERIES_BATCH_SIZE", 50))
+# Daha eski değişiklikler silinir; bu süredir kaydedilmemiş seriler tam hesaplamayı bekler
+CHANGE_LOG_RETENTION_DAYS = int(os.getenv("CHANGE_LOG_RETENTION_DAYS", 7))
+
+
+def _parse_image(image: Dict) -> Dict:
+    """Tetikleyicinin jsonb görüntüsünü bekleyen satır biçimine çevir (asyncpg ile aynı tipler)"""
+
+    row = dict(image)
+    row['amount'] = float(row['amount'])
+    row['expected_date'] = datetime.fromisoformat(row['expected_date']).astimezone(timezone.utc)
+
+    return row
+
+
+class IncrementalForecastUpdater:
+    """
+    cash_flow değişikliklerini kaydedilmiş tahminlere artımlı uygular
+
+    - Tetikleyici (log_cash_flow_change) her değişikliğin eski/yeni görüntüsünü
+      ai_cash_flow_changes'a yazar ve NOTIFY gönderir; LISTEN bağlantısı döngüyü uyandırır
+    - Seri başına applied_change_id sonrasındaki değişiklikler için eski görüntü çıkarılır,
+      yeni görüntü eklenir: bekleyen satır tahmin edilen gününün akışını, kapanmış satır
+      başlangıç bakiyesini değiştirir
+    - Gecikmeler tam hesaplamayla aynı ayrıntıdadır (FORECAST_INPUT_MODE): aggregate modunda
+      etkilenen grubun önceki katkısı önceki ortalama tutarın gecikmesiyle çıkarılır, güncel
+      katkı yeni ortalamanınkiyle eklenir; gruplar değişikliklerle aynı anlık görüntüden okunur
+    - Kayıtlı günlerin akışları `factors` içinden okunur, yürüyen bakiye / risk / öneriler
+      etkilenen günden itibaren yeniden üretilir ve sürümlü kaydedilir
+      (EnhancedCashFlowAIAgent.load_forecast_patch / patch_predictions)
+    - Saatlik tam hesaplama seriyi yeniden tabanlar (kurallar, model, tarih kayması)
+    """
+
+    def __init__(
+        self,
+        db_pool: asyncpg.Pool,
+        poll_interval_seconds: float = INCREMENTAL_POLL_INTERVAL_SECONDS,
+        batch_size: int = INCREMENTAL_SERIES_BATCH_SIZE,
+        retention_days: int = CHANGE_LOG_RETENTION_DAYS
+    ):
+        self.db = db_pool
+        self.poll_interval_seconds = poll_interval_seconds
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self.wake = asyncio.Event()
+        self.listener: Optional[asyncpg.Connection] = None
+        self.last_prune = 0.0
+
+    async def run(self):
+        """Bildirim veya yoklama aralığıyla sürekli çalış"""
+
+        logger.info(f"Incremental forecast updater started (poll: {self.poll_interval_seconds}s)")
+
+        try:
+            while True:
+                if self.listener is None or self.listener.is_closed():
+                    await self._listen()
+
+                try:
+                    await asyncio.wait_for(self.wake.wait(), timeout=self.poll_interval_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+                self.wake.clear()
+
+                try:
+                    updated = await self.apply_pending()
+                    if updated >= self.batch_size:
+                        self.wake.set()
+
+                    await self._prune_if_due()
+
+                except Exception as e:
+                    logger.error(f"Incremental forecast update error: {str(e)}", exc_info=True)
+
+        finally:
+            if self.listener is not None and not self.listener.is_closed():
+                await self.listener.close()
+
+    async def _listen(self):
+        """Havuz dışında ayrı LISTEN bağlantısı; açılamazsa yalnızca yoklama yapılır"""
+
+        try:
+            self.listener = await asyncpg.connect(os.getenv("DATABASE_URL"))
+            await self.listener.add_listener(CHANGES_CHANNEL, self._on_notify)
+        except Exception as e:
+            self.listener = None
+            logger.warning(f"LISTEN {CHANGES_CHANNEL} unavailable, polling only: {str(e)}")
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.wake.set()
+
+    async def apply_pending(self) -> int:
+        """Geride kalan serileri güncelle, işlenen seri sayısını döndür"""
+
+        series = await self.db.fetch("""
+            SELECT v.tenant_id, v.branch_id, v.scenario_type, v.version, v.applied_change_id
+            FROM public.ai_forecast_versions v
+            WHERE v.applied_change_id > 0
+            AND v.updated_at > NOW() - make_interval(days => $1)
+            AND EXISTS (
+                SELECT 1
+                FROM public.ai_cash_flow_changes c
+                WHERE c.tenant_id = v.tenant_id
+                AND c.id > v.applied_change_id
+                AND (v.branch_id IS NULL OR v.branch_id IN (c.old_branch_id, c.new_branch_id))
+            )
+            ORDER BY v.tenant_id, v.branch_id
+            LIMIT $2
+        """, self.retention_days, self.batch_size)
+
+        groups: Dict[Tuple[str, Optional[str]], List] = {}
+        for row in series:
+            key = (str(row['tenant_id']), str(row['branch_id']) if row['branch_id'] else None)
+            groups.setdefault(key, []).append(row)
+
+        for (tenant_id, branch_id), rows in groups.items():
+            try:
+                await self._apply_to_series(tenant_id, branch_id, rows)
+            except Exception as e:
+                logger.error(f"Incremental update failed for {tenant_id}/{branch_id or '-'}: {str(e)}")
+                await self._detach(tenant_id, branch_id, [row['scenario_type'] for row in rows])
+
+        return len(series)
+
+    async def _apply_to_series(self, tenant_id: str, branch_id: Optional[str], series: List):
+        """Bir tenant/şubenin tüm senaryo serilerine değişiklikleri uygula"""
+
+        since = min(row['applied_change_id'] for row in series)
+        change_filter = "$3::uuid IN (old_branch_id, new_branch_id)" if branch_id else "$3::uuid IS NULL"
+        series_filter = "branch_id = $2" if branch_id else "branch_id IS NULL AND $2::uuid IS NULL"
+
+        stored = await self.db.fetch(f"""
+            SELECT scenario_type, prediction_date, predicted_balance, factors_used
+            FROM public.cash_flow_predictions
+            WHERE tenant_id = $1
+            AND {series_filter}
+            AND scenario_type = ANY($3::text[])
+            AND prediction_date >= $4
+            ORDER BY scenario_type, prediction_date
+        """, tenant_id, branch_id, [row['scenario_type'] for row in series], date.today())
+
+        stored_by_scenario: Dict[str, List] = {}
+        for row in stored:
+            stored_by_scenario.setdefault(row['scenario_type'], []).append(row)
+
+        # Günlük akışları olmayan (eski biçimde kaydedilmiş) seriler tam hesaplamayı bekler
+        patchable = []
+        for row in series:
+            days = stored_by_scenario.get(row['scenario_type'])
+            if not days or any('day_inflow' not in (day['factors_used'] or {}) for day in days):
+                await self._detach(tenant_id, branch_id, [row['scenario_type']])
+            else:
+                patchable.append((row, days))
+
+        if not patchable:
+            return
+
+        end_date = datetime.combine(
+            max(days[-1]['prediction_date'] for _, days in patchable) + timedelta(days=1), time(), timezone.utc
+        )
+
+        agent = EnhancedCashFlowAIAgent(self.db)
+
+        # Değişiklikler ve (aggregate modunda) etkilenen grupların güncel toplamları aynı anlık görüntüden
+        async with self.db.acquire() as conn:
+            async with conn.transaction(isolation='repeatable_read', readonly=True):
+                changes = await conn.fetch(f"""
+                    SELECT id, old_row, new_row
+                    FROM public.ai_cash_flow_changes
+                    WHERE tenant_id = $1
+                    AND id > $2
+                    AND {change_filter}
+                    ORDER BY id
+                """, tenant_id, since, branch_id)
+
+                if not changes:
+                    return
+
+                # (değişiklik, işaret, satır): eski görüntü geri alınır, yeni görüntü eklenir
+                images = [
+                    (change['id'], sign, _parse_image(image))
+                    for change in changes
+                    for sign, image in ((-1, change['old_row']), (1, change['new_row']))
+                    if image and (branch_id is None or image.get('branch_id') == branch_id)
+                ]
+
+                patch = await agent.load_forecast_patch(tenant_id, branch_id, images, end_date, conn=conn)
+
+        last_change_id = changes[-1]['id']
+
+        for row, days in patchable:
+            scenario_type = row['scenario_type']
+
+            predictions = await agent.patch_predictions(patch, scenario_type, days, row['applied_change_id'])
+
+            version = await agent.save_predictions(
+                tenant_id,
+                branch_id,
+                predictions,
+                applied_change_id=last_change_id,
+                expected_version=row['version']
+            )
+
+            if version is None:
+                logger.info(f"Forecast {tenant_id}/{branch_id or '-'}/{scenario_type} changed concurrently, retrying later")
+
+    async def _detach(self, tenant_id: str, branch_id: Optional[str], scenario_types: List[str]):
+        """
+        Seriyi bir sonraki tam hesaplamaya kadar artımlı güncellemeden çıkar
+
+        applied_change_id = 0 olan seriler seçilmez; tam kayıt filigranı yeniden yazar.
+        """
+
+        await self.db.execute("""
+            UPDATE public.ai_forecast_versions
+            SET applied_change_id = 0
+            WHERE tenant_id = $1
+            AND branch_id IS NOT DISTINCT FROM $2::uuid
+            AND scenario_type = ANY($3::text[])
+        """, tenant_id, branch_id, scenario_types)
+
+    async def _prune_if_due(self):
+        """Saklama süresini aşan değişiklikleri saatte bir sil"""
+
+        now = asyncio.get_running_loop().time()
+        if now - self.last_prune < 3600:
+            return
+
+        self.last_prune = now
+
+        result = await self.db.execute("""
+            DELETE FROM public.ai_cash_flow_changes
+            WHERE changed_at < NOW() - make_interval(days => $1)
+        """, self.retention_days)
+
+        logger.info(f"Change log pruned: {result.split()[-1]} rows")
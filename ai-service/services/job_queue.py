@@ -0,0 +1,247 @@
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import asyncpg
+from pydantic import BaseModel
+
+
+JOB_TYPES = ('train', 'forecast')
+
+VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("JOB_VISIBILITY_TIMEOUT_SECONDS", 600))
+RETRY_BASE_SECONDS = int(os.getenv("JOB_RETRY_BASE_SECONDS", 30))
+
+
+def job_dedupe_key(job_type: str, tenant_id: str, branch_id: Optional[str] = None, payload: Optional[Dict] = None) -> str:
+    """Eşdeğer işlerin ortak anahtarı (API ve scheduler aynı anahtarı üretir); tahminde senaryo ve gün sayısı dahil"""
+
+    key = f"{job_type}:{tenant_id}:{branch_id or '-'}"
+
+    if job_type == 'forecast':
+        payload = payload or {}
+        key += f":{payload.get('scenario', 'realistic')}:{payload.get('forecast_days', 30)}"
+
+    return key
+
+
+class Job(BaseModel):
+    id: str
+    job_type: str
+    tenant_id: str
+    branch_id: Optional[str] = None
+    payload: Dict = {}
+    priority: int = 0
+    attempts: int = 0
+    max_attempts: int = 3
+
+
+class JobReceipt(BaseModel):
+    """Kuyruğa alınan işin kimliği"""
+    job_id: str
+    status: str = 'queued'
+
+
+class JobQueue:
+    """
+    Postgres tabanlı kalıcı iş kuyruğu (public.ai_jobs)
+
+    - İşler `FOR UPDATE SKIP LOCKED` ile alınır, aynı iş iki worker'a verilmez
+    - Alınan iş `locked_until` süresince görünmez; worker ölürse süre dolunca yeniden alınır
+    - Başarısız işler üstel gecikmeyle tekrar kuyruğa girer, `max_attempts` sonrası 'dead' olur
+    - Aynı `dedupe_key` ile bekleyen/çalışan iş varsa yenisi eklenmez
+    """
+
+    def __init__(self, db_pool: asyncpg.Pool):
+        self.db = db_pool
+
+    async def enqueue(
+        self,
+        job_type: str,
+        tenant_id: str,
+        branch_id: Optional[str] = None,
+        payload: Optional[Dict] = None,
+        priority: int = 0,
+        run_after: Optional[datetime] = None,
+        max_attempts: int = 3,
+        dedupe_key: Optional[str] = None,
+        attempts: int = 3
+    ) -> Optional[str]:
+        """
+        İşi kuyruğa ekle, mevcut eşdeğer iş varsa onun ID'sini döndür
+
+        Çakışan iş ekleme ile okuma arasında biterse ekleme yeniden denenir;
+        `attempts` denemede de kimlik alınamazsa None döner.
+        """
+
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        dedupe_key = dedupe_key or job_dedupe_key(job_type, tenant_id, branch_id, payload)
+
+        for _ in range(attempts):
+            job_id = await self.db.fetchval("""
+                INSERT INTO public.ai_jobs
+                (job_type, tenant_id, branch_id, payload, priority, run_after, max_attempts, dedupe_key)
+                VALUES ($1, $2, $3, $4, $5, COALESCE($6, NOW()), $7, $8)
+                ON CONFLICT (dedupe_key) WHERE status IN ('queued', 'running')
+                DO NOTHING
+                RETURNING id
+            """,
+                job_type,
+                tenant_id,
+                branch_id,
+                payload or {},
+                priority,
+                run_after,
+                max_attempts,
+                dedupe_key
+            )
+
+            if job_id is None:
+                job_id = await self.db.fetchval("""
+                    SELECT id FROM public.ai_jobs
+                    WHERE dedupe_key = $1 AND status IN ('queued', 'running')
+                """, dedupe_key)
+
+            if job_id is not None:
+                return str(job_id)
+
+        return None
+
+    async def enqueue_many(self, jobs: List[Dict]) -> int:
+        """Toplu ekleme (scheduler döngüleri için), eklenen iş sayısını döndür"""
+
+        if not jobs:
+            return 0
+
+        result = await self.db.execute("""
+            INSERT INTO public.ai_jobs
+            (job_type, tenant_id, branch_id, payload, priority, run_after, max_attempts, dedupe_key)
+            SELECT
+                j.job_type, j.tenant_id, j.branch_id, j.payload, j.priority,
+                j.run_after, 3, j.dedupe_key
+            FROM unnest($1::text[], $2::uuid[], $3::uuid[], $4::jsonb[], $5::int[], $6::timestamptz[], $7::text[])
+                AS j(job_type, tenant_id, branch_id, payload, priority, run_after, dedupe_key)
+            ON CONFLICT (dedupe_key) WHERE status IN ('queued', 'running')
+            DO NOTHING
+        """,
+            [j['job_type'] for j in jobs],
+            [j['tenant_id'] for j in jobs],
+            [j.get('branch_id') for j in jobs],
+            [j.get('payload') or {} for j in jobs],
+            [j.get('priority', 0) for j in jobs],
+            [j['run_after'] for j in jobs],
+            [job_dedupe_key(j['job_type'], j['tenant_id'], j.get('branch_id'), j.get('payload')) for j in jobs]
+        )
+
+        return int(result.split()[-1])
+
+    async def claim(
+        self,
+        worker_id: str,
+        job_types: List[str],
+        limit: int = 1,
+        visibility_timeout: int = VISIBILITY_TIMEOUT_SECONDS
+    ) -> List[Job]:
+        """Sıradaki işleri kilitle ve al (süresi dolmuş çalışan işler dahil)"""
+
+        rows = await self.db.fetch("""
+            WITH next_jobs AS (
+                SELECT id
+                FROM public.ai_jobs
+                WHERE job_type = ANY($1::text[])
+                AND (
+                    (status = 'queued' AND run_after <= NOW())
+                    OR (status = 'running' AND locked_until < NOW())
+                )
+                ORDER BY priority DESC, run_after
+                LIMIT $2
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE public.ai_jobs j
+            SET status = 'running',
+                attempts = j.attempts + 1,
+                locked_by = $3,
+                locked_until = NOW() + make_interval(secs => $4),
+                started_at = NOW(),
+                updated_at = NOW()
+            FROM next_jobs
+            WHERE j.id = next_jobs.id
+            RETURNING j.id, j.job_type, j.tenant_id, j.branch_id, j.payload,
+                      j.priority, j.attempts, j.max_attempts
+        """, job_types, limit, worker_id, visibility_timeout)
+
+        return [
+            Job(
+                id=str(row['id']),
+                job_type=row['job_type'],
+                tenant_id=str(row['tenant_id']),
+                branch_id=str(row['branch_id']) if row['branch_id'] else None,
+                payload=row['payload'] or {},
+                priority=row['priority'],
+                attempts=row['attempts'],
+                max_attempts=row['max_attempts']
+            )
+            for row in rows
+        ]
+
+    async def heartbeat(self, job: Job, worker_id: str, visibility_timeout: int = VISIBILITY_TIMEOUT_SECONDS) -> bool:
+        """Görünmezlik süresini uzat; iş başka worker'a geçtiyse False"""
+
+        result = await self.db.execute("""
+            UPDATE public.ai_jobs
+            SET locked_until = NOW() + make_interval(secs => $3), updated_at = NOW()
+            WHERE id = $1 AND locked_by = $2 AND status = 'running'
+        """, job.id, worker_id, visibility_timeout)
+
+        return result.endswith(' 1')
+
+    async def complete(self, job: Job, worker_id: str, result: Optional[Dict] = None):
+        """İşi başarıyla tamamla"""
+
+        await self.db.execute("""
+            UPDATE public.ai_jobs
+            SET status = 'done', result = $3, locked_until = NULL,
+                finished_at = NOW(), updated_at = NOW()
+            WHERE id = $1 AND locked_by = $2 AND status = 'running'
+        """, job.id, worker_id, result or {})
+
+    async def fail(self, job: Job, worker_id: str, error: str):
+        """Başarısız işi geri kuyruğa al veya 'dead' olarak işaretle"""
+
+        retry_in = RETRY_BASE_SECONDS * (2 ** max(job.attempts - 1, 0))
+
+        await self.db.execute("""
+            UPDATE public.ai_jobs
+            SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+                run_after = NOW() + make_interval(secs => $4),
+                locked_by = NULL,
+                locked_until = NULL,
+                last_error = $3,
+                finished_at = CASE WHEN attempts >= max_attempts THEN NOW() END,
+                updated_at = NOW()
+            WHERE id = $1 AND locked_by = $2 AND status = 'running'
+        """, job.id, worker_id, error[:2000], retry_in)
+
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        """İş durumunu getir"""
+
+        row = await self.db.fetchrow("""
+            SELECT id, job_type, tenant_id, branch_id, status, priority, attempts, max_attempts,
+                   run_after, started_at, finished_at, last_error, result, created_at
+            FROM public.ai_jobs
+            WHERE id = $1
+        """, job_id)
+
+        return dict(row) if row else None
+
+    async def purge_finished(self, older_than_days: int = 7) -> int:
+        """Tamamlanmış eski işleri sil"""
+
+        result = await self.db.execute("""
+            DELETE FROM public.ai_jobs
+            WHERE status IN ('done', 'dead')
+            AND finished_at < NOW() - make_interval(days => $1)
+        """, older_than_days)
+
+        return int(result.split()[-1])
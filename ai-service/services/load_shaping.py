@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import asyncpg
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class CycleReport(BaseModel):
+    """Bir zamanlama döngüsünün özeti"""
+    job_name: str
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    window_seconds: float
+    spread_seconds: float
+    tenants_total: int
+    tenants_succeeded: int = 0
+    tenants_failed: int = 0
+    max_start_lag_seconds: float = 0.0
+    avg_pool_wait_ms: float = 0.0
+    avg_db_latency_ms: float = 0.0
+    min_concurrency: int = 0
+    final_concurrency: int = 0
+    finished_within_window: bool = False
+
+
+def tenant_offset(tenant_id: str, job_name: str, spread_seconds: float) -> float:
+    """Tenant için deterministik başlangıç ofseti (süreçler arası sabit)"""
+
+    digest = hashlib.sha256(f"{job_name}:{tenant_id}".encode()).digest()
+    fraction = int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+    return fraction * spread_seconds
+
+
+class LoadShapedRunner:
+    """
+    Tenant işlerini pencere boyunca yayan yürütücü
+
+    - Her tenant, pencerenin ilk `spread_ratio` kısmında sabit bir ofsette başlar
+    - Havuz bekleme süresi ve DB gecikmesi hedefi aşarsa eşzamanlılık yarıya iner,
+      sağlıklıyken birer birer artar (AIMD)
+    - Yayma bölümü bittikten sonra geride kalan işler tam eşzamanlılıkla bitirilir
+    """
+
+    def __init__(
+        self,
+        db_pool: asyncpg.Pool,
+        spread_ratio: float = 0.75,
+        max_concurrency: int = 3,
+        target_pool_wait_ms: float = 50.0,
+        target_db_latency_ms: float = 100.0,
+        probe_interval_seconds: float = 5.0
+    ):
+        self.db = db_pool
+        self.spread_ratio = spread_ratio
+        self.max_concurrency = max_concurrency
+        self.target_pool_wait_ms = target_pool_wait_ms
+        self.target_db_latency_ms = target_db_latency_ms
+        self.probe_interval_seconds = probe_interval_seconds
+        self.last_reports: Dict[str, CycleReport] = {}
+
+    async def _probe(self) -> Tuple[float, float]:
+        """Havuz bekleme süresi ve basit sorgu gecikmesi (ms)"""
+
+        requested = time.monotonic()
+        async with self.db.acquire() as conn:
+            acquired = time.monotonic()
+            await conn.fetchval("SELECT 1")
+            answered = time.monotonic()
+
+        return (acquired - requested) * 1000, (answered - acquired) * 1000
+
+    async def run_cycle(
+        self,
+        job_name: str,
+        tenant_ids: List[str],
+        work: Callable[[str], Awaitable[None]],
+        window_seconds: float
+    ) -> CycleReport:
+        """Tenant listesini pencere boyunca yayarak çalıştır"""
+
+        spread_seconds = window_seconds * self.spread_ratio
+        schedule = sorted(
+            (tenant_offset(tenant_id, job_name, spread_seconds), tenant_id)
+            for tenant_id in tenant_ids
+        )
+
+        report = CycleReport(
+            job_name=job_name,
+            started_at=datetime.now(),
+            window_seconds=window_seconds,
+            spread_seconds=spread_seconds,
+            tenants_total=len(schedule),
+            min_concurrency=self.max_concurrency
+        )
+
+        started = time.monotonic()
+        concurrency = self.max_concurrency
+        active = set()
+        probes: List[Tuple[float, float]] = []
+        last_probe = float('-inf')
+
+        async def run_one(tenant_id: str):
+            try:
+                await work(tenant_id)
+                report.tenants_succeeded += 1
+            except Exception as e:
+                report.tenants_failed += 1
+                logger.error(f"{job_name} failed for tenant {tenant_id}: {str(e)}")
+
+        for offset, tenant_id in schedule:
+            delay = started + offset - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            now = time.monotonic()
+            if now - last_probe >= self.probe_interval_seconds:
+                last_probe = now
+                pool_wait_ms, db_latency_ms = await self._probe()
+                probes.append((pool_wait_ms, db_latency_ms))
+
+                if now - started >= spread_seconds:
+                    concurrency = self.max_concurrency
+                elif pool_wait_ms > self.target_pool_wait_ms or db_latency_ms > self.target_db_latency_ms:
+                    concurrency = max(1, concurrency // 2)
+                else:
+                    concurrency = min(self.max_concurrency, concurrency + 1)
+
+                report.min_concurrency = min(report.min_concurrency, concurrency)
+
+            while len(active) >= concurrency:
+                _, active = await asyncio.wait(active, return_when=asyncio.FIRST_COMPLETED)
+
+            lag = time.monotonic() - (started + offset)
+            report.max_start_lag_seconds = max(report.max_start_lag_seconds, lag)
+
+            active.add(asyncio.create_task(run_one(tenant_id)))
+
+        if active:
+            await asyncio.wait(active)
+
+        elapsed = time.monotonic() - started
+
+        report.finished_at = datetime.now()
+        report.final_concurrency = concurrency
+        report.finished_within_window = elapsed <= window_seconds
+        if probes:
+            report.avg_pool_wait_ms = sum(p[0] for p in probes) / len(probes)
+            report.avg_db_latency_ms = sum(p[1] for p in probes) / len(probes)
+
+        self.last_reports[job_name] = report
+
+        log = logger.info if report.finished_within_window else logger.warning
+        log(
+            f"{job_name} cycle finished in {elapsed:.1f}s / window {window_seconds:.0f}s "
+            f"(within_window={report.finished_within_window}, "
+            f"ok={report.tenants_succeeded}, failed={report.tenants_failed}, "
+            f"max_lag={report.max_start_lag_seconds:.1f}s, "
+            f"pool_wait={report.avg_pool_wait_ms:.1f}ms, db_latency={report.avg_db_latency_ms:.1f}ms, "
+            f"concurrency={report.min_concurrency}..{report.final_concurrency})"
+        )
+
+        return report
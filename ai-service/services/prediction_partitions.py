@@ -0,0 +1,97 @@
+import logging
+import os
+from datetime import date, datetime
+from typing import List, Optional
+
+import asyncpg
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Bu ay dahil kaç ay ilerisi için bölüm hazır tutulur (tahminler en fazla 90 gün ileriye yazılır)
+PREDICTION_PARTITION_MONTHS_AHEAD = int(os.getenv("PREDICTION_PARTITION_MONTHS_AHEAD", 4))
+# Bitişi bu kadar ay önceye düşen bölümler günlük özete indirgenip silinir (en az 3)
+PREDICTION_RETENTION_MONTHS = int(os.getenv("PREDICTION_RETENTION_MONTHS", 6))
+
+
+class RolledUpPartition(BaseModel):
+    """Özete indirgenip silinen bir aylık bölüm"""
+    partition_name: str
+    range_start: date
+    rows_summarized: int
+
+
+class PartitionMaintenanceReport(BaseModel):
+    """Bir bölüm bakımı çalışmasının özeti"""
+    months_ahead: int
+    retention_months: int
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    partitions_created: int = 0
+    default_rows: int = 0
+    rolled_up: List[RolledUpPartition] = []
+
+
+class PredictionPartitionMaintainer:
+    """
+    cash_flow_predictions aylık bölümlerinin bakımı
+
+    - Bu ay ve sonraki `months_ahead` ay için bölümler oluşturulur; upsert yalnızca tahmin
+      gününün düştüğü (güncel) bölümün seri anahtarına dokunur
+    - Saklama süresini geçen bölümler factors/recommendations olmadan
+      cash_flow_prediction_daily_summaries tablosuna seri-gün başına tek satır olarak yazılır,
+      ardından ayrılıp silinir (tek işlem)
+    - Aylık bölümü olmayan günler varsayılan bölüme (cash_flow_predictions_default) düşer;
+      ensure oluşturduğu ayın satırlarını oradan taşır, kalan satırlar için uyarı loglanır
+    - DDL migration'daki ensure_/roll_up_cash_flow_prediction_partitions fonksiyonlarındadır
+    """
+
+    def __init__(
+        self,
+        db_pool: asyncpg.Pool,
+        months_ahead: int = PREDICTION_PARTITION_MONTHS_AHEAD,
+        retention_months: int = PREDICTION_RETENTION_MONTHS
+    ):
+        self.db = db_pool
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+
+    async def run(self) -> PartitionMaintenanceReport:
+        """Gelecek bölümleri oluştur, süresi dolanları özete indir"""
+
+        report = PartitionMaintenanceReport(
+            months_ahead=self.months_ahead,
+            retention_months=self.retention_months,
+            started_at=datetime.now()
+        )
+
+        report.partitions_created = await self.db.fetchval("""
+            SELECT public.ensure_cash_flow_prediction_partitions($1)
+        """, self.months_ahead)
+
+        rows = await self.db.fetch("""
+            SELECT partition_name, range_start, rows_summarized
+            FROM public.roll_up_cash_flow_prediction_partitions($1)
+        """, self.retention_months)
+
+        report.rolled_up = [RolledUpPartition(**dict(row)) for row in rows]
+
+        # Varsayılan bölüm normalde boştur; satır varsa bakım ayları kapsamıyor demektir
+        report.default_rows = await self.db.fetchval("""
+            SELECT COUNT(*) FROM public.cash_flow_predictions_default
+        """)
+        report.finished_at = datetime.now()
+
+        if report.default_rows:
+            logger.warning(
+                f"Prediction partitions: {report.default_rows} rows in cash_flow_predictions_default "
+                f"(no monthly partition; check PREDICTION_PARTITION_MONTHS_AHEAD)"
+            )
+
+        logger.info(
+            f"Prediction partitions: {report.partitions_created} created, "
+            f"{len(report.rolled_up)} rolled up "
+            f"({sum(p.rows_summarized for p in report.rolled_up)} rows summarized)"
+        )
+
+        return report
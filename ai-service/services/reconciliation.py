@@ -0,0 +1,281 @@
+import logging
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+import asyncpg
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class ReconciliationReport(BaseModel):
+    """Bir mutabakat çalışmasının özeti"""
+    job_name: str
+    from_date: date
+    to_date: date
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    tenants: int = 0
+    rows_reconciled: int = 0
+
+
+def accuracy_scores(predicted: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    """Gün bazında doğruluk (%): 100 - göreli hata, 0-100 aralığında"""
+
+    scale = np.maximum(np.maximum(np.abs(actual), np.abs(predicted)), 1.0)
+
+    return np.clip(100.0 - 100.0 * np.abs(predicted - actual) / scale, 0.0, 100.0)
+
+
+class PredictionReconciler:
+    """
+    Geçmiş tahmin günlerini gerçekleşen bakiyeyle toplu olarak eşleştirir
+
+    - Filigran (watermark) sonrası, dünü de kapsayan tahmin günleri işlenir
+    - Tenant grupları için temizlenmiş işlemler gün bazında tek sorguda toplanır; filigrandan
+      önceki geçmiş tek bir açılış satırına indirgenir
+    - Gerçekleşen bakiye kümülatif toplam + merge_asof ile vektörel hesaplanır
+    - actual_balance / accuracy_score tek bir UPDATE ... FROM unnest(...) ile yazılır
+    - Etkilenen tenant'ların doğruluk özetleri (ai_accuracy_rollups) küme tabanlı yenilenir
+    """
+
+    def __init__(
+        self,
+        db_pool: asyncpg.Pool,
+        job_name: str = 'prediction_accuracy',
+        tenant_batch_size: int = 200,
+        max_lookback_days: int = 365
+    ):
+        self.db = db_pool
+        self.job_name = job_name
+        self.tenant_batch_size = tenant_batch_size
+        self.max_lookback_days = max_lookback_days
+
+    async def run(self) -> ReconciliationReport:
+        """Filigrandan düne kadar olan tahmin günlerini mutabakatla"""
+
+        to_date = date.today() - timedelta(days=1)
+        watermark = await self.db.fetchval("""
+            SELECT watermark FROM public.ai_reconciliation_state WHERE job_name = $1
+        """, self.job_name)
+
+        from_date = watermark or (to_date - timedelta(days=self.max_lookback_days))
+
+        report = ReconciliationReport(
+            job_name=self.job_name,
+            from_date=from_date,
+            to_date=to_date,
+            started_at=datetime.now()
+        )
+
+        if from_date >= to_date:
+            report.finished_at = datetime.now()
+            return report
+
+        tenants = await self.db.fetch("""
+            SELECT DISTINCT tenant_id
+            FROM public.cash_flow_predictions
+            WHERE prediction_date > $1
+            AND prediction_date <= $2
+            AND actual_balance IS NULL
+        """, from_date, to_date)
+
+        tenant_ids = [str(row['tenant_id']) for row in tenants]
+        report.tenants = len(tenant_ids)
+
+        for start in range(0, len(tenant_ids), self.tenant_batch_size):
+            batch = tenant_ids[start:start + self.tenant_batch_size]
+            report.rows_reconciled += await self._reconcile_batch(batch, from_date, to_date)
+            await self.refresh_rollups(batch)
+
+        await self.db.execute("""
+            INSERT INTO public.ai_reconciliation_state (job_name, watermark, rows_reconciled, updated_at)
+            VALUES ($1, $2, $3, NOW())
+            ON CONFLICT (job_name)
+            DO UPDATE SET
+                watermark = EXCLUDED.watermark,
+                rows_reconciled = ai_reconciliation_state.rows_reconciled + EXCLUDED.rows_reconciled,
+                updated_at = NOW()
+        """, self.job_name, to_date, report.rows_reconciled)
+
+        report.finished_at = datetime.now()
+
+        logger.info(
+            f"Reconciliation {from_date} -> {to_date}: "
+            f"{report.rows_reconciled} predictions, {report.tenants} tenants"
+        )
+
+        return report
+
+    async def _reconcile_batch(self, tenant_ids: List[str], from_date: date, to_date: date) -> int:
+        """Tenant grubunun bekleyen tahmin günlerini hesapla ve toplu yaz"""
+
+        targets = await self.db.fetch("""
+            SELECT id, tenant_id, branch_id, prediction_date, predicted_balance
+            FROM public.cash_flow_predictions
+            WHERE tenant_id = ANY($1::uuid[])
+            AND prediction_date > $2
+            AND prediction_date <= $3
+            AND actual_balance IS NULL
+        """, tenant_ids, from_date, to_date)
+
+        if not targets:
+            return 0
+
+        flows = await self.db.fetch("""
+            SELECT
+                tenant_id,
+                branch_id,
+                GREATEST(COALESCE(actual_date, expected_date)::date, $2::date) as day,
+                SUM(CASE
+                    WHEN type = 'inflow' THEN amount
+                    WHEN type = 'outflow' THEN -amount
+                    ELSE 0
+                END) as net
+            FROM public.cash_flow
+            WHERE tenant_id = ANY($1::uuid[])
+            AND status = 'cleared'
+            AND COALESCE(actual_date, expected_date)::date <= $3
+            GROUP BY 1, 2, 3
+        """, tenant_ids, from_date, to_date)
+
+        targets_df = pd.DataFrame(
+            [dict(row) for row in targets],
+            columns=['id', 'tenant_id', 'branch_id', 'prediction_date', 'predicted_balance']
+        )
+        targets_df['series'] = self._series_key(targets_df)
+        targets_df['day'] = pd.to_datetime(targets_df['prediction_date'])
+
+        flows_df = pd.DataFrame(
+            [dict(row) for row in flows],
+            columns=['tenant_id', 'branch_id', 'day', 'net']
+        )
+        flows_df['net'] = flows_df['net'].astype(float)
+
+        # Şube tahminleri kendi şubesinin, şubesiz tahminler tenant'ın tüm işlemlerinin bakiyesiyle eşleşir
+        tenant_flows = flows_df.groupby(['tenant_id', 'day'], as_index=False)['net'].sum()
+        tenant_flows['series'] = tenant_flows['tenant_id'].astype(str) + ':-'
+
+        branch_flows = flows_df[flows_df['branch_id'].notna()].copy()
+        branch_flows['series'] = self._series_key(branch_flows)
+
+        series = pd.concat(
+            [tenant_flows[['series', 'day', 'net']], branch_flows[['series', 'day', 'net']]],
+            ignore_index=True
+        )
+        series['day'] = pd.to_datetime(series['day'])
+        series = series.sort_values(['series', 'day'])
+        series['balance'] = series.groupby('series')['net'].cumsum()
+
+        matched = pd.merge_asof(
+            targets_df.sort_values('day'),
+            series[['series', 'day', 'balance']].sort_values('day'),
+            on='day',
+            by='series',
+            direction='backward'
+        )
+
+        actual = matched['balance'].fillna(0.0).to_numpy(dtype=float)
+        predicted = matched['predicted_balance'].astype(float).to_numpy()
+        scores = accuracy_scores(predicted, actual)
+
+        # Tablo prediction_date ile bölümlüdür: tarih aralığı yalnızca pencerenin bölümlerini tarar
+        result = await self.db.execute("""
+            UPDATE public.cash_flow_predictions p
+            SET actual_balance = u.actual_balance,
+                accuracy_score = u.accuracy_score,
+                updated_at = NOW()
+            FROM unnest($1::uuid[], $2::date[], $3::float8[], $4::float8[])
+                AS u(id, prediction_date, actual_balance, accuracy_score)
+            WHERE p.id = u.id
+            AND p.prediction_date = u.prediction_date
+            AND p.prediction_date > $5
+            AND p.prediction_date <= $6
+        """,
+            matched['id'].tolist(),
+            matched['prediction_date'].tolist(),
+            np.round(actual, 2).tolist(),
+            np.round(scores, 2).tolist(),
+            from_date,
+            to_date
+        )
+
+        return int(result.split()[-1])
+
+    @staticmethod
+    def _series_key(df: pd.DataFrame) -> pd.Series:
+        return df['tenant_id'].astype(str) + ':' + df['branch_id'].map(lambda b: str(b) if b is not None and not pd.isna(b) else '-')
+
+    async def refresh_rollups(self, tenant_ids: List[str]):
+        """
+        Tenant/şube bazında doğruluk özetini yenile (gerçekçi senaryo)
+
+        7/30/90 günlük ortalama doğruluk, 30 günlük p50/p90 mutlak hata ve son 30 günün
+        tahmin/gerçekleşen değerleri; model metrik sütunlarına dokunulmaz (eğitimde yazılır).
+        """
+
+        if not tenant_ids:
+            return
+
+        await self.db.execute("""
+            INSERT INTO public.ai_accuracy_rollups
+            (tenant_id, branch_id, reconciled_days, mean_accuracy_7d, mean_accuracy_30d, mean_accuracy_90d,
+             mean_abs_error_30d, p50_abs_error_30d, p90_abs_error_30d, last_reconciled_date,
+             recent_predictions, updated_at)
+            SELECT
+                tenant_id,
+                branch_id,
+                COUNT(*) FILTER (WHERE prediction_date > CURRENT_DATE - 30),
+                AVG(accuracy_score) FILTER (WHERE prediction_date > CURRENT_DATE - 7),
+                AVG(accuracy_score) FILTER (WHERE prediction_date > CURRENT_DATE - 30),
+                AVG(accuracy_score),
+                AVG(abs_error) FILTER (WHERE prediction_date > CURRENT_DATE - 30),
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY abs_error)
+                    FILTER (WHERE prediction_date > CURRENT_DATE - 30),
+                percentile_cont(0.9) WITHIN GROUP (ORDER BY abs_error)
+                    FILTER (WHERE prediction_date > CURRENT_DATE - 30),
+                MAX(prediction_date),
+                COALESCE(
+                    jsonb_agg(
+                        jsonb_build_object(
+                            'prediction_date', prediction_date,
+                            'predicted_balance', predicted_balance,
+                            'actual_balance', actual_balance,
+                            'accuracy_score', accuracy_score
+                        )
+                        ORDER BY prediction_date DESC
+                    ) FILTER (WHERE prediction_date > CURRENT_DATE - 30),
+                    '[]'::jsonb
+                ),
+                NOW()
+            FROM (
+                SELECT
+                    tenant_id,
+                    branch_id,
+                    prediction_date,
+                    predicted_balance,
+                    actual_balance,
+                    accuracy_score,
+                    ABS(predicted_balance - actual_balance) as abs_error
+                FROM public.cash_flow_predictions
+                WHERE tenant_id = ANY($1::uuid[])
+                AND scenario_type = 'realistic'
+                AND actual_balance IS NOT NULL
+                AND prediction_date > CURRENT_DATE - 90
+            ) reconciled
+            GROUP BY tenant_id, branch_id
+            ON CONFLICT (tenant_id, branch_id)
+            DO UPDATE SET
+                reconciled_days = EXCLUDED.reconciled_days,
+                mean_accuracy_7d = EXCLUDED.mean_accuracy_7d,
+                mean_accuracy_30d = EXCLUDED.mean_accuracy_30d,
+                mean_accuracy_90d = EXCLUDED.mean_accuracy_90d,
+                mean_abs_error_30d = EXCLUDED.mean_abs_error_30d,
+                p50_abs_error_30d = EXCLUDED.p50_abs_error_30d,
+                p90_abs_error_30d = EXCLUDED.p90_abs_error_30d,
+                last_reconciled_date = EXCLUDED.last_reconciled_date,
+                recent_predictions = EXCLUDED.recent_predictions,
+                updated_at = NOW()
+        """, tenant_ids)
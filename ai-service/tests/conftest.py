@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Testler ai-service dizininden bağımsız çalışır (servis modülleri `services.` ile içe aktarılır)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from services.backtest import OPEN_DAY, backtest_matrices
+
+
+def backtest_loop(created, expected, landing, cleared, signed_amount, weighted, opening_balance, n_as_of, horizon):
+    """Her as-of günü ve ufuk için tanımdan: B(d) ve D günü başındaki bekleyen küme"""
+
+    def balance(day):
+        return opening_balance + sum(signed_amount[i] for i in range(len(created)) if cleared[i] <= day)
+
+    predicted = np.zeros((n_as_of, horizon))
+    actual = np.zeros((n_as_of, horizon))
+
+    for as_of in range(n_as_of):
+        for ahead in range(horizon):
+            total = balance(as_of - 1)
+            for i in range(len(created)):
+                if (
+                    created[i] < as_of <= cleared[i]
+                    and as_of <= landing[i] <= as_of + ahead
+                    and expected[i] <= as_of + horizon
+                ):
+                    total += weighted[i]
+
+            predicted[as_of, ahead] = total
+            actual[as_of, ahead] = balance(as_of + ahead)
+
+    return predicted, actual
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_backtest_matrices_matches_loop(seed):
+    rng = np.random.default_rng(seed)
+    n_records, n_as_of, horizon = 120, 15, 6
+
+    created = rng.integers(-10, n_as_of + horizon, n_records)
+    expected = created + rng.integers(0, 15, n_records)
+    landing = expected + rng.integers(-3, 8, n_records)
+    cleared = np.where(rng.random(n_records) < 0.8, landing + rng.integers(-2, 5, n_records), OPEN_DAY)
+    signed_amount = rng.uniform(-5000, 5000, n_records)
+    weighted = signed_amount * rng.uniform(0.05, 1.0, n_records)
+    args = (created, expected, landing, cleared, signed_amount, weighted, 2500.0, n_as_of, horizon)
+
+    predicted, actual = backtest_matrices(*args)
+    expected_predicted, expected_actual = backtest_loop(*args)
+
+    np.testing.assert_allclose(predicted, expected_predicted, rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(actual, expected_actual, rtol=1e-9, atol=1e-6)
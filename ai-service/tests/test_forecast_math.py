@@ -0,0 +1,187 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from services.ai_agent import forecast_math
+
+
+def random_groups(rng: np.random.Generator, n_groups: int, n_days: int):
+    return {
+        'base_day': rng.integers(-5, n_days + 5, n_groups),
+        'is_inflow': rng.random(n_groups) < 0.5,
+        'amount': rng.uniform(10, 50000, n_groups),
+        'raw_confidence': rng.choice([0.3, 0.6, 0.85, 1.0], n_groups),
+        'transactions': rng.integers(1, 20, n_groups).astype(float),
+        'overdue_count': rng.integers(0, 3, n_groups).astype(float),
+        'overdue_amount': rng.uniform(0, 5000, n_groups)
+    }
+
+
+def scenario_flows_loop(groups, inflow_factors, outflow_factors, delay_days, n_days):
+    flows = {key: np.zeros((len(inflow_factors), n_days)) for key in forecast_math.FLOW_KEYS}
+
+    for s in range(len(inflow_factors)):
+        for g in range(len(groups['base_day'])):
+            inflow = groups['is_inflow'][g]
+            day = groups['base_day'][g] + (delay_days[s] if inflow else 0)
+            if not 0 <= day < n_days:
+                continue
+
+            factor = inflow_factors[s] if inflow else outflow_factors[s]
+            weighted = groups['amount'][g] * min(max(groups['raw_confidence'][g] * factor, 0.05), 1.0)
+
+            flows['inflow' if inflow else 'outflow'][s, day] += weighted
+            flows['transactions'][s, day] += groups['transactions'][g]
+            if inflow:
+                flows['overdue_inflow_count'][s, day] += groups['overdue_count'][g]
+                flows['overdue_inflow_amount'][s, day] += groups['overdue_amount'][g]
+
+    return flows
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_scenario_flows_matches_loop(seed):
+    rng = np.random.default_rng(seed)
+    n_days = 30
+    groups = random_groups(rng, 200, n_days)
+    inflow_factors = rng.uniform(0.5, 1.5, 12)
+    outflow_factors = rng.uniform(0.5, 1.5, 12)
+    delay_days = rng.integers(-10, 10, 12)
+
+    flows = forecast_math.scenario_flows(
+        groups['base_day'], groups['is_inflow'], groups['amount'], groups['raw_confidence'],
+        groups['transactions'], groups['overdue_count'], groups['overdue_amount'],
+        inflow_factors, outflow_factors, delay_days, n_days
+    )
+    expected = scenario_flows_loop(groups, inflow_factors, outflow_factors, delay_days, n_days)
+
+    for key in forecast_math.FLOW_KEYS:
+        np.testing.assert_allclose(flows[key], expected[key], rtol=1e-12, atol=1e-6)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_collapse_groups_matches_loop(seed):
+    rng = np.random.default_rng(seed)
+    groups = random_groups(rng, 300, 20)
+    values = {key: groups[key] for key in ('amount', 'transactions', 'overdue_count', 'overdue_amount')}
+
+    base_day, is_inflow, raw_confidence, collapsed = forecast_math.collapse_groups(
+        groups['base_day'], groups['is_inflow'], groups['raw_confidence'], values
+    )
+
+    expected = {}
+    for g in range(len(groups['base_day'])):
+        key = (int(groups['base_day'][g]), bool(groups['is_inflow'][g]), float(groups['raw_confidence'][g]))
+        sums = expected.setdefault(key, dict.fromkeys(values, 0.0))
+        for name, array in values.items():
+            sums[name] += array[g]
+
+    assert len(base_day) == len(expected)
+    for i, key in enumerate(zip(base_day.tolist(), is_inflow.tolist(), raw_confidence.tolist())):
+        for name in values:
+            assert collapsed[name][i] == pytest.approx(expected[key][name], rel=1e-12)
+
+    # Birleştirme senaryo sonucunu değiştirmez
+    inflow_factors, outflow_factors, delay_days = np.array([0.8, 1.2]), np.array([1.1, 0.9]), np.array([7, -3])
+    original = forecast_math.scenario_flows(
+        groups['base_day'], groups['is_inflow'], groups['amount'], groups['raw_confidence'],
+        groups['transactions'], groups['overdue_count'], groups['overdue_amount'],
+        inflow_factors, outflow_factors, delay_days, 20
+    )
+    merged = forecast_math.scenario_flows(
+        base_day, is_inflow, collapsed['amount'], raw_confidence,
+        collapsed['transactions'], collapsed['overdue_count'], collapsed['overdue_amount'],
+        inflow_factors, outflow_factors, delay_days, 20
+    )
+    for key in forecast_math.FLOW_KEYS:
+        np.testing.assert_allclose(merged[key], original[key], rtol=1e-12, atol=1e-6)
+
+
+def monte_carlo_loop(expected_day, predicted_delay, signed_amount, transactions, offsets, start_balance,
+                     n_days, n_paths, max_delay, chunk_cells, rng):
+    """İşlem işlem, yol yol; rastgele baytlar vektörel sürümle aynı parçalarla çekilir"""
+
+    items = [
+        (expected_day[g], min(max(predicted_delay[g], -max_delay), max_delay), signed_amount[g] / max(transactions[g], 1))
+        for g in range(len(expected_day))
+        for _ in range(transactions[g])
+    ]
+    chunk = max(1, chunk_cells // max(len(items), 1))
+    balances = []
+
+    for offset in range(0, n_paths, chunk):
+        paths = min(chunk, n_paths - offset)
+        sampled = rng.bytes(paths * len(items))
+
+        for path in range(paths):
+            net = [0.0] * n_days
+            for i, (day, delay, amount) in enumerate(items):
+                error = offsets[sampled[path * len(items) + i] & (len(offsets) - 1)]
+                landing = day + min(max(delay + error, -max_delay), max_delay)
+                if 0 <= landing < n_days:
+                    net[landing] += amount
+
+            balance, path_balances = start_balance, []
+            for value in net:
+                balance += value
+                path_balances.append(balance)
+            balances.append(path_balances)
+
+    return np.array(balances)
+
+
+@pytest.mark.parametrize('chunk_cells', [1, 97, 10 ** 6])
+def test_monte_carlo_balances_matches_loop(chunk_cells):
+    rng = np.random.default_rng(7)
+    n_groups, n_days = 25, 20
+    expected_day = rng.integers(-3, n_days + 3, n_groups)
+    predicted_delay = rng.integers(-20, 20, n_groups)
+    signed_amount = rng.uniform(-20000, 20000, n_groups)
+    transactions = rng.integers(1, 4, n_groups)
+    offsets = np.sort(rng.integers(-6, 7, forecast_math.RESIDUAL_QUANTILE_COUNT)).astype(np.int32)
+    args = (expected_day, predicted_delay, signed_amount, transactions, offsets, 1000.0, n_days, 40, 15, chunk_cells)
+
+    balances = forecast_math.monte_carlo_balances(*args, np.random.default_rng(11))
+    expected = monte_carlo_loop(*args, np.random.default_rng(11))
+
+    np.testing.assert_allclose(balances, expected, rtol=1e-12, atol=1e-6)
+
+
+def test_monte_carlo_without_error_is_deterministic():
+    offsets = np.zeros(forecast_math.RESIDUAL_QUANTILE_COUNT, dtype=np.int32)
+    balances = forecast_math.monte_carlo_balances(
+        np.array([2, 5]), np.array([1, 0]), np.array([300.0, -100.0]), np.array([3, 1]),
+        offsets, 50.0, 8, 5, 10, 1000, np.random.default_rng(0)
+    )
+
+    np.testing.assert_allclose(balances, np.tile([50, 50, 50, 350, 350, 250, 250, 250], (5, 1)))
+
+
+def horizon_buckets_reference(start, n_days, daily_days, weekly_until):
+    """Takvimden: günlük kovalar, `weekly_until` öncesi başlayan haftalar, sonra her ayın ilk günü"""
+
+    starts = list(range(min(daily_days, n_days)))
+    kinds = ['day'] * len(starts)
+
+    day = daily_days
+    while day < min(weekly_until, n_days):
+        starts.append(day)
+        kinds.append('week')
+        day += 7
+
+    if day < n_days:
+        month_starts = [day] + [d for d in range(day + 1, n_days) if (start + timedelta(days=d)).day == 1]
+        starts += month_starts
+        kinds += ['month'] * len(month_starts)
+
+    return starts, kinds
+
+
+@pytest.mark.parametrize('start', [date(2026, 1, 31), date(2026, 2, 1), date(2026, 10, 19), date(2027, 12, 25)])
+@pytest.mark.parametrize('n_days, daily_days, weekly_until', [(365, 30, 90), (120, 14, 60), (45, 30, 90), (400, 0, 0), (200, 60, 30)])
+def test_horizon_buckets_matches_calendar(start, n_days, daily_days, weekly_until):
+    starts, kinds = forecast_math.horizon_buckets(start, n_days, daily_days, weekly_until)
+
+    assert (starts.tolist(), kinds) == horizon_buckets_reference(start, n_days, daily_days, weekly_until)
+    assert starts[0] == 0 and np.all(np.diff(starts) > 0) and starts[-1] < n_days
@@ -0,0 +1,37 @@
+from itertools import combinations, product
+
+from services.job_queue import job_dedupe_key
+
+
+def reference_identity(job_type, tenant_id, branch_id, payload):
+    """Eşdeğerlik tanımı: tür, tenant, şube; tahminde senaryo ve gün sayısı (varsayılanlarıyla)"""
+
+    identity = (job_type, tenant_id, branch_id)
+
+    if job_type == 'forecast':
+        payload = payload or {}
+        identity += (payload.get('scenario', 'realistic'), payload.get('forecast_days', 30))
+
+    return identity
+
+
+def test_dedupe_key_matches_equivalence():
+    payloads = [
+        None,
+        {},
+        {'scenario': 'realistic'},
+        {'forecast_days': 30},
+        {'scenario': 'pessimistic', 'forecast_days': 30},
+        {'scenario': 'realistic', 'forecast_days': 60},
+        {'scenario': 'realistic', 'forecast_days': 30, 'refresh': True}
+    ]
+    jobs = list(product(['train', 'forecast'], ['t1', 't2'], [None, 'b1', 'b2'], payloads))
+
+    for left, right in combinations(jobs, 2):
+        same_key = job_dedupe_key(*left) == job_dedupe_key(*right)
+        assert same_key == (reference_identity(*left) == reference_identity(*right)), (left, right)
+
+
+def test_dedupe_key_defaults_payload():
+    assert job_dedupe_key('forecast', 't1') == job_dedupe_key('forecast', 't1', None, {'scenario': 'realistic'})
+    assert job_dedupe_key('train', 't1', None, {'scenario': 'pessimistic'}) == job_dedupe_key('train', 't1')
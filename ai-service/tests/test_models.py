@@ -0,0 +1,53 @@
+import random
+from datetime import datetime, timedelta
+
+from services.ai_agent.models import ColumnarForecast, PredictionResult
+
+RISK_COLORS = {'low': '#10B981', 'medium': '#F59E0B', 'high': '#EF4444', 'critical': '#DC2626'}
+RECOMMENDATIONS = ['Tahsilatları hızlandırın', 'Ödemeleri erteleyin', 'Kredi limitini kontrol edin', 'Nakit rezervi oluşturun']
+
+
+def random_predictions(rng: random.Random, days: int):
+    start = datetime(2026, 10, 19)
+    predictions = []
+
+    for day in range(days):
+        risk_level = rng.choice(list(RISK_COLORS))
+        factor_keys = rng.sample(['day_inflow', 'day_outflow', 'transaction_count', 'inflow_confidence'], rng.randint(0, 4))
+        predictions.append(PredictionResult(
+            date=start + timedelta(days=day),
+            predicted_balance=rng.uniform(-50000, 150000),
+            confidence_score=rng.random(),
+            risk_level=risk_level,
+            risk_color=RISK_COLORS[risk_level],
+            factors={key: rng.uniform(0, 10000) for key in factor_keys},
+            recommendations=rng.sample(RECOMMENDATIONS, rng.randint(0, 3)),
+            scenario_type='pessimistic'
+        ))
+
+    return predictions
+
+
+def test_columnar_round_trip():
+    rng = random.Random(42)
+
+    for days in (0, 1, 7, 90):
+        predictions = random_predictions(rng, days)
+        columnar = ColumnarForecast.from_predictions(predictions, 'pessimistic')
+
+        assert columnar.scenario_type == 'pessimistic'
+        assert len(set(columnar.recommendation_table)) == len(columnar.recommendation_table)
+
+        for i, prediction in enumerate(predictions):
+            assert columnar.dates[i] == prediction.date
+            assert columnar.predicted_balance[i] == prediction.predicted_balance
+            assert columnar.confidence_score[i] == prediction.confidence_score
+            assert columnar.risk_level[i] == prediction.risk_level
+            assert columnar.risk_colors[prediction.risk_level] == prediction.risk_color
+            assert [columnar.recommendation_table[j] for j in columnar.recommendations[i]] == prediction.recommendations
+
+            # Eksik faktörler 0 ile doldurulur
+            for key, values in columnar.factors.items():
+                assert values[i] == prediction.factors.get(key, 0.0)
+
+        assert set(columnar.factors) == {key for p in predictions for key in p.factors}
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+from services.ai_agent.enhanced_predictor import EnhancedCashFlowAIAgent
+from services.db import create_pool
+from services.job_queue import Job, JobQueue, VISIBILITY_TIMEOUT_SECONDS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Örn. eğitim worker'ı: WORKER_JOB_TYPES=train, tahmin worker'ı: WORKER_JOB_TYPES=forecast
+WORKER_JOB_TYPES = [t.strip() for t in os.getenv("WORKER_JOB_TYPES", "train,forecast").split(",") if t.strip()]
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 1))
+WORKER_POLL_INTERVAL_SECONDS = float(os.getenv("WORKER_POLL_INTERVAL_SECONDS", 2))
+
+
+class CashFlowWorker:
+    """Kuyruktan eğitim ve tahmin işlerini alıp çalıştıran worker"""
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.db_pool = None
+        self.queue = None
+        self.running = True
+
+    async def initialize(self):
+        """Veritabanı bağlantısını başlat"""
+        self.db_pool = await create_pool(min_size=1, max_size=WORKER_CONCURRENCY + 2)
+        self.queue = JobQueue(self.db_pool)
+        logger.info(f"Worker {self.worker_id} ready for job types: {WORKER_JOB_TYPES}")
+
+    async def _heartbeat(self, job: Job):
+        """İş sürerken görünmezlik süresini uzat"""
+        while True:
+            await asyncio.sleep(VISIBILITY_TIMEOUT_SECONDS / 3)
+            if not await self.queue.heartbeat(job, self.worker_id):
+                logger.warning(f"Job {job.id} lease lost")
+                return
+
+    async def _run_train(self, job: Job) -> dict:
+        agent = EnhancedCashFlowAIAgent(self.db_pool)
+        metrics = await agent.train_model(
+            job.tenant_id,
+            job.branch_id,
+            force_retrain=job.payload.get('force_retrain', True)
+        )
+
+        logger.info(
+            f"Tenant {job.tenant_id} trained: "
+            f"Accuracy {metrics.accuracy_score:.2f}%, "
+            f"Data points: {metrics.data_points}"
+        )
+
+        return {'accuracy_score': metrics.accuracy_score, 'data_points': metrics.data_points}
+
+    async def _run_forecast(self, job: Job) -> dict:
+        agent = EnhancedCashFlowAIAgent(self.db_pool)
+
+        # Zamanlayıcının saatlik işi: kayıtlı tüm seriler kendi pencereleriyle
+        if job.payload.get('refresh') and job.branch_id is None:
+            series = await agent.refresh_tenant_forecasts(
+                job.tenant_id,
+                bool(job.payload.get('branches')),
+                forecast_days=job.payload.get('forecast_days', 30)
+            )
+
+            logger.info(f"Tenant {job.tenant_id} predictions updated: {series} series")
+
+            return {'series': series}
+
+        if job.payload.get('branches') and job.branch_id is None:
+            forecast = await agent.predict_branch_fanout(
+                job.tenant_id,
+                forecast_days=job.payload.get('forecast_days', 30),
+                scenario_type=job.payload.get('scenario', 'realistic')
+            )
+            await agent.save_prediction_series(job.tenant_id, forecast.series, forecast.change_watermark)
+
+            logger.info(f"Tenant {job.tenant_id} predictions updated: {len(forecast.series)} series")
+
+            return {'series': len(forecast.series)}
+
+        predictions = await agent.predict_cash_flow(
+            job.tenant_id,
+            forecast_days=job.payload.get('forecast_days', 30),
+            branch_id=job.branch_id,
+            scenario_type=job.payload.get('scenario', 'realistic')
+        )
+
+        await agent.save_predictions(job.tenant_id, job.branch_id, predictions)
+
+        logger.info(f"Tenant {job.tenant_id} predictions updated: {len(predictions)} days")
+
+        return {'days': len(predictions)}
+
+    async def _execute(self, job: Job):
+        """Tek işi çalıştır ve sonucunu kuyruğa yaz"""
+
+        if job.attempts > job.max_attempts:
+            await self.queue.fail(job, self.worker_id, "max attempts exceeded (visibility timeout)")
+            return
+
+        handlers = {
+            'train': self._run_train,
+            'forecast': self._run_forecast
+        }
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+
+        try:
+            result = await handlers[job.job_type](job)
+            await self.queue.complete(job, self.worker_id, result)
+
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.job_type}) failed: {str(e)}", exc_info=True)
+            await self.queue.fail(job, self.worker_id, str(e))
+
+        finally:
+            heartbeat.cancel()
+
+    async def run(self):
+        """İş döngüsü"""
+
+        active = set()
+
+        while self.running:
+            free_slots = WORKER_CONCURRENCY - len(active)
+
+            jobs = []
+            if free_slots > 0:
+                try:
+                    jobs = await self.queue.claim(self.worker_id, WORKER_JOB_TYPES, free_slots)
+                except Exception as e:
+                    logger.error(f"Job claim error: {str(e)}")
+
+            for job in jobs:
+                active.add(asyncio.create_task(self._execute(job)))
+
+            if jobs:
+                continue
+
+            if active:
+                _, active = await asyncio.wait(
+                    active,
+                    timeout=WORKER_POLL_INTERVAL_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+            else:
+                await asyncio.sleep(WORKER_POLL_INTERVAL_SECONDS)
+
+        if active:
+            await asyncio.wait(active)
+
+    async def stop(self):
+        """Worker'ı durdur"""
+        self.running = False
+
+        if self.db_pool:
+            await self.db_pool.close()
+
+        logger.info(f"Worker {self.worker_id} stopped")
+
+
+async def main():
+    """Ana fonksiyon"""
+    worker = CashFlowWorker()
+    await worker.initialize()
+
+    try:
+        await worker.run()
+    except (KeyboardInterrupt, SystemExit):
+        await worker.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
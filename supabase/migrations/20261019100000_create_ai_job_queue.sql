@@ -0,0 +1,46 @@
+/*
+  # AI Service Job Queue
+
+  Durable job queue for the ai-service. The API and the scheduler enqueue
+  training/forecast jobs; worker processes claim them with
+  SELECT ... FOR UPDATE SKIP LOCKED.
+
+  1. New Tables: ai_jobs
+  2. Claiming: status = 'queued' and run_after <= now(), or status = 'running'
+     with an expired locked_until (visibility timeout)
+  3. Dedupe: one queued/running job per dedupe_key
+  4. Security: RLS enabled, service role only
+*/
+
+CREATE TABLE IF NOT EXISTS public.ai_jobs (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  job_type text NOT NULL CHECK (job_type IN ('train', 'forecast')),
+  tenant_id uuid NOT NULL,
+  branch_id uuid,
+  payload jsonb NOT NULL DEFAULT '{}'::jsonb,
+  priority int NOT NULL DEFAULT 0,
+  status text NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done', 'dead')),
+  attempts int NOT NULL DEFAULT 0,
+  max_attempts int NOT NULL DEFAULT 3,
+  run_after timestamptz NOT NULL DEFAULT now(),
+  locked_by text,
+  locked_until timestamptz,
+  dedupe_key text NOT NULL,
+  last_error text,
+  result jsonb,
+  started_at timestamptz,
+  finished_at timestamptz,
+  created_at timestamptz DEFAULT now(),
+  updated_at timestamptz DEFAULT now()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ai_jobs_dedupe_active ON public.ai_jobs(dedupe_key) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS idx_ai_jobs_ready ON public.ai_jobs(job_type, priority DESC, run_after) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_ai_jobs_expired ON public.ai_jobs(job_type, locked_until) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_ai_jobs_finished ON public.ai_jobs(finished_at) WHERE status IN ('done', 'dead');
+CREATE INDEX IF NOT EXISTS idx_ai_jobs_tenant ON public.ai_jobs(tenant_id, created_at DESC);
+ALTER TABLE public.ai_jobs ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Service role can manage ai jobs" ON public.ai_jobs;
+
+CREATE POLICY "Service role can manage ai jobs" ON public.ai_jobs FOR ALL TO service_role USING (true) WITH CHECK (true);
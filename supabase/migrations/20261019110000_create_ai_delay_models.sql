@@ -0,0 +1,33 @@
+/*
+  # Persisted Delay Models
+
+  Fitted payment-delay regressors produced by the ai-service train_model,
+  stored so forecasts (API, workers) can load a tenant's model once instead
+  of retraining or keeping it only in the training process.
+
+  1. New Tables: ai_delay_models (one row per model_key, e.g. 'tenant:<tenant_id>:<branch_id|->')
+  2. Security: RLS enabled, service role only
+*/
+
+CREATE TABLE IF NOT EXISTS public.ai_delay_models (
+  model_key text PRIMARY KEY,
+  tenant_id uuid,
+  branch_id uuid,
+  model_version text NOT NULL,
+  feature_columns jsonb NOT NULL DEFAULT '[]'::jsonb,
+  model_blob bytea NOT NULL,
+  blob_bytes int NOT NULL,
+  accuracy_score numeric(5,2),
+  mae numeric(10,2),
+  data_points int NOT NULL DEFAULT 0,
+  trained_at timestamptz NOT NULL,
+  created_at timestamptz DEFAULT now(),
+  updated_at timestamptz DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_ai_delay_models_tenant ON public.ai_delay_models(tenant_id, branch_id);
+ALTER TABLE public.ai_delay_models ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Service role can manage delay models" ON public.ai_delay_models;
+
+CREATE POLICY "Service role can manage delay models" ON public.ai_delay_models FOR ALL TO service_role USING (true) WITH CHECK (true);
@@ -0,0 +1,34 @@
+/*
+  # Retraining Decisions
+
+  Nightly retraining is decided per tenant from cheap signals (new cleared
+  rows since the last fit, rolling MAE of recent predictions, model age).
+  Every decision and its reason is recorded here so skipped and triggered
+  retrains can be audited.
+
+  1. New Tables: ai_retrain_decisions
+  2. Security: RLS enabled, service role only
+*/
+
+CREATE TABLE IF NOT EXISTS public.ai_retrain_decisions (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  tenant_id uuid NOT NULL,
+  branch_id uuid,
+  decided_at timestamptz NOT NULL DEFAULT now(),
+  retrain boolean NOT NULL,
+  reason text NOT NULL CHECK (reason IN ('no_model', 'model_age', 'new_rows', 'mae_drift', 'stable', 'policy_error')),
+  total_rows int NOT NULL DEFAULT 0,
+  new_rows int NOT NULL DEFAULT 0,
+  model_age_days numeric(8,2),
+  baseline_mae numeric(10,2),
+  rolling_mae numeric(10,2),
+  created_at timestamptz DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_ai_retrain_decisions_tenant ON public.ai_retrain_decisions(tenant_id, decided_at DESC);
+CREATE INDEX IF NOT EXISTS idx_ai_retrain_decisions_retrain ON public.ai_retrain_decisions(tenant_id, decided_at DESC) WHERE retrain = true;
+ALTER TABLE public.ai_retrain_decisions ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Service role can manage retrain decisions" ON public.ai_retrain_decisions;
+
+CREATE POLICY "Service role can manage retrain decisions" ON public.ai_retrain_decisions FOR ALL TO service_role USING (true) WITH CHECK (true);
@@ -0,0 +1,18 @@
+/*
+  # Training Sample Ratio on Model Metrics
+
+  Large tenants are trained on a bounded, stratified sample of their cleared
+  history. sampling_ratio records the sampled share (1.0 = full history) so
+  accuracy of sampled and full-data trainings can be compared.
+*/
+
+DO $$ BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public'
+        AND table_name = 'ai_model_metrics'
+        AND column_name = 'sampling_ratio'
+    ) THEN
+        ALTER TABLE public.ai_model_metrics ADD COLUMN sampling_ratio numeric(6,5) NOT NULL DEFAULT 1.0;
+    END IF;
+END $$;
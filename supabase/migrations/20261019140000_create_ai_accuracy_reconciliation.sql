@@ -0,0 +1,51 @@
+/*
+  # Prediction Accuracy Reconciliation
+
+  The ai-service reconciliation job fills cash_flow_predictions.actual_balance
+  and accuracy_score for past prediction dates from cleared cash_flow rows,
+  in bulk and incrementally from a watermark, and keeps rolling accuracy per
+  tenant and branch.
+
+  1. New Tables:
+     - ai_reconciliation_state: watermark per job (last fully reconciled date)
+     - ai_accuracy_rollups: rolling accuracy per tenant/branch (branch_id NULL = all branches)
+  2. Indexes: pending (unreconciled) predictions by date
+  3. Security: RLS enabled, service role manages, tenants read their own rollups
+*/
+
+CREATE TABLE IF NOT EXISTS public.ai_reconciliation_state (
+  job_name text PRIMARY KEY,
+  watermark date NOT NULL,
+  rows_reconciled bigint NOT NULL DEFAULT 0,
+  updated_at timestamptz DEFAULT now()
+);
+
+ALTER TABLE public.ai_reconciliation_state ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Service role can manage reconciliation state" ON public.ai_reconciliation_state;
+
+CREATE POLICY "Service role can manage reconciliation state" ON public.ai_reconciliation_state FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+CREATE TABLE IF NOT EXISTS public.ai_accuracy_rollups (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  tenant_id uuid NOT NULL,
+  branch_id uuid,
+  reconciled_days int NOT NULL DEFAULT 0,
+  mean_accuracy_30d numeric(5,2),
+  mean_abs_error_30d numeric(15,2),
+  last_reconciled_date date,
+  updated_at timestamptz DEFAULT now(),
+  CONSTRAINT ai_accuracy_rollups_tenant_branch_key UNIQUE NULLS NOT DISTINCT (tenant_id, branch_id)
+);
+
+ALTER TABLE public.ai_accuracy_rollups ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view own tenant accuracy rollups" ON public.ai_accuracy_rollups;
+DROP POLICY IF EXISTS "Service role can manage accuracy rollups" ON public.ai_accuracy_rollups;
+
+CREATE POLICY "Users can view own tenant accuracy rollups" ON public.ai_accuracy_rollups
+  FOR SELECT TO authenticated
+  USING (tenant_id = (SELECT (auth.jwt()->>'tenant_id')::uuid));
+CREATE POLICY "Service role can manage accuracy rollups" ON public.ai_accuracy_rollups FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+CREATE INDEX IF NOT EXISTS idx_cash_flow_predictions_unreconciled ON public.cash_flow_predictions(prediction_date, tenant_id) WHERE actual_balance IS NULL;
@@ -0,0 +1,37 @@
+/*
+  # Rolling Accuracy Summaries for the Accuracy Endpoint
+
+  Extends ai_accuracy_rollups so /api/ai/cash-flow/accuracy is served by a
+  single indexed lookup instead of scanning ai_model_metrics and
+  cash_flow_predictions on every call.
+
+  1. New Columns (reconciliation job): 7/90-day mean accuracy, p50/p90
+     absolute balance error over 30 days, last 30 reconciled days as jsonb
+  2. New Columns (model training): latest model metrics
+  3. Backfill: latest cash-flow delay model row (model_type 'cash_flow_delay') per
+     tenant/branch; other model types share ai_model_metrics and are skipped
+*/
+
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS mean_accuracy_7d numeric(5,2);
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS mean_accuracy_90d numeric(5,2);
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS p50_abs_error_30d numeric(15,2);
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS p90_abs_error_30d numeric(15,2);
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS recent_predictions jsonb NOT NULL DEFAULT '[]'::jsonb;
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS model_accuracy_score numeric(5,2);
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS model_mae numeric(10,2);
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS model_rmse numeric(10,2);
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS model_training_date timestamptz;
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS model_data_points int;
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS model_version text;
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS model_sampling_ratio numeric(6,5);
+
+INSERT INTO public.ai_accuracy_rollups
+  (tenant_id, branch_id, model_accuracy_score, model_mae, model_rmse, model_training_date,
+   model_data_points, model_version, model_sampling_ratio, updated_at)
+SELECT DISTINCT ON (tenant_id, branch_id)
+  tenant_id, branch_id, accuracy_score, mae, rmse, training_date,
+  data_points, model_version, sampling_ratio, now()
+FROM public.ai_model_metrics
+WHERE model_type = 'cash_flow_delay'
+ORDER BY tenant_id, branch_id, training_date DESC
+ON CONFLICT (tenant_id, branch_id) DO NOTHING;
@@ -0,0 +1,57 @@
+/*
+  # Partial / Covering Indexes for cash_flow Hot Queries
+
+  The AI service filters cash_flow by tenant_id, optional branch_id, status and
+  expected_date / actual_date / created_at. Queries are emitted in separate
+  tenant-only and tenant+branch variants (services/ai_agent/queries.py), so each
+  variant can use a matching partial index:
+
+  1. idx_cash_flow_pending_tenant_expected
+     Pending forecast inputs (rows / aggregate / rule simulation), tenant scope.
+  2. idx_cash_flow_pending_branch_expected
+     Same for branch scope.
+  3. idx_cash_flow_cleared_tenant_created
+     Training history and tenant profile (cleared, actual_date set, last 12 months), tenant scope.
+  4. idx_cash_flow_cleared_branch_created
+     Same for branch scope.
+  5. idx_cash_flow_cleared_tenant_actual
+     Current balance, recent delay MAE, retrain new-row counts and reconciliation.
+
+  INCLUDE columns let the aggregate queries run as index-only scans after VACUUM.
+
+  Indexes are built CONCURRENTLY so cash_flow keeps accepting writes during the
+  build. CREATE INDEX CONCURRENTLY cannot run inside a transaction or DO block, so
+  this file holds only top-level statements and must be applied one statement at a
+  time (no wrapping BEGIN/COMMIT). public.cash_flow must already exist. If a build
+  is interrupted, drop the INVALID index (DROP INDEX CONCURRENTLY ...) and re-run;
+  IF NOT EXISTS does not replace an invalid index.
+
+  benchmarks/explain_harness.py checks that the service queries keep using these
+  indexes; its baseline (benchmarks/explain_baseline.json) is generated against a
+  local Postgres with --update-baseline.
+*/
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cash_flow_pending_tenant_expected
+ON public.cash_flow (tenant_id, expected_date)
+INCLUDE (branch_id, type, amount, source_module, status, ai_confidence_score)
+WHERE status IN ('pending', 'partial', 'overdue');
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cash_flow_pending_branch_expected
+ON public.cash_flow (tenant_id, branch_id, expected_date)
+INCLUDE (type, amount, source_module, status, ai_confidence_score)
+WHERE status IN ('pending', 'partial', 'overdue') AND branch_id IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cash_flow_cleared_tenant_created
+ON public.cash_flow (tenant_id, created_at)
+INCLUDE (branch_id, type, amount, source_module, expected_date, actual_date)
+WHERE status = 'cleared' AND actual_date IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cash_flow_cleared_branch_created
+ON public.cash_flow (tenant_id, branch_id, created_at)
+INCLUDE (type, amount, source_module, expected_date, actual_date)
+WHERE status = 'cleared' AND actual_date IS NOT NULL AND branch_id IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cash_flow_cleared_tenant_actual
+ON public.cash_flow (tenant_id, actual_date)
+INCLUDE (branch_id, type, amount, expected_date)
+WHERE status = 'cleared';
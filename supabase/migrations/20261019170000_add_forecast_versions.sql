@@ -0,0 +1,97 @@
+/*
+  # Versioned Forecasts for Delta Responses
+
+  Each forecast series (tenant, branch, scenario) gets a monotonically
+  increasing version. A recompute bumps the version only when at least one day
+  changed, and only changed days are rewritten with that version, so
+  /api/ai/cash-flow/predict/delta can return days with version > since_version.
+
+  1. cash_flow_predictions.version: version of the write that last changed the row
+  2. New Table: ai_forecast_versions, current version per series (branch_id NULL = all branches)
+  3. Unique key fix: UNIQUE (tenant_id, branch_id, prediction_date, scenario_type)
+     treated NULL branch_id as distinct, so tenant-wide upserts inserted duplicate
+     days instead of updating. Duplicates are removed (latest row kept) and the key
+     is recreated as UNIQUE NULLS NOT DISTINCT.
+  4. Security: RLS enabled, service role manages, tenants read their own versions
+*/
+
+DO $$ BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public'
+        AND table_name = 'cash_flow_predictions'
+        AND column_name = 'version'
+    ) THEN
+        ALTER TABLE public.cash_flow_predictions ADD COLUMN version bigint NOT NULL DEFAULT 0;
+    END IF;
+END $$;
+
+DELETE FROM public.cash_flow_predictions p
+USING (
+    SELECT
+        id,
+        row_number() OVER (
+            PARTITION BY tenant_id, branch_id, prediction_date, scenario_type
+            ORDER BY updated_at DESC NULLS LAST, created_at DESC NULLS LAST
+        ) as rn
+    FROM public.cash_flow_predictions
+    WHERE branch_id IS NULL
+) d
+WHERE p.id = d.id
+AND d.rn > 1;
+
+DO $$
+DECLARE
+    old_constraint text;
+BEGIN
+    FOR old_constraint IN
+        SELECT c.conname
+        FROM pg_constraint c
+        JOIN pg_index i ON i.indexrelid = c.conindid
+        WHERE c.conrelid = 'public.cash_flow_predictions'::regclass
+        AND c.contype = 'u'
+        AND NOT i.indnullsnotdistinct
+        AND (
+            SELECT array_agg(a.attname::text ORDER BY a.attname)
+            FROM pg_attribute a
+            WHERE a.attrelid = c.conrelid
+            AND a.attnum = ANY(c.conkey)
+        ) = ARRAY['branch_id', 'prediction_date', 'scenario_type', 'tenant_id']
+    LOOP
+        EXECUTE format('ALTER TABLE public.cash_flow_predictions DROP CONSTRAINT %I', old_constraint);
+    END LOOP;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'public.cash_flow_predictions'::regclass
+        AND conname = 'cash_flow_predictions_series_key'
+    ) THEN
+        ALTER TABLE public.cash_flow_predictions
+        ADD CONSTRAINT cash_flow_predictions_series_key
+        UNIQUE NULLS NOT DISTINCT (tenant_id, branch_id, prediction_date, scenario_type);
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_cash_flow_predictions_series_version
+ON public.cash_flow_predictions(tenant_id, scenario_type, prediction_date, version);
+
+CREATE TABLE IF NOT EXISTS public.ai_forecast_versions (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  tenant_id uuid NOT NULL,
+  branch_id uuid,
+  scenario_type text NOT NULL CHECK (scenario_type IN ('pessimistic', 'realistic', 'optimistic')),
+  version bigint NOT NULL DEFAULT 0,
+  changed_days int NOT NULL DEFAULT 0,
+  updated_at timestamptz DEFAULT now(),
+  CONSTRAINT ai_forecast_versions_series_key UNIQUE NULLS NOT DISTINCT (tenant_id, branch_id, scenario_type)
+);
+
+ALTER TABLE public.ai_forecast_versions ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view own tenant forecast versions" ON public.ai_forecast_versions;
+DROP POLICY IF EXISTS "Service role can manage forecast versions" ON public.ai_forecast_versions;
+
+CREATE POLICY "Users can view own tenant forecast versions" ON public.ai_forecast_versions
+  FOR SELECT TO authenticated
+  USING (tenant_id = (SELECT (auth.jwt()->>'tenant_id')::uuid));
+CREATE POLICY "Service role can manage forecast versions" ON public.ai_forecast_versions FOR ALL TO service_role USING (true) WITH CHECK (true);
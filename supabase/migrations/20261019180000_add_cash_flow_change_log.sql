@@ -0,0 +1,103 @@
+/*
+  # cash_flow Change Log for Incremental Forecast Updates
+
+  Stored forecasts are patched between hourly recomputes: a trigger records the
+  forecast-relevant part of every cash_flow insert / update / delete and notifies
+  the scheduler, which applies the change to the affected days of every stored
+  scenario (services/incremental_forecast.py).
+
+  1. New Table: ai_cash_flow_changes
+     - old_row / new_row: tracked columns before / after the change (NULL on insert / delete)
+     - old_branch_id / new_branch_id: branch before / after, for series lookup
+  2. ai_forecast_versions.applied_change_id: last change already contained in the
+     stored series. Full recomputes set it to the change watermark read before their
+     inputs; incremental updates advance it.
+  3. Trigger public.log_cash_flow_change() (AFTER INSERT / UPDATE / DELETE)
+     - Updates that touch no tracked column (e.g. only updated_at or category) are skipped
+     - NOTIFY cash_flow_changes with the tenant id
+     cash_flow is created outside these migrations, so the trigger is only created
+     when the table exists.
+  4. Security: RLS enabled, service role only
+*/
+
+CREATE TABLE IF NOT EXISTS public.ai_cash_flow_changes (
+  id bigserial PRIMARY KEY,
+  tenant_id uuid NOT NULL,
+  old_branch_id uuid,
+  new_branch_id uuid,
+  old_row jsonb,
+  new_row jsonb,
+  changed_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_ai_cash_flow_changes_tenant ON public.ai_cash_flow_changes(tenant_id, id);
+CREATE INDEX IF NOT EXISTS idx_ai_cash_flow_changes_changed_at ON public.ai_cash_flow_changes(changed_at);
+
+ALTER TABLE public.ai_forecast_versions ADD COLUMN IF NOT EXISTS applied_change_id bigint NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION public.log_cash_flow_change()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    tracked_columns text[] := ARRAY[
+        'id', 'tenant_id', 'branch_id', 'type', 'amount', 'status', 'expected_date',
+        'source_module', 'ai_confidence_score', 'reference_no', 'payment_term_days'
+    ];
+    old_image jsonb;
+    new_image jsonb;
+    change_tenant uuid;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        SELECT jsonb_object_agg(key, value) INTO old_image
+        FROM jsonb_each(to_jsonb(OLD))
+        WHERE key = ANY(tracked_columns);
+    END IF;
+
+    IF TG_OP <> 'DELETE' THEN
+        SELECT jsonb_object_agg(key, value) INTO new_image
+        FROM jsonb_each(to_jsonb(NEW))
+        WHERE key = ANY(tracked_columns);
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND old_image IS NOT DISTINCT FROM new_image THEN
+        RETURN NULL;
+    END IF;
+
+    change_tenant := COALESCE(new_image ->> 'tenant_id', old_image ->> 'tenant_id')::uuid;
+
+    INSERT INTO public.ai_cash_flow_changes (tenant_id, old_branch_id, new_branch_id, old_row, new_row)
+    VALUES (
+        change_tenant,
+        (old_image ->> 'branch_id')::uuid,
+        (new_image ->> 'branch_id')::uuid,
+        old_image,
+        new_image
+    );
+
+    PERFORM pg_notify('cash_flow_changes', change_tenant::text);
+
+    RETURN NULL;
+END;
+$$;
+
+DO $$ BEGIN
+    IF to_regclass('public.cash_flow') IS NULL THEN
+        RAISE NOTICE 'public.cash_flow missing, change log trigger skipped';
+        RETURN;
+    END IF;
+
+    DROP TRIGGER IF EXISTS cash_flow_change_log ON public.cash_flow;
+
+    CREATE TRIGGER cash_flow_change_log
+    AFTER INSERT OR UPDATE OR DELETE ON public.cash_flow
+    FOR EACH ROW EXECUTE FUNCTION public.log_cash_flow_change();
+END $$;
+
+ALTER TABLE public.ai_cash_flow_changes ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Service role can manage cash flow changes" ON public.ai_cash_flow_changes;
+
+CREATE POLICY "Service role can manage cash flow changes" ON public.ai_cash_flow_changes FOR ALL TO service_role USING (true) WITH CHECK (true);
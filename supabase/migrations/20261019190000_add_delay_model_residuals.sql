@@ -0,0 +1,20 @@
+/*
+  # Delay Model Residual Quantiles
+
+  Probabilistic forecasts (/api/ai/cash-flow/predict/bands) sample per-transaction
+  payment delays from the model's error distribution. train_model stores the
+  equiprobable quantiles of the holdout residuals (actual - predicted delay, days)
+  next to the fitted model. Models trained before this column fall back to a
+  normal approximation from mae.
+*/
+
+DO $$ BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public'
+        AND table_name = 'ai_delay_models'
+        AND column_name = 'residual_quantiles'
+    ) THEN
+        ALTER TABLE public.ai_delay_models ADD COLUMN residual_quantiles float8[];
+    END IF;
+END $$;
@@ -0,0 +1,39 @@
+/*
+  # Long-Horizon Forecasts
+
+  /api/ai/cash-flow/predict/long-horizon forecasts up to LONG_HORIZON_MAX_DAYS
+  (default 730) in day / week / month buckets. A series is stored as one row
+  with columnar bucket arrays instead of one cash_flow_predictions row per day,
+  so a 365-day forecast writes a single row.
+
+  1. New Table: ai_long_horizon_forecasts, one row per (tenant, branch, scenario)
+     - buckets: granularity, start_dates, end_dates, inflow, outflow, booked_share,
+       seasonal factors, closing / min balance and risk level arrays
+     - branch_id NULL = all branches
+  2. Security: RLS enabled, service role manages, tenants read their own forecasts
+*/
+
+CREATE TABLE IF NOT EXISTS public.ai_long_horizon_forecasts (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  tenant_id uuid NOT NULL,
+  branch_id uuid,
+  scenario_type text NOT NULL CHECK (scenario_type IN ('pessimistic', 'realistic', 'optimistic')),
+  forecast_days int NOT NULL,
+  current_balance numeric(15,2) NOT NULL DEFAULT 0,
+  bucket_count int NOT NULL DEFAULT 0,
+  buckets jsonb NOT NULL DEFAULT '{}'::jsonb,
+  generated_at timestamptz NOT NULL,
+  created_at timestamptz DEFAULT now(),
+  updated_at timestamptz DEFAULT now(),
+  CONSTRAINT ai_long_horizon_forecasts_series_key UNIQUE NULLS NOT DISTINCT (tenant_id, branch_id, scenario_type)
+);
+
+ALTER TABLE public.ai_long_horizon_forecasts ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view own tenant long horizon forecasts" ON public.ai_long_horizon_forecasts;
+DROP POLICY IF EXISTS "Service role can manage long horizon forecasts" ON public.ai_long_horizon_forecasts;
+
+CREATE POLICY "Users can view own tenant long horizon forecasts" ON public.ai_long_horizon_forecasts
+  FOR SELECT TO authenticated
+  USING (tenant_id = (SELECT (auth.jwt()->>'tenant_id')::uuid));
+CREATE POLICY "Service role can manage long horizon forecasts" ON public.ai_long_horizon_forecasts FOR ALL TO service_role USING (true) WITH CHECK (true);
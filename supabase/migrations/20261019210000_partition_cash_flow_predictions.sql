@@ -0,0 +1,274 @@
+/*
+  # Partitioned, Retention-Managed cash_flow_predictions
+
+  The hourly update and /predict upsert every forecast day, so the table and its
+  ON CONFLICT index grew without bound. The table is now range-partitioned by
+  prediction_date (one partition per calendar month): an upsert only probes the
+  series key of the partition its day falls in, and readers that filter on
+  prediction_date skip old months.
+
+  1. cash_flow_predictions becomes PARTITION BY RANGE (prediction_date)
+     - Existing rows are copied into monthly partitions (cash_flow_predictions_pYYYYMM)
+       under an ACCESS EXCLUSIVE lock, so no write lands in the old table after the copy
+     - cash_flow_predictions_default catches days without a monthly partition, so an
+       upsert never fails when maintenance is late; ensure moves such rows into the
+       monthly partition it creates, and the maintenance job warns while the default
+       partition holds rows
+     - Primary key is (id, prediction_date); the partition key must be part of every unique key
+     - Series key stays UNIQUE NULLS NOT DISTINCT (tenant_id, branch_id, prediction_date, scenario_type)
+  2. New Table: cash_flow_prediction_daily_summaries
+     - One row per series day of expired partitions, without factors_used / recommendations
+     - Keeps predicted vs actual balance and accuracy for long-term reporting
+  3. Maintenance functions (ai-service scheduler, services/prediction_partitions.py):
+     - ensure_cash_flow_prediction_partitions(months_ahead): current and next months
+     - roll_up_cash_flow_prediction_partitions(retention_months): summarizes, detaches
+       and drops monthly partitions that ended before the retention window (the
+       default partition is never rolled up)
+  4. Security: RLS enabled on the parent, every partition and the summary table;
+     service role manages, tenants read their own rows
+*/
+
+CREATE TABLE IF NOT EXISTS public.cash_flow_prediction_daily_summaries (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  tenant_id uuid NOT NULL,
+  branch_id uuid,
+  prediction_date date NOT NULL,
+  scenario_type text NOT NULL CHECK (scenario_type IN ('pessimistic', 'realistic', 'optimistic')),
+  predicted_balance numeric(15,2) NOT NULL,
+  actual_balance numeric(15,2),
+  accuracy_score numeric(5,2),
+  confidence_score numeric(3,2),
+  risk_level text,
+  model_version text,
+  version bigint NOT NULL DEFAULT 0,
+  summarized_at timestamptz DEFAULT now(),
+  CONSTRAINT cash_flow_prediction_daily_summaries_series_key
+    UNIQUE NULLS NOT DISTINCT (tenant_id, branch_id, prediction_date, scenario_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cash_flow_prediction_daily_summaries_tenant_date
+ON public.cash_flow_prediction_daily_summaries(tenant_id, prediction_date);
+
+ALTER TABLE public.cash_flow_prediction_daily_summaries ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view own tenant prediction summaries" ON public.cash_flow_prediction_daily_summaries;
+DROP POLICY IF EXISTS "Service role can manage prediction summaries" ON public.cash_flow_prediction_daily_summaries;
+
+CREATE POLICY "Users can view own tenant prediction summaries" ON public.cash_flow_prediction_daily_summaries
+  FOR SELECT TO authenticated
+  USING (tenant_id = (SELECT (auth.jwt()->>'tenant_id')::uuid));
+CREATE POLICY "Service role can manage prediction summaries" ON public.cash_flow_prediction_daily_summaries FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+CREATE OR REPLACE FUNCTION public.create_cash_flow_prediction_partition(p_parent text, p_month date)
+RETURNS boolean
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+    month_start date := date_trunc('month', p_month)::date;
+    month_end date := (date_trunc('month', p_month) + interval '1 month')::date;
+    partition_name text := format('cash_flow_predictions_p%s', to_char(date_trunc('month', p_month), 'YYYYMM'));
+    default_part regclass := to_regclass('public.cash_flow_predictions_default');
+    has_default_rows boolean := false;
+BEGIN
+    IF to_regclass(format('public.%I', partition_name)) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+
+    IF default_part IS NOT NULL THEN
+        EXECUTE format(
+            'SELECT EXISTS (SELECT 1 FROM %s WHERE prediction_date >= %L AND prediction_date < %L)',
+            default_part, month_start, month_end
+        ) INTO has_default_rows;
+    END IF;
+
+    IF has_default_rows THEN
+        -- A partition cannot be created over rows in the default partition:
+        -- build it detached, move the month's rows out of the default, then attach
+        EXECUTE format(
+            'CREATE TABLE public.%I (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+            partition_name,
+            p_parent
+        );
+        EXECUTE format($sql$
+            WITH moved AS (
+                DELETE FROM %s WHERE prediction_date >= %L AND prediction_date < %L RETURNING *
+            )
+            INSERT INTO public.%I SELECT * FROM moved
+        $sql$, default_part, month_start, month_end, partition_name);
+        EXECUTE format(
+            'ALTER TABLE %s ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+            p_parent,
+            partition_name,
+            month_start,
+            month_end
+        );
+    ELSE
+        EXECUTE format(
+            'CREATE TABLE public.%I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+            partition_name,
+            p_parent,
+            month_start,
+            month_end
+        );
+    END IF;
+
+    EXECUTE format('ALTER TABLE public.%I ENABLE ROW LEVEL SECURITY', partition_name);
+
+    RETURN true;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.ensure_cash_flow_prediction_partitions(p_months_ahead int DEFAULT 4)
+RETURNS int
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+    month_start date := date_trunc('month', CURRENT_DATE)::date;
+    created int := 0;
+BEGIN
+    FOR month_offset IN 0..p_months_ahead LOOP
+        IF public.create_cash_flow_prediction_partition(
+            'public.cash_flow_predictions',
+            (month_start + make_interval(months => month_offset))::date
+        ) THEN
+            created := created + 1;
+        END IF;
+    END LOOP;
+
+    RETURN created;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.roll_up_cash_flow_prediction_partitions(p_retention_months int DEFAULT 6)
+RETURNS TABLE (partition_name text, range_start date, rows_summarized bigint)
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+    cutoff date;
+    expired record;
+BEGIN
+    -- Accuracy rollups (ai_accuracy_rollups) read the last 90 days
+    IF p_retention_months < 3 THEN
+        RAISE EXCEPTION 'retention must be at least 3 months, got %', p_retention_months;
+    END IF;
+
+    cutoff := (date_trunc('month', CURRENT_DATE) - make_interval(months => p_retention_months))::date;
+
+    FOR expired IN
+        SELECT
+            c.oid::regclass as part,
+            c.relname::text as relname,
+            substring(pg_get_expr(c.relpartbound, c.oid) from 'FROM \(''([0-9-]+)''\)')::date as lower_bound,
+            substring(pg_get_expr(c.relpartbound, c.oid) from 'TO \(''([0-9-]+)''\)')::date as upper_bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.cash_flow_predictions'::regclass
+        ORDER BY 3
+    LOOP
+        CONTINUE WHEN expired.upper_bound IS NULL OR expired.upper_bound > cutoff;
+
+        EXECUTE format($sql$
+            INSERT INTO public.cash_flow_prediction_daily_summaries
+            (tenant_id, branch_id, prediction_date, scenario_type, predicted_balance, actual_balance,
+             accuracy_score, confidence_score, risk_level, model_version, version, summarized_at)
+            SELECT
+                tenant_id, branch_id, prediction_date, scenario_type, predicted_balance, actual_balance,
+                accuracy_score, confidence_score, risk_level, model_version, version, now()
+            FROM %s
+            ON CONFLICT (tenant_id, branch_id, prediction_date, scenario_type)
+            DO UPDATE SET
+                predicted_balance = EXCLUDED.predicted_balance,
+                actual_balance = EXCLUDED.actual_balance,
+                accuracy_score = EXCLUDED.accuracy_score,
+                confidence_score = EXCLUDED.confidence_score,
+                risk_level = EXCLUDED.risk_level,
+                model_version = EXCLUDED.model_version,
+                version = EXCLUDED.version,
+                summarized_at = now()
+        $sql$, expired.part);
+
+        GET DIAGNOSTICS rows_summarized = ROW_COUNT;
+
+        EXECUTE format('ALTER TABLE public.cash_flow_predictions DETACH PARTITION %s', expired.part);
+        EXECUTE format('DROP TABLE %s', expired.part);
+
+        partition_name := expired.relname;
+        range_start := expired.lower_bound;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.create_cash_flow_prediction_partition(text, date) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.ensure_cash_flow_prediction_partitions(int) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.roll_up_cash_flow_prediction_partitions(int) FROM PUBLIC, anon, authenticated;
+
+DO $$
+DECLARE
+    month_start date;
+    last_month date;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_partitioned_table
+        WHERE partrelid = 'public.cash_flow_predictions'::regclass
+    ) THEN
+        RETURN;
+    END IF;
+
+    -- Writers wait for the swap instead of writing into the table being copied
+    LOCK TABLE public.cash_flow_predictions IN ACCESS EXCLUSIVE MODE;
+
+    CREATE TABLE public.cash_flow_predictions_partitioned (
+        LIKE public.cash_flow_predictions INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+    ) PARTITION BY RANGE (prediction_date);
+
+    SELECT
+        LEAST(date_trunc('month', MIN(prediction_date)), date_trunc('month', CURRENT_DATE))::date,
+        GREATEST(date_trunc('month', MAX(prediction_date)), date_trunc('month', CURRENT_DATE) + interval '4 months')::date
+    INTO month_start, last_month
+    FROM public.cash_flow_predictions;
+
+    WHILE month_start <= last_month LOOP
+        PERFORM public.create_cash_flow_prediction_partition('public.cash_flow_predictions_partitioned', month_start);
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+
+    INSERT INTO public.cash_flow_predictions_partitioned
+    SELECT * FROM public.cash_flow_predictions;
+
+    DROP TABLE public.cash_flow_predictions;
+    ALTER TABLE public.cash_flow_predictions_partitioned RENAME TO cash_flow_predictions;
+
+    ALTER TABLE public.cash_flow_predictions
+    ADD CONSTRAINT cash_flow_predictions_pkey PRIMARY KEY (id, prediction_date);
+
+    ALTER TABLE public.cash_flow_predictions
+    ADD CONSTRAINT cash_flow_predictions_series_key
+    UNIQUE NULLS NOT DISTINCT (tenant_id, branch_id, prediction_date, scenario_type);
+END $$;
+
+CREATE TABLE IF NOT EXISTS public.cash_flow_predictions_default
+PARTITION OF public.cash_flow_predictions DEFAULT;
+
+ALTER TABLE public.cash_flow_predictions_default ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_cash_flow_predictions_unreconciled
+ON public.cash_flow_predictions(prediction_date, tenant_id) WHERE actual_balance IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_cash_flow_predictions_series_version
+ON public.cash_flow_predictions(tenant_id, scenario_type, prediction_date, version);
+
+ALTER TABLE public.cash_flow_predictions ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view own tenant predictions" ON public.cash_flow_predictions;
+DROP POLICY IF EXISTS "Service role can manage predictions" ON public.cash_flow_predictions;
+
+CREATE POLICY "Users can view own tenant predictions" ON public.cash_flow_predictions
+  FOR SELECT TO authenticated
+  USING (tenant_id = (SELECT (auth.jwt()->>'tenant_id')::uuid));
+CREATE POLICY "Service role can manage predictions" ON public.cash_flow_predictions FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+SELECT public.ensure_cash_flow_prediction_partitions(4);
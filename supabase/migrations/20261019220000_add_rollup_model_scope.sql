@@ -0,0 +1,22 @@
+/*
+  # Model Scope on Accuracy Rollups
+
+  Tenants with too little history are served by the pooled (global) delay model.
+  Training now writes the global model's metrics to their rollup row as well, so
+  /api/ai/cash-flow/accuracy reports them as trained instead of "not trained yet".
+
+  1. New Column: ai_accuracy_rollups.model_scope ('tenant' or 'global')
+*/
+
+ALTER TABLE public.ai_accuracy_rollups ADD COLUMN IF NOT EXISTS model_scope text NOT NULL DEFAULT 'tenant';
+
+DO $$ BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'public.ai_accuracy_rollups'::regclass
+        AND conname = 'ai_accuracy_rollups_model_scope_check'
+    ) THEN
+        ALTER TABLE public.ai_accuracy_rollups
+        ADD CONSTRAINT ai_accuracy_rollups_model_scope_check CHECK (model_scope IN ('tenant', 'global'));
+    END IF;
+END $$;
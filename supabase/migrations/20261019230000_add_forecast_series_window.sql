@@ -0,0 +1,14 @@
+/*
+  # Forecast Window per Versioned Series
+
+  /api/ai/cash-flow/predict/delta is read-only and serves only stored days, so it
+  must know how far a stored series reaches. The hourly update also uses the
+  window to refresh series that were stored on demand (other scenarios, branches
+  or longer windows) with their own length.
+
+  1. New Column: ai_forecast_versions.forecast_days, the day count of the last
+     full write. Existing series default to 30 (the hourly window) until their
+     next write.
+*/
+
+ALTER TABLE public.ai_forecast_versions ADD COLUMN IF NOT EXISTS forecast_days int NOT NULL DEFAULT 30;